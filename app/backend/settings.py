@@ -101,6 +101,21 @@ DATABASES = {
 }
 
 
+# Cache shared by every process through Redis with REDIS_URL. The
+# analytics cache, the catalog snapshots and the auth token caches are
+# invalidated through it, so a deployment running several processes
+# needs REDIS_URL: the local memory cache used without it is private to
+# each process and only suits a single one (runserver, tests).
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -141,6 +156,19 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Media files are served by Django (core/media.py) in DEBUG or with
+# SERVE_MEDIA=1. MEDIA_OFFLOAD=x-accel-redirect or x-sendfile leaves
+# sending the bytes to the web server; for nginx MEDIA_ACCEL_PREFIX is
+# an internal location aliased to MEDIA_ROOT. Files not named after their
+# content are cached for MEDIA_CACHE_MAX_AGE seconds.
+SERVE_MEDIA = os.getenv('SERVE_MEDIA') == '1'
+# Only the files under these MEDIA_ROOT prefixes are public, the exercise
+# images and their variants; log import files and the rest answer 404.
+MEDIA_PUBLIC_PREFIXES = ('uploads/strength_exercise/',)
+MEDIA_OFFLOAD = os.getenv('MEDIA_OFFLOAD', '')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+MEDIA_CACHE_MAX_AGE = 60 * 60
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -149,6 +177,58 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
 
+# Per-user analytics cache (user/analytics/cache.py): how long results are
+# kept, how old a stale result may be to be served while it is recomputed,
+# and how long a recompute may hold its lock.
+ANALYTICS_CACHE_TIMEOUT = 60 * 60 * 24
+ANALYTICS_CACHE_MAX_STALE = 60 * 60
+ANALYTICS_CACHE_LOCK_TIMEOUT = 10
+
+# Seconds a sync feed cursor (exercise/sync.py) stays usable; older
+# ones are refused and the client syncs again from the start, as the
+# tombstones they need may have been compacted away.
+SYNC_CURSOR_LIFETIME = 60 * 60 * 24 * 30
+
+# How long a pre-rendered catalog list (exercise/catalog.py) is kept; a
+# catalog write replaces it sooner.
+CATALOG_SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+# Worker processes rendering the exercise image variants
+# (exercise/images.py), 0 renders them in the request. Uploads beyond the
+# queue size are left for `manage.py generate_image_variants`.
+IMAGE_VARIANT_WORKERS = 2
+IMAGE_VARIANT_QUEUE_SIZE = 16
+
+# Images no exercise uses any more are deleted once they have not been
+# stored or reused for this long, so that an upload of the same content
+# still in its transaction keeps the file. Those still within it when
+# released are left to the periodic `manage.py sweep_images`.
+IMAGE_SWEEP_GRACE = 60 * 60
+
+# Largest log import file (exercise/views.py), refused before it is
+# spooled; larger histories are split or run with `manage.py import_logs`.
+LOG_IMPORT_MAX_BYTES = 20 * 1024 * 1024
+
+# Limits of the exercise image uploads (exercise/uploads.py), and how
+# long a chunked upload may take before it is discarded.
+IMAGE_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40_000_000
+IMAGE_UPLOAD_EXPIRY = 60 * 60 * 24
+
+# Users of recently seen auth tokens are kept in a per process LRU
+# (user/authentication.py) of this many tokens, for this many seconds.
+# The changes to users reach the other processes through the shared
+# cache only, without REDIS_URL the timeout is 0 and nothing is kept:
+# the default setup (docker-compose, CI) looks up every token in the
+# database. The tests turn the cache on over the local memory cache.
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TIMEOUT = 60 * 5 if REDIS_URL else 0
+
+# Lifetimes in seconds of the signed access tokens and of the refresh
+# tokens exchanged for them (user/tokens.py).
+SIGNED_ACCESS_TOKEN_LIFETIME = 60 * 15
+REFRESH_TOKEN_LIFETIME = 60 * 60 * 24 * 30
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
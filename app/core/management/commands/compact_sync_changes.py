@@ -0,0 +1,18 @@
+"""
+Django command to compact the sync change feed
+"""
+from django.core.management.base import BaseCommand
+
+from exercise.sync import compact_changes
+
+
+class Command(BaseCommand):
+    """Django command to compact the sync feed, meant to run periodically."""
+    help = 'Delete the sync changes superseded by a later one and the ' \
+        'tombstones older than the cursor lifetime.'
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        deleted = compact_changes()
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} sync changes.'))
@@ -0,0 +1,61 @@
+"""
+Django command to export exercise logs as NDJSON or CSV
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from exercise.export import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    EXPORT_KINDS,
+    USER_COLUMN,
+    iter_export,
+)
+
+
+class Command(BaseCommand):
+    """Django command to stream the exercise log history to a file."""
+    help = 'Export exercise logs as NDJSON or CSV with constant memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind', choices=list(EXPORT_KINDS), default='strength',
+            help='Which logs to export.',
+        )
+        parser.add_argument(
+            '--output-format', choices=list(EXPORT_FORMATS),
+            default='ndjson',
+        )
+        parser.add_argument(
+            '--user', dest='email',
+            help='Only export the logs of the user with this email.',
+        )
+        parser.add_argument(
+            '--output', help='File to write to, defaults to stdout.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+            help='Number of rows fetched from the database at a time.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        model, columns = EXPORT_KINDS[options['kind']]
+        queryset = model.objects.all()
+        if options['email']:
+            try:
+                user = get_user_model().objects.get(email=options['email'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['email']}.")
+            queryset = queryset.filter(user=user)
+        else:
+            columns = (USER_COLUMN,) + columns
+
+        lines = iter_export(queryset, columns, options['output_format'],
+                            options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
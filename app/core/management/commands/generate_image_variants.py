@@ -0,0 +1,38 @@
+"""
+Django command to render the missing exercise image variants
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import StrengthExercise
+from exercise.images import generate_image_variants
+
+
+class Command(BaseCommand):
+    """Django command to render the image variants in this process."""
+    help = 'Render the resized variants of the strength exercise images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Render again the images that already have variants.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        exercises = StrengthExercise.objects.exclude(image='') \
+            .exclude(image=None).order_by('id')
+        if not options['all']:
+            exercises = exercises.filter(image_variants={})
+
+        rendered = failed = 0
+        for exercise_id, image_name in exercises.values_list('id', 'image'):
+            try:
+                generate_image_variants(exercise_id, image_name)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'{image_name}: {error}')
+            else:
+                rendered += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered the variants of {rendered} images, {failed} failed.'))
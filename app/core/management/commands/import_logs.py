@@ -0,0 +1,116 @@
+"""
+Django command to import exercise logs from a CSV or NDJSON file
+"""
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import ExerciseLogImport
+from exercise.importer import (
+    IMPORT_BATCH_SIZE,
+    ImportUnavailable,
+    claim_import,
+    run_import,
+)
+from exercise.serializers import ExerciseLogImportSerializer
+
+
+class Command(BaseCommand):
+    """Django command to import a log file, resumable after interruption."""
+    help = 'Import exercise logs of a user from a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file to import.')
+        parser.add_argument(
+            '--user', dest='email',
+            help='Email of the user the logs belong to.',
+        )
+        parser.add_argument(
+            '--kind', choices=['strength', 'track'], default='strength',
+        )
+        parser.add_argument(
+            '--file-format', choices=['csv', 'ndjson'],
+            help='Defaults to the format of the file extension.',
+        )
+        parser.add_argument(
+            '--resume', type=int, metavar='IMPORT_ID',
+            help='Continue an interrupted import of the same file.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help='Number of rows validated and inserted at a time.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'{path} is not a file.')
+        size = os.path.getsize(path)
+
+        if options['resume']:
+            log_import = self._resumed_import(options['resume'], size)
+        else:
+            log_import = self._new_import(path, size, options)
+
+        self.stdout.write(f'Importing {path} as import {log_import.id}...')
+        try:
+            claim_import(log_import)
+        except ImportUnavailable as error:
+            raise CommandError(
+                f'Import {log_import.id} is already {error.status}.')
+        with open(path, 'rb') as source:
+            run_import(log_import, source,
+                       batch_size=options['batch_size'],
+                       progress=self._report_progress)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {log_import.rows_imported} logs, '
+            f'{log_import.rows_failed} rows failed.'
+        ))
+        for error in log_import.errors:
+            self.stdout.write(f"line {error['line']}: {error['errors']}")
+
+    def _new_import(self, path, size, options):
+        if not options['email']:
+            raise CommandError('--user is required for a new import.')
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}.")
+
+        file_format = options['file_format'] or \
+            ExerciseLogImportSerializer.guess_file_format(path)
+        if file_format is None:
+            raise CommandError('Cannot tell the format from the file name, '
+                               'use --file-format.')
+
+        return ExerciseLogImport.objects.create(
+            user=user,
+            kind=options['kind'],
+            file_format=file_format,
+            source_path=os.path.abspath(path),
+            total_bytes=size,
+        )
+
+    def _resumed_import(self, import_id, size):
+        try:
+            log_import = ExerciseLogImport.objects.get(id=import_id)
+        except ExerciseLogImport.DoesNotExist:
+            raise CommandError(f'No import with id {import_id}.')
+        if log_import.status == 'completed':
+            raise CommandError(f'Import {import_id} is already completed.')
+        if log_import.total_bytes != size:
+            raise CommandError('The file differs in size from the one the '
+                               'import was started with.')
+        return log_import
+
+    def _report_progress(self, log_import):
+        percent = 100 * log_import.byte_offset // max(log_import.total_bytes,
+                                                      1)
+        self.stdout.write(
+            f'{percent}% ({log_import.byte_offset} bytes), '
+            f'{log_import.rows_imported} imported, '
+            f'{log_import.rows_failed} failed'
+        )
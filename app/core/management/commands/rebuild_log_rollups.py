@@ -0,0 +1,77 @@
+"""
+Django command to rebuild or verify the strength log rollups
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from user.analytics.rollups import (
+    compute_strength_rollups,
+    rebuild_strength_rollups,
+    stored_strength_rollups,
+)
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the rollups from the raw logs."""
+    help = 'Rebuild (or with --verify, check) the strength log rollups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only compare the rollups with the raw logs.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Number of users processed per query and transaction.',
+        )
+        parser.add_argument(
+            '--user', action='append', dest='emails', default=[],
+            help='Limit to the user with this email (repeatable).',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        users = get_user_model().objects.order_by('id')
+        if options['emails']:
+            users = users.filter(email__in=options['emails'])
+        user_ids = users.values_list('id', flat=True)
+
+        mismatches = rows = 0
+        last_id = 0
+        while True:
+            chunk = list(user_ids.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1]
+
+            if options['verify']:
+                mismatches += self._verify(chunk)
+            else:
+                rows += rebuild_strength_rollups(chunk)
+
+        if options['verify']:
+            if mismatches:
+                raise CommandError(f'{mismatches} rollup rows are out of '
+                                   'date, run without --verify to rebuild.')
+            self.stdout.write(self.style.SUCCESS('Rollups are up to date.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} rollups.'))
+
+    def _verify(self, user_ids):
+        """Report and count the rollups that differ from the raw logs."""
+        expected = compute_strength_rollups(user_ids)
+        stored = stored_strength_rollups(user_ids)
+
+        mismatches = 0
+        for key in sorted(expected.keys() | stored.keys()):
+            if expected.get(key) != stored.get(key):
+                mismatches += 1
+                self.stdout.write(
+                    f'user {key[0]} on {key[1]}: stored {stored.get(key)}, '
+                    f'expected {expected.get(key)}'
+                )
+        return mismatches
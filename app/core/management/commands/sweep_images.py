@@ -0,0 +1,25 @@
+"""
+Django command to delete the exercise images no exercise uses
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from exercise.images import sweep_images
+
+
+class Command(BaseCommand):
+    """Django command to delete unused images, meant to run periodically."""
+    help = 'Delete the strength exercise images, and their variants, ' \
+        'that no exercise uses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=settings.IMAGE_SWEEP_GRACE,
+            help='Seconds an unused image is kept after its last upload.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        deleted = sweep_images(grace=options['grace'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} unused images.'))
@@ -0,0 +1,166 @@
+"""
+Serving of the uploaded media files
+
+Files are answered with strong ETags, Last-Modified and conditional
+requests, and single byte ranges for resumed and partial downloads.
+Content addressed files (core/storage.py) never change under their name
+and are cached for a year as immutable. With MEDIA_OFFLOAD the checks
+are still done here but the bytes are sent by the web server, through
+X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd). Only the
+files under MEDIA_PUBLIC_PREFIXES are served.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from core.storage import is_content_addressed
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_etag(name, stat):
+    """Return the strong ETag of a stored file."""
+    if is_content_addressed(name):
+        return '"{}"'.format(
+            os.path.splitext(posixpath.basename(name))[0])
+    return f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """
+    Return the (start, end) of a single byte range header, end inclusive,
+    None to send the whole file, or False if it cannot be satisfied.
+    Multiple ranges are answered with the whole file.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # the last `end` bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    """Return whether the Range header applies, given If-Range"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return parse_etags(if_range) == [etag]
+    return parse_http_date_safe(if_range) == int(last_modified)
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as media_file:
+        media_file.seek(start)
+        while length > 0:
+            data = media_file.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def _offload(name, path):
+    response = HttpResponse()
+    if settings.MEDIA_OFFLOAD == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = quote(
+            settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + name)
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a public file of MEDIA_ROOT"""
+    name = posixpath.normpath(path).lstrip('/')
+    if not name.startswith(tuple(settings.MEDIA_PUBLIC_PREFIXES)):
+        raise Http404('File not found.')
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+        stat = os.stat(full_path)
+    except (OSError, ValueError, SuspiciousFileOperation):
+        raise Http404('File not found.')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found.')
+
+    etag = file_etag(name, stat)
+    last_modified = stat.st_mtime
+    if is_content_addressed(name):
+        cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        cache_control = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=int(last_modified))
+    if response is None:
+        response = _respond(request, name, full_path, stat.st_size,
+                            etag, last_modified)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _respond(request, name, full_path, size, etag, last_modified):
+    content_type, encoding = mimetypes.guess_type(name)
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.MEDIA_OFFLOAD:
+        # the web server answers ranges itself
+        response = _offload(name, full_path)
+        response['Content-Type'] = content_type
+        return response
+
+    byte_range = None
+    if 'HTTP_RANGE' in request.META and \
+            _if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.META['HTTP_RANGE'], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'),
+                                content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(full_path, start, end - start + 1),
+            status=206, content_type=content_type)
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    """Build the rollups of the logs that already exist"""
+    StrengthExerciseLog = apps.get_model('core', 'StrengthExerciseLog')
+    StrengthExerciseLogRollup = apps.get_model('core',
+                                               'StrengthExerciseLogRollup')
+    rows = StrengthExerciseLog.objects.annotate(
+        day=TruncDate('timestamp', tzinfo=timezone.get_default_timezone())
+    ).values('user_id', 'day').annotate(
+        log_count=Count('id'),
+        total_reps=Sum('reps'),
+        total_sets=Sum('sets'),
+        total_calories_burned=Sum('calories_burned'),
+    ).order_by()
+
+    StrengthExerciseLogRollup.objects.bulk_create(
+        (StrengthExerciseLogRollup(
+            user_id=row['user_id'],
+            day=row['day'],
+            log_count=row['log_count'],
+            reps=row['total_reps'],
+            sets=row['total_sets'],
+            calories_burned=row['total_calories_burned'],
+        ) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_strengthexercise_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StrengthExerciseLogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('log_count', models.IntegerField(default=0)),
+                ('reps', models.IntegerField(default=0)),
+                ('sets', models.IntegerField(default=0)),
+                ('calories_burned', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='strengthexerciselogrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='unique_strength_rollup_user_day'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
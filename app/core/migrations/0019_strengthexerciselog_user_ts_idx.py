@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_strengthexerciselogrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='strengthexerciselog',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='strength_log_user_ts_idx'),
+        ),
+    ]
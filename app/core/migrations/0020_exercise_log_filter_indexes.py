@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_strengthexerciselog_user_ts_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='strengthexerciselog',
+            index=models.Index(fields=['user', 'exercise', 'timestamp', 'id'], name='strength_log_user_ex_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trackexerciselog',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='track_log_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trackexerciselog',
+            index=models.Index(fields=['user', 'exercise', 'timestamp', 'id'], name='track_log_user_ex_ts_idx'),
+        ),
+    ]
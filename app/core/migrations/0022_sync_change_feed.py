@@ -0,0 +1,87 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:44
+
+import itertools
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+# model name: (change kind, has a user)
+SYNC_MODELS = (
+    ('MuscleGroup', 'muscle_group', False),
+    ('StrengthExercise', 'strength_exercise', False),
+    ('TrackExercise', 'track_exercise', False),
+    ('StrengthExerciseLog', 'strength_log', True),
+    ('TrackExerciseLog', 'track_log', True),
+)
+
+
+def backfill_sync_changes(apps, schema_editor):
+    """Record the existing objects so a first sync returns all of them"""
+    SyncChange = apps.get_model('core', 'SyncChange')
+    for model_name, kind, has_user in SYNC_MODELS:
+        rows = apps.get_model('core', model_name).objects.order_by('id')
+        fields = ('id', 'user_id') if has_user else ('id', )
+        changes = (
+            SyncChange(kind=kind, object_id=row[0],
+                       user_id=row[1] if has_user else None)
+            for row in rows.values_list(*fields).iterator(chunk_size=2000)
+        )
+        while True:
+            batch = list(itertools.islice(changes, 2000))
+            if not batch:
+                break
+            SyncChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_exerciselogimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='musclegroup',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='strengthexercise',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='strengthexerciselog',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='trackexercise',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='trackexerciselog',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('strength_log', 'Strength Exercise Log'), ('track_log', 'Track Exercise Log'), ('strength_exercise', 'Strength Exercise'), ('track_exercise', 'Track Exercise'), ('muscle_group', 'Muscle Group')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='sync_change_user_id_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_sync_changes,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+from core.search_index import (
+    POSTGRESQL_BACKWARD,
+    POSTGRESQL_FORWARD,
+    SQLITE_BACKWARD,
+    SQLITE_FORWARD,
+)
+
+
+def run_for_vendor(statements):
+    """Run the statements of the active database backend, if any"""
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_sync_change_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_FORWARD,
+                            'postgresql': POSTGRESQL_FORWARD}),
+            run_for_vendor({'sqlite': SQLITE_BACKWARD,
+                            'postgresql': POSTGRESQL_BACKWARD}),
+        ),
+    ]
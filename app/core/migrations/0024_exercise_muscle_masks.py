@@ -0,0 +1,67 @@
+# Generated by Django 5.0.14 on 2026-10-17 23:04
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def backfill_muscle_masks(apps, schema_editor):
+    """Compute the muscle masks of the existing exercises"""
+    MuscleGroup = apps.get_model('core', 'MuscleGroup')
+    choices = MuscleGroup._meta.get_field('name').choices
+    bits = {name: 1 << position
+            for position, (name, _label) in enumerate(choices)}
+
+    for model_name in ('StrengthExercise', 'TrackExercise'):
+        model = apps.get_model('core', model_name)
+        masks = defaultdict(lambda: {'primary_muscle_mask': 0,
+                                     'secondary_muscle_mask': 0})
+        for field in ('primary_muscle_groups', 'secondary_muscle_groups'):
+            through = model._meta.get_field(field).remote_field.through
+            links = through.objects.values_list(
+                f'{model._meta.model_name}_id', 'musclegroup__name')
+            mask_field = field.replace('_groups', '_mask')
+            for exercise_id, name in links:
+                masks[exercise_id][mask_field] |= bits.get(name, 0)
+        for exercise_id, values in masks.items():
+            model.objects.filter(pk=exercise_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_strengthexercise_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='strengthexercise',
+            name='primary_muscle_mask',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='strengthexercise',
+            name='secondary_muscle_mask',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trackexercise',
+            name='primary_muscle_mask',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trackexercise',
+            name='secondary_muscle_mask',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='strengthexercise',
+            index=models.Index(fields=['primary_muscle_mask', 'secondary_muscle_mask'], name='strength_ex_muscle_mask_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trackexercise',
+            index=models.Index(fields=['primary_muscle_mask', 'secondary_muscle_mask'], name='track_ex_muscle_mask_idx'),
+        ),
+        migrations.RunPython(backfill_muscle_masks,
+                             migrations.RunPython.noop),
+    ]
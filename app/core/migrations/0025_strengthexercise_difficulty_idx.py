@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-17 23:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_exercise_muscle_masks'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='strengthexercise',
+            index=models.Index(fields=['dificulty_level', 'id'], name='strength_ex_difficulty_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_strengthexercise_difficulty_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='strengthexercise',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.14 on 2026-10-17 23:17
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_strengthexercise_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='strengthexercise',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.strengthExercise_image_file_path),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-17 23:53
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_signed_tokens'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='strengthexercise',
+            name='strength_ex_muscle_mask_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='trackexercise',
+            name='track_ex_muscle_mask_idx',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 00:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_drop_muscle_mask_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exerciselogimport',
+            name='line_offset',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -16,15 +16,19 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 
 from datetime import datetime
 
+from core.storage import ContentAddressedStorage
+
 current_year = datetime.now().year
 
 
 def strengthExercise_image_file_path(instance, filename):
-    """Generate file path for new exercise image"""
+    """
+    Generate file path for new exercise image, the storage names it
+    after its content (core/storage.py)
+    """
     ext = os.path.splitext(filename)[1]
-    filename = f'{uuid.uuid4()}{ext}'
 
-    return os.path.join('uploads', 'strength_exercise', filename)
+    return os.path.join('uploads', 'strength_exercise', f'image{ext}')
 
 
 class UserManager(BaseUserManager):
@@ -84,6 +88,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     )
     is_active = models.BooleanField(default=True)  # can login
     is_staff = models.BooleanField(default=False)  # staff user
+    # signed in the access tokens, bumped to revoke them (user/tokens.py)
+    token_version = models.PositiveIntegerField(default=0)
 
     objects = UserManager()
     USERNAME_FIELD = 'email'  # default username field
@@ -109,6 +115,7 @@ class MuscleGroup(models.Model):
         choices=MUSCLE_CHOICES
     )
     # description = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -136,7 +143,20 @@ class StrengthExercise(models.Model):
                             related_name='strength_secondary_muscle_groups')
 
     image = models.ImageField(null=True,
-                              upload_to=strengthExercise_image_file_path)
+                              upload_to=strengthExercise_image_file_path,
+                              storage=ContentAddressedStorage())
+    # {size: {format: storage name}}, see exercise/images.py
+    image_variants = models.JSONField(default=dict, blank=True)
+    # bit i set for MuscleGroup.MUSCLE_CHOICES[i], see exercise/muscles.py
+    primary_muscle_mask = models.PositiveIntegerField(default=0)
+    secondary_muscle_mask = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dificulty_level', 'id'],
+                         name='strength_ex_difficulty_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -159,6 +179,10 @@ class TrackExercise(models.Model):
     secondary_muscle_groups = models.ManyToManyField(
                             'MuscleGroup',
                             related_name='track_secondary_muscle_groups')
+    # bit i set for MuscleGroup.MUSCLE_CHOICES[i], see exercise/muscles.py
+    primary_muscle_mask = models.PositiveIntegerField(default=0)
+    secondary_muscle_mask = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -174,6 +198,7 @@ class BaseExerciseLog(models.Model):
             default=timezone.now)
 
     calories_burned = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         abstract = True
@@ -199,6 +224,16 @@ class StrengthExerciseLog(BaseExerciseLog):
             }
         )
 
+    class Meta:
+        indexes = [
+            # keyset pagination of a user's logs
+            models.Index(fields=['user', 'timestamp', 'id'],
+                         name='strength_log_user_ts_idx'),
+            # logs of one exercise, e.g. all bench press logs of a week
+            models.Index(fields=['user', 'exercise', 'timestamp', 'id'],
+                         name='strength_log_user_ex_ts_idx'),
+        ]
+
     def __str__(self):
         return (
             f"{self.exercise}_"
@@ -220,8 +255,172 @@ class TrackExerciseLog(BaseExerciseLog):
     )
     pace = models.DurationField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'timestamp', 'id'],
+                         name='track_log_user_ts_idx'),
+            models.Index(fields=['user', 'exercise', 'timestamp', 'id'],
+                         name='track_log_user_ex_ts_idx'),
+        ]
+
     def __str__(self):
         return (
             f"{self.exercise}_"
             f"{self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
         )
+
+
+class StrengthExerciseLogRollup(models.Model):
+    """Per user and per day totals of Strength Exercise Logs"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    # calendar day in settings.TIME_ZONE
+    day = models.DateField()
+
+    log_count = models.IntegerField(default=0)
+    reps = models.IntegerField(default=0)
+    sets = models.IntegerField(default=0)
+    calories_burned = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'],
+                                    name='unique_strength_rollup_user_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}_{self.day}"
+
+
+def log_import_file_path(instance, filename):
+    """Generate file path for new log import file"""
+    ext = os.path.splitext(filename)[1]
+    filename = f'{uuid.uuid4()}{ext}'
+
+    return os.path.join('uploads', 'log_import', filename)
+
+
+class ExerciseLogImport(models.Model):
+    """Import of exercise logs from a CSV or NDJSON file"""
+    KIND_CHOICES = [
+        ('strength', 'Strength'),
+        ('track', 'Track'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    file = models.FileField(upload_to=log_import_file_path, blank=True)
+    # local path of imports started from the command line
+    source_path = models.CharField(max_length=1024, blank=True)
+    status = models.CharField(max_length=10,
+                              choices=STATUS_CHOICES,
+                              default='pending')
+
+    # the import resumes from here, committed with each chunk of rows
+    byte_offset = models.PositiveBigIntegerField(default=0)
+    # lines up to byte_offset, blank ones and the header included
+    line_offset = models.PositiveIntegerField(default=0)
+    total_bytes = models.PositiveBigIntegerField(default=0)
+    rows_imported = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user}_{self.kind}_{self.status}"
+
+
+class ExerciseImageUpload(models.Model):
+    """Strength exercise image uploaded in chunks, see exercise/uploads.py"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    exercise = models.ForeignKey(
+        'StrengthExercise',
+        on_delete=models.CASCADE,
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    # bytes received so far, the next chunk starts here
+    offset = models.PositiveBigIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user}_{self.filename}_{self.offset}/{self.size}"
+
+
+class RefreshToken(models.Model):
+    """
+    Refresh token exchanging for new signed access tokens, see
+    user/tokens.py. Only the SHA-256 of the token is stored.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='refresh_tokens',
+    )
+    key_hash = models.CharField(max_length=64, unique=True)
+    # the user's token version when issued, older ones are revoked
+    token_version = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user}_{self.expires_at}"
+
+
+class SyncChange(models.Model):
+    """
+    One entry of the change feed clients sync from.
+    The id is the change sequence; deleted entries are the tombstones of
+    removed objects. Catalog changes have no user.
+    """
+    KIND_CHOICES = [
+        ('strength_log', 'Strength Exercise Log'),
+        ('track_log', 'Track Exercise Log'),
+        ('strength_exercise', 'Strength Exercise'),
+        ('track_exercise', 'Track Exercise'),
+        ('muscle_group', 'Muscle Group'),
+    ]
+    # no database constraint: tombstones of a user's logs are written
+    # while the user itself is being deleted
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='sync_change_user_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id}_{self.kind}_{self.object_id}"
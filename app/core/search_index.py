@@ -0,0 +1,117 @@
+"""
+Full-text index of the strength exercises and its upkeep on SQLite
+
+The statements creating the index are run by migration 0023, which
+imports them from here. Django rebuilds core_strengthexercise on SQLite
+for most AddField and AlterField migrations, which drops the triggers
+keeping the FTS table in sync. After every migrate, missing triggers are
+installed again and the FTS table rebuilt from the rows changed
+meanwhile, so migrations need not restore them themselves.
+"""
+from django.db import connections, transaction
+
+# SQLite: an FTS5 table indexing the strength exercise rows, kept in sync
+# by triggers. Weights are given at query time with bm25().
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER core_strengthexercise_fts_insert
+    AFTER INSERT ON core_strengthexercise BEGIN
+        INSERT INTO core_strengthexercise_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER core_strengthexercise_fts_delete
+    AFTER DELETE ON core_strengthexercise BEGIN
+        INSERT INTO core_strengthexercise_fts(
+            core_strengthexercise_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER core_strengthexercise_fts_update
+    AFTER UPDATE OF name, description ON core_strengthexercise BEGIN
+        INSERT INTO core_strengthexercise_fts(
+            core_strengthexercise_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO core_strengthexercise_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_strengthexercise_fts USING fts5(
+        name, description,
+        content='core_strengthexercise', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    *SQLITE_TRIGGERS,
+    """
+    INSERT INTO core_strengthexercise_fts(core_strengthexercise_fts)
+    VALUES ('rebuild')
+    """,
+]
+SQLITE_DROP_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS core_strengthexercise_fts_update',
+    'DROP TRIGGER IF EXISTS core_strengthexercise_fts_delete',
+    'DROP TRIGGER IF EXISTS core_strengthexercise_fts_insert',
+]
+SQLITE_BACKWARD = [
+    *SQLITE_DROP_TRIGGERS,
+    'DROP TABLE IF EXISTS core_strengthexercise_fts',
+]
+
+# PostgreSQL: a GIN index over the weighted document, the expression must
+# match exercise/search.py for the planner to use it.
+POSTGRESQL_FORWARD = [
+    """
+    CREATE INDEX core_strengthexercise_search_idx
+    ON core_strengthexercise USING GIN ((
+        setweight(to_tsvector('english', name), 'A') ||
+        setweight(to_tsvector('english', description), 'B')
+    ))
+    """,
+]
+POSTGRESQL_BACKWARD = [
+    'DROP INDEX IF EXISTS core_strengthexercise_search_idx',
+]
+
+
+FTS_TABLE = 'core_strengthexercise_fts'
+SEARCH_TRIGGERS = frozenset({
+    'core_strengthexercise_fts_insert',
+    'core_strengthexercise_fts_delete',
+    'core_strengthexercise_fts_update',
+})
+
+
+def installed_search_triggers(connection):
+    """Return the names of the search triggers of a SQLite database."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type = 'trigger' AND tbl_name = 'core_strengthexercise'"
+        )
+        return {row[0] for row in cursor.fetchall()} & SEARCH_TRIGGERS
+
+
+def ensure_search_triggers(using='default', **kwargs):
+    """Reinstall the search triggers a migration dropped (post_migrate)"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    if FTS_TABLE not in connection.introspection.table_names():
+        # migrated back before the index
+        return
+    if installed_search_triggers(connection) == SEARCH_TRIGGERS:
+        return
+
+    with transaction.atomic(using), connection.cursor() as cursor:
+        for statement in SQLITE_DROP_TRIGGERS:
+            cursor.execute(statement)
+        for statement in SQLITE_TRIGGERS:
+            cursor.execute(statement)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
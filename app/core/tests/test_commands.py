@@ -2,14 +2,26 @@
 Test custom Django management commands.
 """
 
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch  # mock the errors
 from psycopg2 import OperationalError as Psycopg2Error
 # errro that we might get if we connect db and db is not available
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 # simulate the command and check if it works
 from django.db.utils import OperationalError
 # check if the command is available
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+
+from core.models import (
+    ExerciseLogImport,
+    StrengthExercise,
+    StrengthExerciseLog,
+    StrengthExerciseLogRollup,
+)
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -32,3 +44,126 @@ class CommandTests(SimpleTestCase):
         self.assertEqual(patched_check.call_count, 7)
 
         patched_check.assert_called_with(databases=['default'])
+
+
+class RebuildLogRollupsTests(TestCase):
+    """Test rebuilding the strength log rollups"""
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        exercise = StrengthExercise.objects.create(name='squat')
+        for reps in (10, 20):
+            StrengthExerciseLog.objects.create(
+                user=self.user, exercise=exercise,
+                reps=reps, sets=2, calories_burned=30,
+            )
+
+    def test_verify_reports_missing_rollups(self):
+        """Test verify fails while the rollups are out of date"""
+        StrengthExerciseLogRollup.objects.update(reps=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_log_rollups', '--verify',
+                         stdout=StringIO())
+
+    def test_rebuild_rollups(self):
+        """Test rebuild recomputes the rollups from the raw logs"""
+        call_command('rebuild_log_rollups', '--chunk-size', '1',
+                     stdout=StringIO())
+
+        rollup = StrengthExerciseLogRollup.objects.get(user=self.user)
+        self.assertEqual(rollup.log_count, 2)
+        self.assertEqual(rollup.reps, 30)
+        self.assertEqual(rollup.sets, 4)
+        self.assertEqual(rollup.calories_burned, 60)
+        call_command('rebuild_log_rollups', '--verify', stdout=StringIO())
+
+
+class ExportLogsTests(TestCase):
+    """Test exporting exercise logs"""
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        exercise = StrengthExercise.objects.create(name='squat')
+        for reps in (10, 20):
+            StrengthExerciseLog.objects.create(
+                user=self.user, exercise=exercise,
+                reps=reps, sets=2, calories_burned=30,
+            )
+
+    def test_export_logs_csv(self):
+        """Test every log is exported with its user"""
+        out = StringIO()
+        call_command('export_logs', '--output-format', 'csv',
+                     '--chunk-size', '1', stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(
+            lines[0],
+            'user,id,timestamp,exercise,reps,sets,calories_burned',
+        )
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith('user@example.com,'))
+
+    def test_export_logs_unknown_user(self):
+        """Test exporting the logs of an unknown user fails"""
+        with self.assertRaises(CommandError):
+            call_command('export_logs', '--user', 'nobody@example.com',
+                         stdout=StringIO())
+
+
+class ImportLogsTests(TestCase):
+    """Test importing exercise logs"""
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        StrengthExercise.objects.create(name='squat')
+        handle, self.path = tempfile.mkstemp(suffix='.ndjson')
+        with os.fdopen(handle, 'w') as source:
+            for reps in (10, 20, 30):
+                source.write(f'{{"exercise": "squat", "reps": {reps}, '
+                             f'"sets": 1, "calories_burned": 5}}\n')
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_import_logs(self):
+        """Test every row of the file is imported for the user"""
+        call_command('import_logs', self.path, '--user', 'user@example.com',
+                     '--batch-size', '2', stdout=StringIO())
+
+        log_import = ExerciseLogImport.objects.get()
+        self.assertEqual(log_import.status, 'completed')
+        self.assertEqual(log_import.file_format, 'ndjson')
+        self.assertEqual(
+            StrengthExerciseLog.objects.filter(user=self.user).count(), 3)
+
+    def test_resume_import(self):
+        """Test resuming continues after the recorded offset"""
+        with open(self.path, 'rb') as source:
+            first_line = len(source.readline())
+        log_import = ExerciseLogImport.objects.create(
+            user=self.user, kind='strength', file_format='ndjson',
+            total_bytes=os.path.getsize(self.path),
+            byte_offset=first_line, rows_imported=1,
+        )
+
+        call_command('import_logs', self.path,
+                     '--resume', str(log_import.id), stdout=StringIO())
+
+        self.assertEqual(
+            sorted(StrengthExerciseLog.objects.values_list('reps',
+                                                           flat=True)),
+            [20, 30],
+        )
+
+    def test_resume_running_import_rejected(self):
+        """Test an import running elsewhere is not resumed twice"""
+        log_import = ExerciseLogImport.objects.create(
+            user=self.user, kind='strength', file_format='ndjson',
+            total_bytes=os.path.getsize(self.path), status='running',
+        )
+
+        with self.assertRaises(CommandError):
+            call_command('import_logs', self.path,
+                         '--resume', str(log_import.id), stdout=StringIO())
+        self.assertFalse(StrengthExerciseLog.objects.exists())
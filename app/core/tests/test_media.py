@@ -0,0 +1,130 @@
+"""
+Test serving the uploaded media files
+"""
+import hashlib
+import os
+import tempfile
+
+from django.http import Http404, HttpResponseNotFound
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils.http import http_date
+
+from core.media import serve_media
+
+CONTENT = b'0123456789abcdef'
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+CONTENT_NAME = (f'uploads/strength_exercise/{DIGEST[:2]}/{DIGEST[2:4]}/'
+                f'{DIGEST}.png')
+PLAIN_NAME = 'uploads/strength_exercise/plain.png'
+
+
+class MediaServingTests(SimpleTestCase):
+    """Test the media files view"""
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name,
+                                            MEDIA_OFFLOAD=''))
+        for name in (PLAIN_NAME, CONTENT_NAME,
+                     'uploads/log_import/history.csv'):
+            path = os.path.join(self.media.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as media_file:
+                media_file.write(CONTENT)
+
+    def tearDown(self):
+        self.media.cleanup()
+
+    def get(self, name, **headers):
+        request = RequestFactory().get(f'/media/{name}', headers=headers)
+        try:
+            return serve_media(request, name)
+        except Http404:
+            return HttpResponseNotFound()
+
+    def test_serve_file(self):
+        """Test a file is served with validators and caching headers"""
+        res = self.get(PLAIN_NAME)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT)
+        self.assertEqual(res['Content-Type'], 'image/png')
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertEqual(res['Cache-Control'], 'public, max-age=3600')
+        self.assertTrue(res['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', res)
+
+    def test_content_addressed_file_is_immutable(self):
+        """Test files named after their content are cached for good"""
+        res = self.get(CONTENT_NAME)
+
+        self.assertEqual(res['ETag'], f'"{DIGEST}"')
+        self.assertIn('immutable', res['Cache-Control'])
+
+    def test_conditional_requests(self):
+        """Test matching validators are answered with 304"""
+        res = self.get(CONTENT_NAME, if_none_match=f'"{DIGEST}"')
+        self.assertEqual(res.status_code, 304)
+
+        last_modified = self.get(PLAIN_NAME)['Last-Modified']
+        res = self.get(PLAIN_NAME, if_modified_since=last_modified)
+        self.assertEqual(res.status_code, 304)
+
+    def test_byte_ranges(self):
+        """Test single byte ranges are answered with 206"""
+        res = self.get(CONTENT_NAME, range='bytes=2-5')
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(b''.join(res.streaming_content), b'2345')
+        self.assertEqual(res['Content-Range'], 'bytes 2-5/16')
+        self.assertEqual(res['Content-Length'], '4')
+
+        res = self.get(CONTENT_NAME, range='bytes=-3')
+        self.assertEqual(b''.join(res.streaming_content), b'def')
+
+        res = self.get(CONTENT_NAME, range='bytes=20-')
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res['Content-Range'], 'bytes */16')
+
+    def test_if_range_mismatch_sends_whole_file(self):
+        """Test a range of a changed file is answered with the file"""
+        res = self.get(CONTENT_NAME, range='bytes=2-5',
+                       if_range='"outdated"')
+        self.assertEqual(res.status_code, 200)
+
+        res = self.get(CONTENT_NAME, range='bytes=2-5',
+                       if_range=http_date(0))
+        self.assertEqual(res.status_code, 200)
+
+    def test_missing_and_outside_files(self):
+        """Test missing files and paths out of MEDIA_ROOT are not found"""
+        self.assertEqual(self.get('uploads/strength_exercise/missing.png')
+                         .status_code, 404)
+        self.assertEqual(self.get('uploads/strength_exercise').status_code,
+                         404)
+        self.assertEqual(self.get('../../etc/passwd').status_code, 404)
+
+    def test_private_files_not_served(self):
+        """Test files outside the public prefixes are not found"""
+        for name in ('uploads/log_import/history.csv',
+                     'uploads/strength_exercise/../log_import/history.csv',
+                     'uploads/strength_exercise/../../uploads/log_import/'
+                     'history.csv'):
+            self.assertEqual(self.get(name).status_code, 404)
+
+    @override_settings(MEDIA_OFFLOAD='x-accel-redirect',
+                       MEDIA_ACCEL_PREFIX='/protected-media/')
+    def test_offload_to_nginx(self):
+        """Test the file is handed to nginx with X-Accel-Redirect"""
+        res = self.get(CONTENT_NAME)
+
+        self.assertEqual(res['X-Accel-Redirect'],
+                         f'/protected-media/{CONTENT_NAME}')
+        self.assertEqual(res.content, b'')
+        self.assertIn('immutable', res['Cache-Control'])
+
+    @override_settings(MEDIA_OFFLOAD='x-sendfile')
+    def test_offload_with_sendfile(self):
+        """Test the file is handed to the web server with X-Sendfile"""
+        res = self.get(PLAIN_NAME)
+
+        self.assertEqual(res['X-Sendfile'],
+                         os.path.join(self.media.name, PLAIN_NAME))
@@ -4,10 +4,12 @@ Tests for models
 # from unittest.mock import patch
 # from decimal import Decimal
 
-from unittest.mock import patch
+import hashlib
+
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
 from core import models
 
 from datetime import datetime as dt
@@ -215,15 +217,17 @@ class ModelTests(TestCase):
     #     with self.assertRaises(ValidationError):
     #         strength_exercise.full_clean()
 
-    @patch('core.models.uuid.uuid4')
-    def test_stExercise_file_name_uuid(self, mock_uuid):
-        """Test the file name for the strength exercise image"""
-        uuid = 'test-uuid'
-        mock_uuid.return_value = uuid
-        file_path = models.strengthExercise_image_file_path(None, 'exmp.jpg')
-
-        expected_path = f'uploads/strength_exercise/{uuid}.jpg'
-        self.assertEqual(file_path, expected_path)
+    def test_stExercise_file_name_content_hash(self):
+        """Test the strength exercise image is named after its content"""
+        file_path = models.strengthExercise_image_file_path(None, 'exmp.JPG')
+        storage = models.StrengthExercise._meta.get_field('image').storage
+        content = ContentFile(b'image', name='exmp.JPG')
+
+        digest = hashlib.sha256(b'image').hexdigest()
+        expected_path = (f'uploads/strength_exercise/{digest[:2]}/'
+                         f'{digest[2:4]}/{digest}.jpg')
+        self.assertEqual(storage.content_name(file_path, content),
+                         expected_path)
 
 ##############################################################################
 # The following tests are for the Track exercise model
@@ -0,0 +1,54 @@
+"""
+Test the upkeep of the SQLite full-text index
+"""
+import unittest
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from core.models import StrengthExercise
+from core.search_index import (
+    SEARCH_TRIGGERS,
+    ensure_search_triggers,
+    installed_search_triggers,
+)
+from exercise.search import search_strength_exercises
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite FTS index')
+class SearchTriggerTests(TestCase):
+    """Test the search triggers survive table rebuilds"""
+
+    def test_triggers_installed_after_migrate(self):
+        """Test every search trigger exists in the migrated database"""
+        self.assertEqual(installed_search_triggers(connection),
+                         SEARCH_TRIGGERS)
+
+    def test_missing_triggers_reinstalled(self):
+        """Test dropped triggers are installed again and the index caught up"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DROP TRIGGER core_strengthexercise_fts_insert')
+        StrengthExercise.objects.create(name='Deadlift')
+
+        ensure_search_triggers()
+
+        self.assertEqual(installed_search_triggers(connection),
+                         SEARCH_TRIGGERS)
+        self.assertEqual(
+            [exercise.name for exercise in
+             search_strength_exercises('deadlift')],
+            ['Deadlift'],
+        )
+
+    def test_migrate_reinstalls_triggers(self):
+        """Test migrate runs the reinstall after its migrations"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DROP TRIGGER core_strengthexercise_fts_update')
+
+        call_command('migrate', verbosity=0)
+
+        self.assertEqual(installed_search_triggers(connection),
+                         SEARCH_TRIGGERS)
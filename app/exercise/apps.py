@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ExerciseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exercise'
+
+    def ready(self):
+        from exercise import signals  # noqa: F401
@@ -0,0 +1,209 @@
+"""
+Prefix autocomplete over the exercise names
+
+Every process keeps the strength and track exercise names in sorted
+lists and answers a prefix with a binary search, without a database
+round trip. The index is built in a background thread on the first
+request of each process, so that no autocomplete request pays for the
+catalog load, and rebuilt when the catalog version changes. Matches are
+ranked by the user's recent usage, then names starting with the prefix,
+then names with a later word starting with it.
+"""
+import logging
+import re
+import threading
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from core.models import (
+    StrengthExercise,
+    StrengthExerciseLog,
+    TrackExercise,
+    TrackExerciseLog,
+)
+from exercise.catalog import get_catalog_version
+from user.analytics.cache import cached_analytics
+
+# kind: (exercise model, log model)
+AUTOCOMPLETE_KINDS = {
+    'strength': (StrengthExercise, StrengthExerciseLog),
+    'track': (TrackExercise, TrackExerciseLog),
+}
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+RECENT_USAGE_DAYS = 90
+
+WORD_RE = re.compile(r'\w+')
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text):
+    """Return the words of `text` lowercased and joined by single spaces."""
+    return ' '.join(WORD_RE.findall(text.casefold()))
+
+
+class PrefixIndex:
+    """Sorted keys of (kind, name) entries, searched by prefix."""
+
+    def __init__(self, items):
+        items = sorted(items)
+        self.keys = [key for key, _entry in items]
+        self.entries = [entry for _key, entry in items]
+
+    def search(self, prefix):
+        """Yield the entries whose key starts with `prefix`, in key order."""
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and \
+                self.keys[position].startswith(prefix):
+            yield self.entries[position]
+            position += 1
+
+
+class NameIndex:
+    """Prefix indexes of the exercise names of one catalog version."""
+
+    def __init__(self, version, names):
+        self.version = version
+        self.names = frozenset(names)
+        self.indexes = {None: self._prefix_indexes(self.names)}
+        for kind in AUTOCOMPLETE_KINDS:
+            self.indexes[kind] = self._prefix_indexes(
+                [entry for entry in self.names if entry[0] == kind])
+
+    @staticmethod
+    def _prefix_indexes(names):
+        """Index the whole names and, separately, their later words"""
+        full, inner = [], []
+        for kind, name in names:
+            words = normalize(name).split(' ')
+            full.append((' '.join(words), (kind, name)))
+            inner.extend((' '.join(words[position:]), (kind, name))
+                         for position in range(1, len(words)))
+        return PrefixIndex(full), PrefixIndex(inner)
+
+    @classmethod
+    def build(cls, version):
+        names = []
+        for kind, (exercise_model, _log_model) in AUTOCOMPLETE_KINDS.items():
+            names.extend((kind, name) for name in
+                         exercise_model.objects.values_list('name',
+                                                            flat=True))
+        return cls(version, names)
+
+    def search(self, prefix, kind=None):
+        """Yield the names starting with `prefix`, then the others."""
+        full, inner = self.indexes[kind]
+        yield from full.search(prefix)
+        yield from inner.search(prefix)
+
+
+_index = None
+_index_lock = threading.Lock()
+_warm_up = None
+_warm_up_lock = threading.Lock()
+
+
+def get_name_index():
+    """Return the name index of the current catalog version."""
+    global _index
+    version = get_catalog_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+
+    if not _index_lock.acquire(blocking=index is None):
+        # another thread is rebuilding, the previous index will do
+        return index
+    try:
+        if _index is None or _index.version != version:
+            _index = NameIndex.build(version)
+        return _index
+    finally:
+        _index_lock.release()
+
+
+def _build_in_background():
+    try:
+        get_name_index()
+    except Exception:
+        logger.exception('Could not build the autocomplete index')
+    finally:
+        connection.close()
+
+
+def warm_name_index():
+    """
+    Start building the name index in a background thread, once per
+    process. Requests needing the index meanwhile wait for this build.
+    Returns the thread, None when the index exists already.
+    """
+    global _warm_up
+    if _warm_up is not None or _index is not None:
+        return None
+    with _warm_up_lock:
+        if _warm_up is not None:
+            return None
+        _warm_up = threading.Thread(target=_build_in_background,
+                                    name='autocomplete-index', daemon=True)
+        _warm_up.start()
+        return _warm_up
+
+
+def _matches(name, prefix):
+    words = normalize(name).split(' ')
+    return any(' '.join(words[position:]).startswith(prefix)
+               for position in range(len(words)))
+
+
+def get_recent_exercises(user):
+    """
+    Return the (kind, name) of the exercises the user logged recently,
+    most used first. Cached until the user logs again.
+    """
+    today = timezone.localdate()
+
+    def compute():
+        since = timezone.now() - timedelta(days=RECENT_USAGE_DAYS)
+        usage = []
+        for kind, (_exercise_model, log_model) in AUTOCOMPLETE_KINDS.items():
+            rows = log_model.objects.filter(
+                user=user, timestamp__gte=since,
+            ).values('exercise__name').annotate(
+                uses=Count('id'), last_used=Max('timestamp'),
+            ).order_by()
+            usage.extend((row['uses'], row['last_used'], kind,
+                          row['exercise__name']) for row in rows)
+        usage.sort(reverse=True)
+        return [(kind, name) for _uses, _last_used, kind, name in usage]
+
+    return cached_analytics(user, 'recent-exercises', (today, ), compute)
+
+
+def autocomplete(user, query, kind=None, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Return up to `limit` (kind, name) of exercises with a word starting
+    with `query`, optionally of one kind, ranked for the user.
+    """
+    prefix = normalize(query)
+    index = get_name_index()
+    results = []
+    seen = set()
+
+    def add(entries):
+        for entry in entries:
+            if len(results) >= limit:
+                return
+            if entry not in seen:
+                seen.add(entry)
+                results.append(entry)
+
+    add(entry for entry in get_recent_exercises(user)
+        if entry in index.names and (kind is None or entry[0] == kind)
+        and _matches(entry[1], prefix))
+    add(index.search(prefix, kind))
+    return results
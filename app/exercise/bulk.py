@@ -0,0 +1,124 @@
+"""
+Batch ingestion of exercise logs
+"""
+from django.db import transaction
+from django.utils.translation import gettext as _
+
+from core.models import (
+    StrengthExercise,
+    StrengthExerciseLog,
+    TrackExercise,
+    TrackExerciseLog,
+)
+from exercise.serializers import (
+    StrengthExerciseLogBatchItemSerializer,
+    TrackExerciseLogBatchItemSerializer,
+)
+from exercise.sync import record_changes
+from user.analytics.cache import invalidate_user_analytics
+from user.analytics.rollups import apply_strength_log_changes
+
+# batch key: (log model, item serializer, exercise model)
+LOG_KINDS = {
+    'strength': (StrengthExerciseLog,
+                 StrengthExerciseLogBatchItemSerializer,
+                 StrengthExercise),
+    'track': (TrackExerciseLog,
+              TrackExerciseLogBatchItemSerializer,
+              TrackExercise),
+}
+BULK_CREATE_BATCH_SIZE = 500
+
+
+def resolve_exercise_names(exercise_model, names):
+    """Return {name: id} of the exercises named in `names`, in one query."""
+    return dict(
+        exercise_model.objects.filter(name__in=set(names))
+        .values_list('name', 'id')
+    )
+
+
+def load_exercise_names(kind):
+    """Return {name: id} of every exercise of a log kind."""
+    exercise_model = LOG_KINDS[kind][2]
+    return dict(exercise_model.objects.values_list('name', 'id'))
+
+
+def build_logs(user, kind, items, exercise_ids=None):
+    """
+    Validate the raw `items` of one log kind.
+    Exercise names are looked up in `exercise_ids` when given, otherwise
+    resolved with one query.
+    Return the unsaved logs and one result per item, where the results of
+    the valid items are completed once the logs are saved.
+    """
+    log_model, item_serializer, exercise_model = LOG_KINDS[kind]
+
+    validated = []
+    results = []
+    for item in items:
+        serializer = item_serializer(data=item)
+        if serializer.is_valid():
+            validated.append((len(results), serializer.validated_data))
+            results.append(None)
+        else:
+            results.append({'status': 'invalid',
+                            'errors': serializer.errors})
+
+    if exercise_ids is None:
+        exercise_ids = resolve_exercise_names(
+            exercise_model, (data['exercise'] for index, data in validated))
+
+    logs = []
+    for index, data in validated:
+        name = data.pop('exercise')
+        if name not in exercise_ids:
+            msg = _('Object with name=%s does not exist.') % name
+            results[index] = {'status': 'invalid',
+                              'errors': {'exercise': [msg]}}
+            continue
+        log = log_model(user=user, exercise_id=exercise_ids[name], **data)
+        results[index] = log
+        logs.append(log)
+
+    return logs, results
+
+
+def save_logs(user, kind, logs):
+    """
+    Insert built logs of one kind for the user with bulk_create and
+    account for them in the rollups, analytics cache and sync feed
+    (bulk_create sends no post_save signals).
+    """
+    if not logs:
+        return
+    with transaction.atomic():
+        LOG_KINDS[kind][0].objects.bulk_create(
+            logs, batch_size=BULK_CREATE_BATCH_SIZE)
+        record_changes(logs)
+        if kind == 'strength':
+            apply_strength_log_changes(added=logs)
+        invalidate_user_analytics(user.pk)
+
+
+def ingest_log_batch(user, batch):
+    """
+    Create the valid logs of a batch for the user in one transaction,
+    with a single INSERT per log kind and batch of rows.
+    Return the per-item results of every kind, in request order.
+    """
+    built = {kind: build_logs(user, kind, batch.get(kind, []))
+             for kind in LOG_KINDS}
+
+    with transaction.atomic():
+        for kind, (logs, results) in built.items():
+            save_logs(user, kind, logs)
+
+    return {
+        kind: [
+            result if isinstance(result, dict)
+            else {'status': 'created', 'id': result.pk}
+            for result in results
+        ]
+        for kind, (logs, results) in built.items()
+    }
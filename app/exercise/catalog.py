@@ -0,0 +1,66 @@
+"""
+Versioning of the exercise catalog
+
+The catalog (strength exercises, track exercises and muscle groups) is
+read far more often than it changes. Data derived from it is cached under
+the current catalog version, which is bumped on every catalog write.
+The list responses themselves are kept as snapshots: JSON rendered once
+per catalog version and served as bytes with an ETag.
+
+The version lives in the default cache, which must be shared by every
+process (REDIS_URL) for a bump to reach all of them.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def get_catalog_version():
+    """Return the current version of the exercise catalog."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # start from the clock so a version lost to eviction can never
+        # be handed out again
+        cache.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate everything cached under the current catalog version."""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+
+
+def catalog_changed():
+    """
+    Bump the catalog version now and once the current transaction
+    commits: the first bump keeps the writing transaction from reading
+    the old snapshots, the second drops what other requests cached from
+    the old rows in between.
+    """
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
+
+
+def get_catalog_snapshot(name, render):
+    """
+    Return (etag, content) of the catalog response `name`, where
+    `render()` returns its JSON bytes and is only called once per
+    catalog version.
+    """
+    key = f'catalog:{get_catalog_version()}:snapshot:{name}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        content = render()
+        etag = '"%s"' % hashlib.md5(content).hexdigest()
+        snapshot = (etag, content)
+        cache.set(key, snapshot, timeout=settings.CATALOG_SNAPSHOT_TIMEOUT)
+    return snapshot
@@ -0,0 +1,90 @@
+"""
+Streaming export of exercise logs
+
+Rows are read with a values() projection through QuerySet.iterator(), so
+neither model instances nor serializers are built and memory stays flat
+whatever the size of the history.
+"""
+import csv
+import json
+from datetime import timedelta
+
+from django.utils.duration import duration_string
+
+from core.models import StrengthExerciseLog, TrackExerciseLog
+
+EXPORT_CHUNK_SIZE = 2000
+
+# log kind: (log model, ((column, lookup), ...))
+EXPORT_KINDS = {
+    'strength': (StrengthExerciseLog, (
+        ('id', 'id'),
+        ('timestamp', 'timestamp'),
+        ('exercise', 'exercise__name'),
+        ('reps', 'reps'),
+        ('sets', 'sets'),
+        ('calories_burned', 'calories_burned'),
+    )),
+    'track': (TrackExerciseLog, (
+        ('id', 'id'),
+        ('timestamp', 'timestamp'),
+        ('exercise', 'exercise__name'),
+        ('distance', 'distance'),
+        ('pace', 'pace'),
+        ('calories_burned', 'calories_burned'),
+    )),
+}
+USER_COLUMN = ('user', 'user__email')
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _export_value(value):
+    """Return a log value as it is written out by the API."""
+    if isinstance(value, timedelta):
+        return duration_string(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if value is None or isinstance(value, (int, str)):
+        return value
+    return str(value)
+
+
+def export_rows(queryset, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """Iterate the export values of the logs in timestamp order."""
+    lookups = [lookup for _column, lookup in columns]
+    rows = queryset.order_by('timestamp', 'id').values_list(*lookups)
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield [_export_value(value) for value in row]
+
+
+def iter_ndjson(rows, columns):
+    """Yield one JSON object per line."""
+    names = [column for column, _lookup in columns]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row))) + '\n'
+
+
+class _Echo:
+    """File-like object handing back what the csv writer writes."""
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, columns):
+    """Yield a header line followed by one line per row."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([column for column, _lookup in columns])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_export(queryset, columns, output, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the export of the logs as `output` (ndjson or csv) lines."""
+    rows = export_rows(queryset, columns, chunk_size)
+    if output == 'csv':
+        return iter_csv(rows, columns)
+    return iter_ndjson(rows, columns)
@@ -0,0 +1,67 @@
+"""
+Resized and recompressed variants of an exercise image
+
+Pillow only, no Django: the functions run in the image worker processes
+(exercise/images.py), which import this module on their own.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+# size: longest side in pixels, largest first so that every size is
+# resized from the previous one instead of the original
+VARIANT_SIZES = (
+    ('large', 1280),
+    ('medium', 640),
+    ('small', 320),
+    ('thumbnail', 160),
+)
+# format: (Pillow format, save options)
+VARIANT_FORMATS = {
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+
+def _flatten(image):
+    """Return the image in RGB, transparency over a white background."""
+    if image.mode in ('RGBA', 'LA') or \
+            (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, variant_format):
+    pillow_format, options = VARIANT_FORMATS[variant_format]
+    if variant_format == 'jpeg':
+        image = _flatten(image)
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info
+                              or image.mode in ('LA', 'PA') else 'RGB')
+    output = io.BytesIO()
+    image.save(output, pillow_format, **options)
+    return output.getvalue()
+
+
+def render_variants(data):
+    """
+    Return {size: {format: bytes}} of the image in `data`. Images are
+    never enlarged, a size larger than the image recompresses it as is.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        largest = VARIANT_SIZES[0][1]
+        # JPEG can decode at a fraction of the resolution for free
+        source.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(source)
+        image.load()
+
+    variants = {}
+    for size, longest_side in VARIANT_SIZES:
+        image.thumbnail((longest_side, longest_side),
+                        Image.Resampling.LANCZOS, reducing_gap=3.0)
+        variants[size] = {variant_format: _encode(image, variant_format)
+                          for variant_format in VARIANT_FORMATS}
+    return variants
@@ -0,0 +1,257 @@
+"""
+Responsive variants of the strength exercise images
+
+Once an upload is committed, the original is read from storage and handed
+to a bounded process pool that renders the variants (see
+exercise/image_variants.py). A writer thread stores them under
+`variants/<image name>/` next to the original and records their names on
+StrengthExercise.image_variants. When the pool is full the image is left
+without variants, `manage.py generate_image_variants` catches up.
+With IMAGE_VARIANT_WORKERS = 0 the variants are rendered in the request.
+
+Images are named after their content (core/storage.py), so exercises
+with the same image share the original and its variants. Once the last
+exercise using an image replaces it or is deleted, the image and its
+variants are deleted when that commits, unless the image was stored or
+reused within IMAGE_SWEEP_GRACE seconds: an upload of the same content
+still in its transaction may be about to use it. `manage.py
+sweep_images`, run periodically, deletes those left over.
+"""
+import logging
+import multiprocessing
+import posixpath
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+from core.models import StrengthExercise
+from exercise.image_variants import (
+    VARIANT_FORMATS,
+    VARIANT_SIZES,
+    render_variants,
+)
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_writer = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+def _image_storage():
+    return StrengthExercise._meta.get_field('image').storage
+
+
+def variant_name(image_name, size, variant_format):
+    """Return the storage name of a variant of an image."""
+    directory, filename = posixpath.split(image_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'variants', stem,
+                          f'{size}.{variant_format}')
+
+
+def delete_variants(image_name):
+    """Delete the stored variants of an image."""
+    for size, _longest_side in VARIANT_SIZES:
+        for variant_format in VARIANT_FORMATS:
+            default_storage.delete(
+                variant_name(image_name, size, variant_format))
+
+
+def _image_names(storage, directory):
+    """Yield the names of the stored images under a directory."""
+    try:
+        directories, filenames = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in filenames:
+        yield posixpath.join(directory, filename)
+    for subdirectory in directories:
+        if subdirectory != 'variants':
+            yield from _image_names(storage,
+                                    posixpath.join(directory, subdirectory))
+
+
+def _release(storage, image_name, grace):
+    """Delete an unused image and its variants, returns if it did."""
+    try:
+        # saving the same content again refreshes the time
+        modified = storage.get_modified_time(image_name).timestamp()
+    except FileNotFoundError:
+        return False
+    if modified > time.time() - grace or \
+            StrengthExercise.objects.filter(image=image_name).exists():
+        return False
+    delete_variants(image_name)
+    storage.delete(image_name)
+    return True
+
+
+def release_image(image_name):
+    """
+    Delete an image and its variants once no exercise uses it and it was
+    not stored or reused for IMAGE_SWEEP_GRACE seconds, returns whether
+    they were deleted.
+    """
+    if not image_name:
+        return False
+    return _release(_image_storage(), image_name, settings.IMAGE_SWEEP_GRACE)
+
+
+def sweep_images(grace=None):
+    """
+    Delete the images, and their variants, that no exercise uses and
+    that were not stored or reused for `grace` seconds (defaults to
+    IMAGE_SWEEP_GRACE), returns how many were deleted.
+    """
+    if grace is None:
+        grace = settings.IMAGE_SWEEP_GRACE
+    storage = _image_storage()
+    directory = posixpath.dirname(
+        StrengthExercise._meta.get_field('image').upload_to(None, 'image'))
+    used = set(StrengthExercise.objects.exclude(image='')
+               .values_list('image', flat=True))
+
+    deleted = 0
+    for image_name in _image_names(storage, directory):
+        if image_name not in used and \
+                _release(storage, image_name, grace):
+            deleted += 1
+    return deleted
+
+
+def _record_variants(exercise_id, image_name, variants):
+    """Record the variants of an exercise unless its image changed"""
+    exercise = StrengthExercise.objects.filter(pk=exercise_id,
+                                               image=image_name).first()
+    if exercise is None:
+        return False
+    exercise.image_variants = variants
+    exercise.save(update_fields=['image_variants', 'updated_at'])
+    return True
+
+
+def _store_variants(exercise_id, image_name, rendered):
+    """Save rendered variants and record them if the image is unchanged."""
+    variants = {}
+    for size, encoded in rendered.items():
+        variants[size] = {}
+        for variant_format, data in encoded.items():
+            name = variant_name(image_name, size, variant_format)
+            # rendered from the same content, so an existing file is kept
+            # in place as the other exercises sharing the image read it
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(data))
+            variants[size][variant_format] = name
+
+    if not _record_variants(exercise_id, image_name, variants):
+        # the image was replaced, or the exercise deleted, meanwhile
+        release_image(image_name)
+        return None
+    return variants
+
+
+def generate_image_variants(exercise_id, image_name):
+    """Render and store the variants of an image in this process."""
+    with _image_storage().open(image_name, 'rb') as image_file:
+        data = image_file.read()
+    return _store_variants(exercise_id, image_name, render_variants(data))
+
+
+def _get_pool():
+    global _pool, _writer, _slots
+    with _pool_lock:
+        workers = settings.IMAGE_VARIANT_WORKERS
+        if _pool is None:
+            # spawned, not forked: the workers only need Pillow and must
+            # not share the database connections of this process
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'))
+        if _writer is None:
+            _writer = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='image-variants')
+            _slots = threading.BoundedSemaphore(
+                workers + settings.IMAGE_VARIANT_QUEUE_SIZE)
+        return _pool
+
+
+def _reset_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _write(exercise_id, image_name, future):
+    try:
+        _store_variants(exercise_id, image_name, future.result())
+    except BrokenProcessPool:
+        logger.error('Image worker died rendering %s', image_name)
+    except Exception:
+        logger.exception('Could not render the variants of %s', image_name)
+    finally:
+        _slots.release()
+        close_old_connections()
+
+
+def submit_image_variants(exercise_id, image_name):
+    """
+    Queue the variants of an image on the process pool, returns False
+    when the pool is full.
+    """
+    if settings.IMAGE_VARIANT_WORKERS <= 0:
+        generate_image_variants(exercise_id, image_name)
+        return True
+
+    pool = _get_pool()
+    if not _slots.acquire(blocking=False):
+        logger.warning('Image variant queue is full, skipped %s', image_name)
+        return False
+    try:
+        with _image_storage().open(image_name, 'rb') as image_file:
+            future = pool.submit(render_variants, image_file.read())
+    except BrokenProcessPool:
+        # a worker died, the next upload starts a new pool
+        logger.error('Image worker pool is broken, skipped %s', image_name)
+        _slots.release()
+        _reset_pool(pool)
+        return False
+    except Exception:
+        _slots.release()
+        raise
+    # stored from the writer thread, which keeps its own connection
+    future.add_done_callback(
+        lambda done: _writer.submit(_write, exercise_id, image_name, done))
+    return True
+
+
+def image_uploaded(exercise, previous_name, previous_variants):
+    """
+    Once the transaction commits, release the previous image of an
+    exercise whose image was just saved and give it variants: the ones
+    it had for the same content, those of another exercise with the
+    same image, or new ones.
+    """
+    def committed(exercise_id, image_name):
+        if image_name == previous_name:
+            variants = previous_variants
+        else:
+            release_image(previous_name)
+            variants = StrengthExercise.objects.filter(image=image_name) \
+                .exclude(image_variants={}) \
+                .values_list('image_variants', flat=True).first()
+        if not (variants and
+                _record_variants(exercise_id, image_name, variants)):
+            submit_image_variants(exercise_id, image_name)
+
+    transaction.on_commit(partial(committed, exercise.pk, exercise.image.name))
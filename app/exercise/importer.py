@@ -0,0 +1,198 @@
+"""
+Streaming import of exercise logs from CSV or NDJSON files
+
+The file is read line by line and validated in batches against the
+exercise names loaded once per run. Each batch is inserted with
+bulk_create in the same transaction that advances the byte offset of the
+import, so an interrupted import resumes exactly after the last committed
+batch without duplicating or skipping rows. A run first claims the
+import under a row lock, so that two runs never read from the same
+offset. The uploaded file is deleted once the import is over.
+"""
+import csv
+import json
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from exercise.bulk import build_logs, load_exercise_names, save_logs
+
+IMPORT_BATCH_SIZE = 1000
+# only the first errors are kept on the import record
+MAX_RECORDED_ERRORS = 100
+# a running import not saved for this long was abandoned, e.g. by a
+# killed process, and may be claimed again
+ABANDONED_AFTER = timedelta(minutes=10)
+
+
+class ImportUnavailable(Exception):
+    """The import is completed or already running."""
+
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+def claim_import(log_import):
+    """
+    Mark an import running under a row lock and load its committed
+    progress into `log_import`. Raise ImportUnavailable if it is
+    completed or running elsewhere.
+    """
+    with transaction.atomic():
+        locked = type(log_import).objects.select_for_update() \
+            .get(pk=log_import.pk)
+        running = locked.status == 'running' and \
+            locked.updated_at > timezone.now() - ABANDONED_AFTER
+        if locked.status == 'completed' or running:
+            raise ImportUnavailable(locked.status)
+        locked.status = 'running'
+        locked.save(update_fields=['status', 'updated_at'])
+
+    for field in locked._meta.concrete_fields:
+        setattr(log_import, field.attname, getattr(locked, field.attname))
+
+
+class LogImporter:
+    """Import the logs of an ExerciseLogImport from a binary file."""
+
+    def __init__(self, log_import, source, batch_size=IMPORT_BATCH_SIZE,
+                 progress=None):
+        self.log_import = log_import
+        self.source = source
+        self.batch_size = batch_size
+        self.progress = progress
+        self.header = None
+
+    def run(self, max_rows=None):
+        """
+        Import from the recorded byte offset until the end of the file,
+        or until about `max_rows` more rows have been processed.
+        Return True once the import is over: the whole file imported, or
+        failed on a file that cannot be read.
+        """
+        log_import = self.log_import
+        self.exercise_ids = load_exercise_names(log_import.kind)
+        offset = log_import.byte_offset
+        line_number = log_import.line_offset
+        if log_import.file_format == 'csv':
+            self.source.seek(0)
+            header_line = self.source.readline()
+            try:
+                self.header = next(csv.reader([header_line.decode('utf-8')]))
+            except (UnicodeDecodeError, csv.Error, StopIteration) as error:
+                self._fail(1, str(error) or 'Invalid header.')
+                return True
+            if offset < len(header_line):
+                offset, line_number = len(header_line), 1
+        self.source.seek(offset)
+
+        processed = 0
+        batch = []
+        for line in iter(self.source.readline, b''):
+            offset += len(line)
+            line_number += 1
+            if line.strip():
+                batch.append((line_number, *self._parse_line(line)))
+            if len(batch) >= self.batch_size:
+                processed += len(batch)
+                self._commit(batch, offset, line_number)
+                batch = []
+                if max_rows is not None and processed >= max_rows:
+                    log_import.status = 'pending'
+                    log_import.save(update_fields=['status', 'updated_at'])
+                    return False
+
+        self._commit(batch, offset, line_number, completed=True)
+        return True
+
+    def _fail(self, line_number, message):
+        """Mark the import failed on a line no retry can get past."""
+        log_import = self.log_import
+        log_import.status = 'failed'
+        log_import.errors.append({
+            'line': line_number,
+            'errors': {'non_field_errors': [message]},
+        })
+        log_import.save(update_fields=['status', 'errors', 'updated_at'])
+
+    def _parse_line(self, line):
+        """Return the raw item of a line, or the errors it failed with."""
+        try:
+            text = line.decode('utf-8')
+            if self.header is not None:
+                values = next(csv.reader([text]))
+                item = dict(zip(self.header, values))
+            else:
+                item = json.loads(text)
+            if not isinstance(item, dict):
+                raise ValueError('Expected an object.')
+        except (UnicodeDecodeError, ValueError, StopIteration) as error:
+            return {'non_field_errors': [str(error) or 'Invalid line.']}, None
+
+        # empty CSV cells mean "not given"
+        return None, {key: value for key, value in item.items()
+                      if value not in ('', None)}
+
+    def _commit(self, batch, offset, line_offset, completed=False):
+        """
+        Save a batch of (line number, parse errors, item) and the new
+        offset atomically.
+        """
+        log_import = self.log_import
+        items = [item for _line, errors, item in batch if errors is None]
+        logs, results = build_logs(log_import.user, log_import.kind, items,
+                                   self.exercise_ids)
+        results = iter(results)
+
+        errors = []
+        for line_number, parse_errors, item in batch:
+            if parse_errors is None:
+                result = next(results)
+                if isinstance(result, dict):
+                    errors.append({'line': line_number,
+                                   'errors': result['errors']})
+            else:
+                errors.append({'line': line_number, 'errors': parse_errors})
+
+        with transaction.atomic():
+            save_logs(log_import.user, log_import.kind, logs)
+            log_import.byte_offset = offset
+            log_import.line_offset = line_offset
+            log_import.rows_imported += len(logs)
+            log_import.rows_failed += len(errors)
+            room = MAX_RECORDED_ERRORS - len(log_import.errors)
+            log_import.errors += errors[:max(room, 0)]
+            if completed:
+                log_import.status = 'completed'
+            log_import.save()
+
+        if self.progress:
+            self.progress(log_import)
+
+
+def discard_import_file(log_import):
+    """Delete the uploaded file of an import that is over."""
+    if log_import.file:
+        log_import.file.delete(save=False)
+        log_import.save(update_fields=['file', 'updated_at'])
+
+
+def run_import(log_import, source, max_rows=None,
+               batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Run an import claimed with claim_import from `source`, a binary file
+    positioned anywhere. An unexpected error marks the import failed; it
+    can be resumed later.
+    """
+    importer = LogImporter(log_import, source, batch_size, progress)
+    try:
+        finished = importer.run(max_rows)
+    except Exception:
+        log_import.status = 'failed'
+        log_import.save(update_fields=['status', 'updated_at'])
+        raise
+    if finished:
+        discard_import_file(log_import)
+    return finished
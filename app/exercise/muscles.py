@@ -0,0 +1,110 @@
+"""
+Muscle group bitmasks of the exercises
+
+MuscleGroup.MUSCLE_CHOICES is a small fixed set, so the muscle groups of
+an exercise are also stored as integers on the exercise, bit i standing
+for the i-th choice. Muscle group filters then test bits on the exercise
+rows instead of joining the muscle group tables. The masks are kept up to
+date from the muscle group signals (exercise/signals.py).
+The bit tests cannot use a B-tree index, so the masks are not indexed:
+they save the joins, not the scan of the exercise rows.
+"""
+from collections import defaultdict
+
+from django.db.models import F
+from rest_framework.exceptions import ValidationError
+
+from core.models import MuscleGroup
+
+MUSCLE_BITS = {name: 1 << position for position, (name, _label)
+               in enumerate(MuscleGroup.MUSCLE_CHOICES)}
+
+# muscle group field: mask field
+MASK_FIELDS = {
+    'primary_muscle_groups': 'primary_muscle_mask',
+    'secondary_muscle_groups': 'secondary_muscle_mask',
+}
+MUSCLE_ROLES = ('any', 'primary', 'secondary')
+
+
+def muscle_mask(names):
+    """Return the mask of muscle group names, unknown names are ignored."""
+    mask = 0
+    for name in names:
+        mask |= MUSCLE_BITS.get(name, 0)
+    return mask
+
+
+def refresh_muscle_masks(exercise_model, exercise_ids):
+    """Recompute the masks of the exercises from their muscle groups."""
+    exercise_ids = set(exercise_ids)
+    if not exercise_ids:
+        return
+    masks = defaultdict(lambda: dict.fromkeys(MASK_FIELDS.values(), 0))
+    for field, mask_field in MASK_FIELDS.items():
+        through = getattr(exercise_model, field).through
+        source = f'{exercise_model._meta.model_name}_id'
+        links = through.objects.filter(**{f'{source}__in': exercise_ids}) \
+            .values_list(source, 'musclegroup__name')
+        for exercise_id, name in links:
+            masks[exercise_id][mask_field] |= MUSCLE_BITS.get(name, 0)
+
+    exercises = [exercise_model(pk=exercise_id, **masks[exercise_id])
+                 for exercise_id in exercise_ids]
+    exercise_model.objects.bulk_update(exercises, list(MASK_FIELDS.values()),
+                                       batch_size=500)
+
+
+def linked_exercise_ids(muscle_group):
+    """Return {exercise model: ids} of the exercises using a muscle group."""
+    linked = defaultdict(set)
+    for relation in muscle_group._meta.related_objects:
+        if relation.many_to_many and \
+                relation.field.name in MASK_FIELDS:
+            model = relation.related_model
+            linked[model].update(
+                getattr(muscle_group, relation.get_accessor_name())
+                .values_list('id', flat=True))
+    return linked
+
+
+def _parse_names(value, param):
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in MUSCLE_BITS]
+    if unknown:
+        raise ValidationError({param: [
+            f"Unknown muscle groups: {', '.join(unknown)}. "
+            f"Expected {', '.join(MUSCLE_BITS)}."]})
+    return muscle_mask(names)
+
+
+def filter_muscles(queryset, params):
+    """
+    Narrow exercises by muscle groups from the query parameters:
+    `muscles_all`, `muscles_any` and `muscles_none` take comma separated
+    names, `muscle_role` (any, primary or secondary) selects the groups
+    they are matched against.
+    """
+    role = params.get('muscle_role') or 'any'
+    if role not in MUSCLE_ROLES:
+        raise ValidationError({'muscle_role': [
+            f"Expected one of {', '.join(MUSCLE_ROLES)}."]})
+    if role == 'any':
+        mask = F('primary_muscle_mask').bitor(F('secondary_muscle_mask'))
+    else:
+        mask = F(f'{role}_muscle_mask')
+
+    for param, test in (('muscles_all', 'all'), ('muscles_any', 'any'),
+                        ('muscles_none', 'none')):
+        if not params.get(param):
+            continue
+        bits = _parse_names(params[param], param)
+        alias = f'{param}_match'
+        queryset = queryset.alias(**{alias: mask.bitand(bits)})
+        if test == 'all':
+            queryset = queryset.filter(**{alias: bits})
+        elif test == 'any':
+            queryset = queryset.exclude(**{alias: 0})
+        else:
+            queryset = queryset.filter(**{alias: 0})
+    return queryset
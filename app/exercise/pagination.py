@@ -0,0 +1,191 @@
+"""
+Pagination for the exercise APIs
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on the values of the ordering fields.
+    The cursor holds the ordering values of the last row of a page and the
+    next page starts right after them, so every page is an index range
+    scan no matter how deep the client scrolls. There is no count query.
+    The last ordering field must be unique (e.g. the id).
+    """
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering = ('-timestamp', '-id')
+    invalid_cursor_message = _('Invalid cursor')
+
+    def get_ordering(self, request, queryset, view):
+        """Return the ordering fields, a leading '-' means descending."""
+        return self.ordering
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(
+                self._seek_filter(self.decode_cursor(cursor, queryset)))
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def _seek_filter(self, values):
+        """
+        Match the rows after `values` in the ordering: the first field
+        moves past its value, or it ties and the remaining fields do.
+        The leading bound on the first field keeps it a range scan.
+        """
+        lookups = [
+            (field, 'lt' if ordering.startswith('-') else 'gt', value)
+            for field, ordering, value in zip(self.fields, self.ordering,
+                                              values)
+        ]
+        seek = Q()
+        for position, (field, lookup, value) in enumerate(lookups):
+            after = Q(**{f'{field}__{lookup}': value})
+            for tie_field, _lookup, tie_value in lookups[:position]:
+                after &= Q(**{tie_field: tie_value})
+            seek |= after
+
+        first_field, first_lookup, first_value = lookups[0]
+        bound = Q(**{f'{first_field}__{first_lookup}e': first_value})
+        return bound & seek
+
+    def encode_cursor(self, instance):
+        values = [getattr(instance, field) for field in self.fields]
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value
+                  for value in values]
+        data = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, queryset):
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+            if not isinstance(values, list) or \
+                    len(values) != len(self.fields):
+                raise ValueError
+            opts = queryset.model._meta
+            return [opts.get_field(field).to_python(value)
+                    for field, value in zip(self.fields, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(self.last))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': str(_('The pagination cursor value.')),
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': str(_('Number of results to return per '
+                                     'page.')),
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class CatalogPagination(KeysetPagination):
+    """
+    Keyset pagination of the exercise catalog, newest first by default.
+    `ordering` picks one of the view's `ordering_fields`, prefixed with
+    '-' for descending; the id breaks ties.
+    """
+    page_size = 100
+    max_page_size = 500
+    ordering = ('-id', )
+    ordering_query_param = 'ordering'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_query_param)
+        if not ordering:
+            return self.ordering
+
+        field = ordering.lstrip('-')
+        allowed = getattr(view, 'ordering_fields', ('id', ))
+        if ordering.count('-') > 1 or field not in allowed:
+            raise exceptions.ValidationError({self.ordering_query_param: [
+                f"Expected one of {', '.join(allowed)}, optionally "
+                "prefixed with '-'."]})
+        if field == 'id':
+            return (ordering, )
+        return (ordering, '-id' if ordering.startswith('-') else 'id')
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [{
+            'name': self.ordering_query_param,
+            'required': False,
+            'in': 'query',
+            'description': str(_('Which field to use when ordering the '
+                                 'results.')),
+            'schema': {
+                'type': 'string',
+                'enum': [prefix + field
+                         for field in getattr(view, 'ordering_fields',
+                                              ('id', ))
+                         for prefix in ('', '-')],
+            },
+        }]
@@ -0,0 +1,90 @@
+"""
+Full-text search over the strength exercise catalog
+
+Names and descriptions are indexed by the database itself: an FTS5 table
+kept in sync by triggers on SQLite, a GIN index over a weighted tsvector
+on PostgreSQL (see core migration 0023). Name matches rank above
+description matches. Other backends fall back to substring matching.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from core.models import StrengthExercise
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# bm25() weights of the name and description columns
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', name), 'A') || "
+    "setweight(to_tsvector('english', description), 'B')"
+)
+
+
+def search_terms(query):
+    """Return the words of a query, any search syntax is dropped."""
+    return re.findall(r'\w+', query.lower())
+
+
+def _sqlite_search(terms, limit):
+    # every term must match, the last one as a prefix of a word
+    match = ' '.join(f'"{term}"' for term in terms[:-1])
+    match = f'{match} "{terms[-1]}"*'.strip()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid FROM core_strengthexercise_fts '
+            'WHERE core_strengthexercise_fts MATCH %s '
+            'ORDER BY bm25(core_strengthexercise_fts, %s, %s) '
+            'LIMIT %s',
+            [match, NAME_WEIGHT, DESCRIPTION_WEIGHT, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _postgresql_search(terms, limit):
+    tsquery = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT id FROM core_strengthexercise, '
+            f"to_tsquery('english', %s) query "
+            f'WHERE ({SEARCH_DOCUMENT}) @@ query '
+            f'ORDER BY ts_rank(({SEARCH_DOCUMENT}), query) DESC, id '
+            f'LIMIT %s',
+            [tsquery, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_search(terms, limit):
+    matches = Q()
+    for term in terms:
+        matches &= Q(name__icontains=term) | Q(description__icontains=term)
+    return list(StrengthExercise.objects.filter(matches)
+                .order_by('name').values_list('id', flat=True)[:limit])
+
+
+SEARCH_BACKENDS = {
+    'sqlite': _sqlite_search,
+    'postgresql': _postgresql_search,
+}
+
+
+def search_strength_exercises(query, limit=SEARCH_LIMIT, queryset=None):
+    """
+    Return the strength exercises matching every word of `query`, best
+    match first. `queryset` can add e.g. prefetching to the lookup.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    search = SEARCH_BACKENDS.get(connection.vendor, _fallback_search)
+    ids = search(terms, limit)
+    if queryset is None:
+        queryset = StrengthExercise.objects.all()
+    exercises = queryset.in_bulk(ids)
+    return [exercises[pk] for pk in ids if pk in exercises]
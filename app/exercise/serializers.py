@@ -1,14 +1,25 @@
 """
 Serializers for exercise API
 """
+import os
+
+from django.conf import settings
+from django.core.validators import get_available_image_extensions
+from django.db import transaction
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
 from core.models import (
+    ExerciseImageUpload,
+    ExerciseLogImport,
     StrengthExercise,
     MuscleGroup,
     TrackExercise,
     StrengthExerciseLog,
+    TrackExerciseLog,
 )
+from exercise.catalog import catalog_changed
+from exercise.images import image_uploaded
 
 
 class MuscleGroupSerializer(serializers.ModelSerializer):
@@ -51,16 +62,53 @@ class BaseExerciseSerializer(serializers.ModelSerializer):
 
         return data
 
-    def _get_or_create_muscle_group(self, muscle_group_data,
-                                    field_name,
-                                    strength_exercise):
-        """Handle getting or creating muscle groups as needed."""
-        muscle_group_field = getattr(strength_exercise, field_name)
-        for muscle_group_dict in muscle_group_data:
-            muscle_group_obj, _ = MuscleGroup.objects.get_or_create(
-                **muscle_group_dict
+    def _resolve_muscle_groups(self, *muscle_group_data):
+        """
+        Return {name: MuscleGroup} of every group named in the data.
+        The missing groups are inserted with a single statement that
+        skips names created concurrently, so no get_or_create race.
+        """
+        names = {muscle_group['name'] for data in muscle_group_data
+                 for muscle_group in data}
+        if not names:
+            return {}
+
+        muscle_groups = {muscle_group.name: muscle_group for muscle_group
+                         in MuscleGroup.objects.filter(name__in=names)}
+        missing = names - muscle_groups.keys()
+        if missing:
+            # the sync feed serializes with this module
+            from exercise.sync import record_changes
+
+            MuscleGroup.objects.bulk_create(
+                [MuscleGroup(name=name) for name in sorted(missing)],
+                ignore_conflicts=True,
             )
-            muscle_group_field.add(muscle_group_obj)
+            created = list(MuscleGroup.objects.filter(name__in=missing))
+            # bulk_create sends no post_save signals
+            catalog_changed()
+            record_changes(created)
+            muscle_groups.update((muscle_group.name, muscle_group)
+                                 for muscle_group in created)
+        return muscle_groups
+
+    def _set_muscle_groups(self, exercise, field_name, muscle_group_data,
+                           muscle_groups, current=None):
+        """
+        Make the muscle groups of `field_name` match the data, removing
+        and adding only the difference with one statement each.
+        `current` holds the group ids already linked, when known.
+        """
+        manager = getattr(exercise, field_name)
+        if current is None:
+            current = set(manager.values_list('id', flat=True))
+        wanted = {muscle_groups[muscle_group['name']].id
+                  for muscle_group in muscle_group_data}
+
+        if current - wanted:
+            manager.remove(*(current - wanted))
+        if wanted - current:
+            manager.add(*(wanted - current))
 
     def create(self, validated_data):
         """Create and return a new Strength Exercise"""
@@ -69,38 +117,47 @@ class BaseExerciseSerializer(serializers.ModelSerializer):
         secondary_muscle_group_data = validated_data.pop(
                                                 'secondary_muscle_groups', [])
 
-        strength_exercise = self.Meta.model.objects.create(**validated_data)
-        self._get_or_create_muscle_group(primary_muscle_group_data,
-                                         'primary_muscle_groups',
-                                         strength_exercise)
-        self._get_or_create_muscle_group(secondary_muscle_group_data,
-                                         'secondary_muscle_groups',
-                                         strength_exercise)
+        with transaction.atomic():
+            muscle_groups = self._resolve_muscle_groups(
+                primary_muscle_group_data, secondary_muscle_group_data)
+            strength_exercise = self.Meta.model.objects.create(
+                                **validated_data)
+            self._set_muscle_groups(strength_exercise,
+                                    'primary_muscle_groups',
+                                    primary_muscle_group_data,
+                                    muscle_groups, current=set())
+            self._set_muscle_groups(strength_exercise,
+                                    'secondary_muscle_groups',
+                                    secondary_muscle_group_data,
+                                    muscle_groups, current=set())
 
         return strength_exercise
 
     def update(self, instance, validated_data):
         """Update and return a Strength Exercise"""
+        # groups left out of a partial update are kept as they are
         primary_muscle_group_data = validated_data.pop(
-                                            'primary_muscle_groups', [])
+                                            'primary_muscle_groups', None)
         secondary_muscle_group_data = validated_data.pop(
-                                            'secondary_muscle_groups', [])
-
-        if primary_muscle_group_data is not None:
-            instance.primary_muscle_groups.clear()
-            self._get_or_create_muscle_group(primary_muscle_group_data,
-                                             'primary_muscle_groups',
-                                             instance)
-        if secondary_muscle_group_data is not None:
-            instance.secondary_muscle_groups.clear()
-            self._get_or_create_muscle_group(secondary_muscle_group_data,
-                                             'secondary_muscle_groups',
-                                             instance)
+                                            'secondary_muscle_groups', None)
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
 
-        instance.save()
+        with transaction.atomic():
+            muscle_groups = self._resolve_muscle_groups(
+                primary_muscle_group_data or [],
+                secondary_muscle_group_data or [])
+            if primary_muscle_group_data is not None:
+                self._set_muscle_groups(instance, 'primary_muscle_groups',
+                                        primary_muscle_group_data,
+                                        muscle_groups)
+            if secondary_muscle_group_data is not None:
+                self._set_muscle_groups(instance, 'secondary_muscle_groups',
+                                        secondary_muscle_group_data,
+                                        muscle_groups)
+            instance.save()
+
         return instance
 
 
@@ -119,6 +176,28 @@ class StrengthExerciseImageSerializer(StrengthExerciseSerializer):
         read_only_fields = ['id']
         extra_kwargs = {'image': {'required': 'True'}}
 
+    def validate_image(self, value):
+        """Reject images past the byte and pixel limits"""
+        if value.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+            raise serializers.ValidationError(
+                f'Images are limited to {settings.IMAGE_UPLOAD_MAX_BYTES} '
+                'bytes.')
+        # read from the header by the image field, nothing is decoded yet
+        width, height = value.image.size
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            raise serializers.ValidationError(
+                f'Images are limited to {settings.IMAGE_UPLOAD_MAX_PIXELS} '
+                f'pixels, this one is {width}x{height}.')
+        return value
+
+    def update(self, instance, validated_data):
+        """Save the image, its variants are replaced after commit"""
+        previous = instance.image.name, instance.image_variants
+        validated_data['image_variants'] = {}
+        instance = super().update(instance, validated_data)
+        image_uploaded(instance, *previous)
+        return instance
+
 
 class StrengthExerciseDetailSerializer(StrengthExerciseSerializer):
     """ Serializer for strength exercise detail"""
@@ -126,7 +205,30 @@ class StrengthExerciseDetailSerializer(StrengthExerciseSerializer):
         '''comma is neccessary here with out it will be a string
           and with, its a tuple eg. ('description', 'image')'''
         fields = StrengthExerciseSerializer.Meta.fields + \
-            ('description', 'image')
+            ('description', 'image', 'image_variants')
+
+    image_variants = serializers.SerializerMethodField()
+
+    @extend_schema_field({
+        'type': 'object',
+        'additionalProperties': {
+            'type': 'object',
+            'additionalProperties': {'type': 'string', 'format': 'uri'},
+        },
+    })
+    def get_image_variants(self, obj):
+        """Return the URLs of the resized images by size and format"""
+        storage = obj.image.storage
+        request = self.context.get('request')
+        variants = {}
+        for size, names in obj.image_variants.items():
+            variants[size] = {}
+            for variant_format, name in names.items():
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                variants[size][variant_format] = url
+        return variants
 
 
 class TrackExerciseSerializer(BaseExerciseSerializer):
@@ -149,8 +251,19 @@ class BaseExerciseLogSerializer(serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
     class Meta:
-        fields = ('id', 'user', 'timestamp', 'calories_burned')
-        read_only_fields = ['id', 'user', 'timestamp']
+        fields = ('id', 'user', 'timestamp', 'calories_burned',
+                  'updated_at')
+        read_only_fields = ['id', 'user', 'timestamp', 'updated_at']
+
+    def create(self, validated_data):
+        """Create a log together with its rollup and analytics updates"""
+        with transaction.atomic():
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        """Update a log together with its rollup and analytics updates"""
+        with transaction.atomic():
+            return super().update(instance, validated_data)
 
 
 class StrengthExerciseLogSerializer(BaseExerciseLogSerializer):
@@ -165,16 +278,138 @@ class StrengthExerciseLogSerializer(BaseExerciseLogSerializer):
         fields = BaseExerciseLogSerializer.Meta.fields + \
             ('exercise', 'reps', 'sets', )
 
-    def create(self, validated_data):
-        """Create and return a new Strength Exercise Log"""
-        strength_exercise_log = self.Meta.model.objects.create(
-                                **validated_data)
-        return strength_exercise_log
 
-    def update(self, instance, validated_data):
-        """Update and return a Strength Exercise Log"""
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+class TrackExerciseLogSerializer(BaseExerciseLogSerializer):
+    """Serializer for Track Exercise Log"""
+    exercise = serializers.SlugRelatedField(
+        queryset=TrackExercise.objects.all(),
+        slug_field='name'
+    )
 
-        instance.save()
-        return instance
+    class Meta(BaseExerciseLogSerializer.Meta):
+        model = TrackExerciseLog
+        fields = BaseExerciseLogSerializer.Meta.fields + \
+            ('exercise', 'distance', 'pace', )
+
+
+class StrengthExerciseLogBatchItemSerializer(serializers.ModelSerializer):
+    """One strength log of a batch, exercise names are resolved per batch"""
+    exercise = serializers.CharField(max_length=255)
+
+    class Meta:
+        model = StrengthExerciseLog
+        fields = ('exercise', 'timestamp', 'calories_burned', 'reps', 'sets')
+
+
+class TrackExerciseLogBatchItemSerializer(serializers.ModelSerializer):
+    """One track log of a batch, exercise names are resolved per batch"""
+    exercise = serializers.CharField(max_length=255)
+
+    class Meta:
+        model = TrackExerciseLog
+        fields = ('exercise', 'timestamp', 'calories_burned',
+                  'distance', 'pace')
+
+
+class ExerciseLogBatchSerializer(serializers.Serializer):
+    """Serializer for a batch of strength and track logs"""
+    MAX_ITEMS = 500
+
+    strength = serializers.ListField(
+        child=serializers.DictField(), required=False, default=list,
+        max_length=MAX_ITEMS,
+    )
+    track = serializers.ListField(
+        child=serializers.DictField(), required=False, default=list,
+        max_length=MAX_ITEMS,
+    )
+
+    def validate(self, data):
+        """Limit the total number of logs in a batch"""
+        if len(data['strength']) + len(data['track']) > self.MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"A batch cannot contain more than {self.MAX_ITEMS} logs.")
+        return data
+
+
+class ExerciseNameSerializer(serializers.Serializer):
+    """Serializer for an autocompleted exercise name"""
+    kind = serializers.ChoiceField(choices=['strength', 'track'])
+    name = serializers.CharField()
+
+
+class SyncKindChangesSerializer(serializers.Serializer):
+    """Changes of one kind of object in the sync feed"""
+    updated = serializers.ListField(child=serializers.DictField())
+    deleted = serializers.ListField(child=serializers.IntegerField())
+
+
+class ExerciseSyncSerializer(serializers.Serializer):
+    """Serializer for a page of the sync feed"""
+    cursor = serializers.CharField()
+    has_more = serializers.BooleanField()
+    changes = serializers.DictField(child=SyncKindChangesSerializer())
+
+
+class ExerciseLogImportSerializer(serializers.ModelSerializer):
+    """Serializer for exercise log imports"""
+    FORMAT_EXTENSIONS = {
+        '.csv': 'csv',
+        '.ndjson': 'ndjson',
+        '.jsonl': 'ndjson',
+    }
+
+    class Meta:
+        model = ExerciseLogImport
+        fields = ('id', 'kind', 'file_format', 'file', 'status',
+                  'byte_offset', 'total_bytes', 'rows_imported',
+                  'rows_failed', 'errors', 'created_at', 'updated_at')
+        read_only_fields = ['id', 'status', 'byte_offset', 'total_bytes',
+                            'rows_imported', 'rows_failed', 'errors',
+                            'created_at', 'updated_at']
+        extra_kwargs = {
+            'file': {'write_only': True, 'required': True},
+            'file_format': {'required': False},
+        }
+
+    @classmethod
+    def guess_file_format(cls, name):
+        """Return the import format of a file name, or None"""
+        return cls.FORMAT_EXTENSIONS.get(os.path.splitext(name)[1].lower())
+
+    def validate(self, data):
+        """Infer the file format from the file name when not given"""
+        if not data.get('file_format'):
+            file_format = self.guess_file_format(data['file'].name)
+            if file_format is None:
+                raise serializers.ValidationError({
+                    'file_format': ['Cannot tell the format from the '
+                                    'file name, please provide it.']
+                })
+            data['file_format'] = file_format
+        return data
+
+
+class ExerciseImageUploadSerializer(serializers.ModelSerializer):
+    """Serializer for chunked strength exercise image uploads"""
+    class Meta:
+        model = ExerciseImageUpload
+        fields = ('id', 'exercise', 'filename', 'size', 'offset',
+                  'created_at', 'updated_at')
+        read_only_fields = ['id', 'offset', 'created_at', 'updated_at']
+
+    def validate_filename(self, value):
+        """Only accept the extensions of the supported image formats"""
+        extension = os.path.splitext(value)[1][1:].lower()
+        if extension not in get_available_image_extensions():
+            raise serializers.ValidationError(
+                f'"{extension}" is not a supported image extension.')
+        return value
+
+    def validate_size(self, value):
+        """Reject images past the byte limit before receiving them"""
+        if not 0 < value <= settings.IMAGE_UPLOAD_MAX_BYTES:
+            raise serializers.ValidationError(
+                f'Images are limited to {settings.IMAGE_UPLOAD_MAX_BYTES} '
+                'bytes.')
+        return value
@@ -0,0 +1,204 @@
+"""
+Signal handlers for the exercise catalog, its muscle masks and images,
+the sync change feed, the log rollups and analytics cache, and the
+autocomplete index warm-up
+"""
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.core.signals import request_started
+from django.db import connection, transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import (
+    MuscleGroup,
+    StrengthExercise,
+    StrengthExerciseLog,
+    SyncChange,
+    TrackExercise,
+    TrackExerciseLog,
+)
+from exercise.autocomplete import warm_name_index
+from exercise.catalog import catalog_changed
+from exercise.images import release_image
+from exercise.muscles import linked_exercise_ids, refresh_muscle_masks
+from exercise.sync import record_changes
+from user.analytics.cache import invalidate_user_analytics
+from user.analytics.rollups import apply_strength_log_changes
+
+
+@receiver([post_save, post_delete], sender=StrengthExercise)
+@receiver([post_save, post_delete], sender=TrackExercise)
+@receiver([post_save, post_delete], sender=MuscleGroup)
+def catalog_entry_changed(sender, **kwargs):
+    """Invalidate catalog caches when an exercise or muscle group changes"""
+    catalog_changed()
+
+
+@receiver(m2m_changed, sender=StrengthExercise.primary_muscle_groups.through)
+@receiver(m2m_changed,
+          sender=StrengthExercise.secondary_muscle_groups.through)
+@receiver(m2m_changed, sender=TrackExercise.primary_muscle_groups.through)
+@receiver(m2m_changed, sender=TrackExercise.secondary_muscle_groups.through)
+def catalog_muscle_groups_changed(sender, action, **kwargs):
+    """Invalidate catalog caches when exercise muscle groups change"""
+    if action.startswith('post_'):
+        catalog_changed()
+
+
+@receiver(post_save, sender=StrengthExerciseLog)
+@receiver(post_save, sender=TrackExerciseLog)
+@receiver(post_save, sender=StrengthExercise)
+@receiver(post_save, sender=TrackExercise)
+@receiver(post_save, sender=MuscleGroup)
+def sync_object_saved(sender, instance, raw=False, **kwargs):
+    """Record a created or updated object in the sync feed"""
+    if not raw:
+        record_changes([instance])
+
+
+@receiver(post_delete, sender=StrengthExerciseLog)
+@receiver(post_delete, sender=TrackExerciseLog)
+@receiver(post_delete, sender=StrengthExercise)
+@receiver(post_delete, sender=TrackExercise)
+@receiver(post_delete, sender=MuscleGroup)
+def sync_object_deleted(sender, instance, **kwargs):
+    """Record the tombstone of a deleted object in the sync feed"""
+    record_changes([instance], deleted=True)
+
+
+@receiver(post_delete, sender=get_user_model())
+def sync_user_deleted(sender, instance, **kwargs):
+    """Drop the sync feed of a deleted user, tombstones of its logs too"""
+    SyncChange.objects.filter(user_id=instance.pk).delete()
+
+
+@receiver(m2m_changed, sender=StrengthExercise.primary_muscle_groups.through)
+@receiver(m2m_changed,
+          sender=StrengthExercise.secondary_muscle_groups.through)
+@receiver(m2m_changed, sender=TrackExercise.primary_muscle_groups.through)
+@receiver(m2m_changed, sender=TrackExercise.secondary_muscle_groups.through)
+def sync_muscle_groups_changed(sender, instance, action, reverse, model,
+                               pk_set, **kwargs):
+    """Record the exercises whose muscle groups changed in the sync feed"""
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        exercises = [instance]
+    elif pk_set:
+        exercises = list(model.objects.filter(pk__in=pk_set))
+    else:
+        return
+    type(exercises[0]).objects.filter(
+        pk__in=[exercise.pk for exercise in exercises],
+    ).update(updated_at=timezone.now())
+    record_changes(exercises)
+
+
+@receiver(pre_save, sender=StrengthExerciseLog)
+def strength_log_saving(sender, instance, raw=False, **kwargs):
+    """Remember the stored state of a log about to be updated"""
+    instance._rollup_previous = None
+    if not raw and not instance._state.adding:
+        instance._rollup_previous = sender.objects.filter(
+            pk=instance.pk,
+        ).only('user', 'timestamp', 'reps', 'sets', 'calories_burned') \
+            .first()
+
+
+@receiver(post_save, sender=StrengthExerciseLog)
+def strength_log_saved(sender, instance, raw=False, **kwargs):
+    """Move a created or updated log into its rollups"""
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    apply_strength_log_changes(added=[instance],
+                               removed=[previous] if previous else [])
+    invalidate_user_analytics(
+        instance.user_id, *([previous.user_id] if previous else []))
+
+
+@receiver(post_delete, sender=StrengthExerciseLog)
+def strength_log_deleted(sender, instance, **kwargs):
+    """Take a deleted log out of its rollups, also when it is deleted
+    together with its exercise"""
+    apply_strength_log_changes(removed=[instance])
+    invalidate_user_analytics(instance.user_id)
+
+
+@receiver(post_save, sender=TrackExerciseLog)
+@receiver(post_delete, sender=TrackExerciseLog)
+def track_log_changed(sender, instance, raw=False, **kwargs):
+    """Mark the analytics of the user of a changed track log as stale"""
+    if not raw:
+        invalidate_user_analytics(instance.user_id)
+
+
+@receiver(m2m_changed, sender=StrengthExercise.primary_muscle_groups.through)
+@receiver(m2m_changed,
+          sender=StrengthExercise.secondary_muscle_groups.through)
+@receiver(m2m_changed, sender=TrackExercise.primary_muscle_groups.through)
+@receiver(m2m_changed, sender=TrackExercise.secondary_muscle_groups.through)
+def muscle_masks_changed(sender, instance, action, reverse, model, pk_set,
+                         **kwargs):
+    """Recompute the muscle masks of the exercises whose groups changed"""
+    if not reverse:
+        if action.startswith('post_'):
+            refresh_muscle_masks(type(instance), [instance.pk])
+        return
+
+    source = f'{model._meta.model_name}_id'
+    if action == 'pre_clear':
+        # the exercises are unknown once the links are gone
+        instance._cleared_exercise_ids = list(
+            sender.objects.filter(musclegroup=instance)
+            .values_list(source, flat=True))
+    elif action == 'post_clear':
+        refresh_muscle_masks(model, instance._cleared_exercise_ids)
+    elif action.startswith('post_'):
+        refresh_muscle_masks(model, pk_set)
+
+
+@receiver(post_save, sender=MuscleGroup)
+def muscle_group_saved(sender, instance, created, raw=False, **kwargs):
+    """Recompute the muscle masks of the exercises of a renamed group"""
+    if not created and not raw:
+        for model, ids in linked_exercise_ids(instance).items():
+            refresh_muscle_masks(model, ids)
+
+
+@receiver(pre_delete, sender=MuscleGroup)
+def muscle_group_deleting(sender, instance, **kwargs):
+    """Remember the exercises of a muscle group about to be deleted"""
+    instance._linked_exercise_ids = linked_exercise_ids(instance)
+
+
+@receiver(post_delete, sender=MuscleGroup)
+def muscle_group_deleted(sender, instance, **kwargs):
+    """Recompute the muscle masks of the exercises of a deleted group"""
+    for model, ids in getattr(instance, '_linked_exercise_ids', {}).items():
+        refresh_muscle_masks(model, ids)
+
+
+@receiver(post_delete, sender=StrengthExercise)
+def strength_exercise_deleted(sender, instance, **kwargs):
+    """Delete the image of a deleted exercise unless others use it"""
+    if instance.image:
+        transaction.on_commit(partial(release_image, instance.image.name))
+
+
+@receiver(request_started)
+def request_started_warm_up(sender, **kwargs):
+    """Build the autocomplete index of the process ahead of its use"""
+    # not within a transaction (the test client in a TestCase), which the
+    # background thread could not see
+    if not connection.in_atomic_block:
+        warm_name_index()
@@ -0,0 +1,206 @@
+"""
+Change feed for syncing clients
+
+Every create, update and delete of a log or catalog entry appends a
+SyncChange whose id is a monotonic change sequence; deleted objects are
+recorded as tombstones. A client keeps the opaque cursor of its last sync
+and asks for what changed after it, instead of downloading its whole
+history again. Without a cursor the feed starts from the first change,
+which the migration seeded with every object existing at the time.
+
+Changes are recorded under a lock held until the transaction commits
+(on SQLite the database write lock already is), so they commit in
+sequence order and a cursor never moves past a change still in flight.
+
+compact_changes (the compact_sync_changes command) drops the changes
+superseded by a later one of the same object, which no cursor needs,
+and the tombstones older than SYNC_CURSOR_LIFETIME. Cursors carry the
+time the feed was complete up to them and expire after that lifetime,
+so no cursor still accepted can miss a dropped tombstone.
+"""
+import base64
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+
+from core.models import (
+    MuscleGroup,
+    StrengthExercise,
+    StrengthExerciseLog,
+    SyncChange,
+    TrackExercise,
+    TrackExerciseLog,
+)
+from exercise import serializers
+
+# change kind: (model, serializer, belongs to a user)
+SYNC_KINDS = {
+    'muscle_group': (MuscleGroup, serializers.MuscleGroupSerializer, False),
+    'strength_exercise': (StrengthExercise,
+                          serializers.StrengthExerciseDetailSerializer,
+                          False),
+    'track_exercise': (TrackExercise,
+                       serializers.TrackExerciseDetailSerializer, False),
+    'strength_log': (StrengthExerciseLog,
+                     serializers.StrengthExerciseLogSerializer, True),
+    'track_log': (TrackExerciseLog,
+                  serializers.TrackExerciseLogSerializer, True),
+}
+MODEL_KINDS = {model: kind for kind, (model, *rest) in SYNC_KINDS.items()}
+
+SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 2000
+INVALID_CURSOR_MESSAGE = _('Invalid cursor')
+# key of the Postgres advisory lock ordering the changes
+SYNC_LOCK_ID = 0x5379_6e63
+# tombstones are kept this much past the cursor lifetime, for clock skew
+TOMBSTONE_MARGIN = timedelta(days=1)
+
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = _('The cursor expired, sync again without it.')
+    default_code = 'cursor_expired'
+
+
+def _lock_sequence():
+    """Hold back other recorders until this transaction commits."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [SYNC_LOCK_ID])
+
+
+def record_changes(instances, deleted=False):
+    """Append one change per saved (or deleted) instance to the feed."""
+    with transaction.atomic(savepoint=False):
+        _lock_sequence()
+        SyncChange.objects.bulk_create([
+            SyncChange(kind=MODEL_KINDS[type(instance)],
+                       object_id=instance.pk,
+                       user_id=getattr(instance, 'user_id', None),
+                       deleted=deleted)
+            for instance in instances
+        ])
+
+
+def encode_cursor(sequence, complete_at):
+    """Return the cursor after `sequence`, complete at a unix time."""
+    data = json.dumps({'seq': sequence, 'at': int(complete_at)},
+                      separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Return the (change sequence, unix time) of a cursor, (0, None) when
+    there is none.
+    """
+    if not cursor:
+        return 0, None
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        sequence = data['seq']
+        if not isinstance(sequence, int) or sequence < 0:
+            raise ValueError
+        complete_at = data.get('at')
+        if complete_at is not None and not isinstance(complete_at, int):
+            raise ValueError
+    except (TypeError, ValueError, KeyError, AttributeError):
+        raise NotFound(INVALID_CURSOR_MESSAGE)
+    # cursors issued without a time predate the compaction of the feed
+    if complete_at is None or \
+            complete_at < time.time() - settings.SYNC_CURSOR_LIFETIME:
+        raise CursorExpired()
+    return sequence, complete_at
+
+
+def _pending_changes(user, sequence, limit):
+    """Return up to `limit` changes visible to the user after `sequence`."""
+    changes = list(
+        SyncChange.objects
+        .filter(Q(user=user) | Q(user__isnull=True), id__gt=sequence)
+        .order_by('id')
+        .values_list('id', 'kind', 'object_id', 'deleted', 'created_at')
+        [:limit + 1]
+    )
+    return changes[:limit], len(changes) > limit
+
+
+def compact_changes():
+    """
+    Delete the changes superseded by a later change of the same object
+    and the expired tombstones. Return the number of changes deleted.
+    """
+    latest = SyncChange.objects.values('kind', 'object_id') \
+        .annotate(latest_id=Max('id')).values('latest_id')
+    superseded, _deleted = SyncChange.objects.exclude(id__in=latest).delete()
+
+    lifetime = timedelta(seconds=settings.SYNC_CURSOR_LIFETIME)
+    expired, _deleted = SyncChange.objects.filter(
+        deleted=True,
+        created_at__lt=timezone.now() - lifetime - TOMBSTONE_MARGIN,
+    ).delete()
+    return superseded + expired
+
+
+def get_changes(user, cursor, limit=SYNC_PAGE_SIZE, context=None):
+    """
+    Return the changes visible to the user after `cursor`: per kind, the
+    current representation of the created or updated objects and the ids
+    of the deleted ones, with the cursor to continue from.
+    Several changes of one object in the page collapse into the last one.
+    """
+    sequence, complete_at = decode_cursor(cursor)
+    changes, has_more = _pending_changes(user, sequence, limit)
+    if changes:
+        sequence = changes[-1][0]
+    # every later change is recorded after the last one of the page or,
+    # once the feed is read through, after now
+    if has_more:
+        complete_at = changes[-1][4].timestamp()
+    else:
+        complete_at = time.time()
+
+    latest = {}
+    for _seq, kind, object_id, deleted, _created_at in changes:
+        latest[(kind, object_id)] = deleted
+
+    result = {}
+    for kind, (model, serializer_class, per_user) in SYNC_KINDS.items():
+        updated_ids = [object_id for (key, object_id), deleted
+                       in latest.items() if key == kind and not deleted]
+        deleted_ids = [object_id for (key, object_id), deleted
+                       in latest.items() if key == kind and deleted]
+
+        objects = []
+        if updated_ids:
+            queryset = model.objects.filter(pk__in=updated_ids)
+            if per_user:
+                queryset = queryset.filter(user=user) \
+                    .select_related('exercise')
+            elif model is not MuscleGroup:
+                queryset = queryset.prefetch_related(
+                    'primary_muscle_groups', 'secondary_muscle_groups')
+            # objects deleted since are left to their tombstone
+            objects = sorted(queryset, key=lambda obj: obj.pk)
+
+        result[kind] = {
+            'updated': serializer_class(objects, many=True,
+                                        context=context).data,
+            'deleted': deleted_ids,
+        }
+
+    return {
+        'cursor': encode_cursor(sequence, complete_at),
+        'has_more': has_more,
+        'changes': result,
+    }
@@ -0,0 +1,132 @@
+"""
+Test for the exercise name autocomplete API
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    StrengthExercise,
+    StrengthExerciseLog,
+    TrackExercise,
+)
+from exercise import autocomplete
+from user.analytics.cache import invalidate_user_analytics
+
+AUTOCOMPLETE_URL = reverse('exercise:autocomplete')
+
+
+def create_user(**params):
+    """Create and return a sample user"""
+    return get_user_model().objects.create_user(**params)
+
+
+class PublicAutocompleteApiTests(TestCase):
+    """Test unauthenticated autocomplete API access"""
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'b'})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateAutocompleteApiTests(TestCase):
+    """Test authenticated autocomplete API access"""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        # the index follows the catalog version kept in the cache
+        cache.clear()
+        for name in ('Bench press', 'Barbell row', 'Dumbbell bench press',
+                     'Squats'):
+            StrengthExercise.objects.create(name=name, description='',
+                                            dificulty_level=1)
+        TrackExercise.objects.create(name='Bike ride')
+
+    def complete(self, query, **params):
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': query, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in res.data]
+
+    def test_complete_prefix(self):
+        """Test names starting with the prefix come before inner words"""
+        self.assertEqual(self.complete('be'),
+                         ['Bench press', 'Dumbbell bench press'])
+        self.assertEqual(self.complete('B'),
+                         ['Barbell row', 'Bench press', 'Bike ride',
+                          'Dumbbell bench press'])
+        self.assertEqual(self.complete('bench pr'),
+                         ['Bench press', 'Dumbbell bench press'])
+        self.assertEqual(self.complete('deadlift'), [])
+
+    def test_complete_kind_and_limit(self):
+        """Test names can be narrowed to a kind and limited"""
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'b', 'kind': 'track'})
+
+        self.assertEqual(res.data, [{'kind': 'track', 'name': 'Bike ride'}])
+        self.assertEqual(len(self.complete('b', limit=2)), 2)
+
+    def test_invalid_kind(self):
+        """Test an unknown kind is rejected"""
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'b', 'kind': 'swim'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recently_used_first(self):
+        """Test the exercises the user logs the most come first"""
+        exercise = StrengthExercise.objects.get(name='Dumbbell bench press')
+        StrengthExerciseLog.objects.create(
+            user=self.user, exercise=exercise, reps=10, sets=3,
+            calories_burned=50)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_user_analytics(self.user.pk)
+
+        self.assertEqual(self.complete('b')[0], 'Dumbbell bench press')
+        self.assertEqual(self.complete('')[0], 'Dumbbell bench press')
+
+    def test_index_follows_catalog_changes(self):
+        """Test renamed and new exercises are completed"""
+        self.complete('b')
+        exercise = StrengthExercise.objects.get(name='Squats')
+        exercise.name = 'Box squats'
+        exercise.save()
+
+        self.assertIn('Box squats', self.complete('bo'))
+        self.assertEqual(self.complete('squ'), ['Box squats'])
+
+    def test_lookup_without_queries(self):
+        """Test warm lookups are answered from memory"""
+        self.complete('b')
+
+        with self.assertNumQueries(0):
+            self.complete('bar')
+
+
+class AutocompleteWarmUpTests(TransactionTestCase):
+    """Test the index is built ahead of the first autocomplete request"""
+    def setUp(self):
+        cache.clear()
+        self.enterContext(patch.object(autocomplete, '_index', None))
+        self.enterContext(patch.object(autocomplete, '_warm_up', None))
+        StrengthExercise.objects.create(name='Bench press', description='',
+                                        dificulty_level=1)
+
+    def test_first_request_builds_index(self):
+        """Test any first request builds the index in the background"""
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'b'})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        warm_up = autocomplete._warm_up
+        self.assertIsNotNone(warm_up)
+        warm_up.join(timeout=10)
+
+        self.assertIn(('strength', 'Bench press'), autocomplete._index.names)
+        self.assertIsNone(autocomplete.warm_name_index())
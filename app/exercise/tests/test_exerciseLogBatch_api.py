@@ -0,0 +1,140 @@
+"""
+Test for the exercise log batch API
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    StrengthExercise,
+    StrengthExerciseLog,
+    StrengthExerciseLogRollup,
+    TrackExercise,
+    TrackExerciseLog,
+)
+
+LOG_BATCH_URL = reverse('exercise:log-batch')
+
+
+def create_user(**params):
+    """Create and return a sample user"""
+    return get_user_model().objects.create_user(**params)
+
+
+class PublicExerciseLogBatchApiTests(TestCase):
+    """Test unauthenticated log batch API access"""
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        res = self.client.post(LOG_BATCH_URL, {}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateExerciseLogBatchApiTests(TestCase):
+    """Test authenticated log batch API access"""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        StrengthExercise.objects.create(name='Squats')
+        StrengthExercise.objects.create(name='Bench press')
+        TrackExercise.objects.create(name='run')
+
+    def test_create_log_batch(self):
+        """Test strength and track logs are created in one request"""
+        payload = {
+            'strength': [
+                {'exercise': 'Squats', 'reps': 10, 'sets': 3,
+                 'calories_burned': 50,
+                 'timestamp': '2024-01-01T08:00:00Z'},
+                {'exercise': 'Bench press', 'reps': 8, 'sets': 4,
+                 'calories_burned': 40,
+                 'timestamp': '2024-01-01T08:30:00Z'},
+            ],
+            'track': [
+                {'exercise': 'run', 'distance': '5.00', 'pace': '00:05:30',
+                 'calories_burned': 300},
+            ],
+        }
+
+        res = self.client.post(LOG_BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['status'] for r in res.data['strength']],
+                         ['created', 'created'])
+        self.assertEqual(res.data['track'][0]['status'], 'created')
+        logs = StrengthExerciseLog.objects.filter(user=self.user)
+        self.assertEqual(logs.count(), 2)
+        self.assertEqual(
+            set(logs.values_list('id', flat=True)),
+            {r['id'] for r in res.data['strength']},
+        )
+        track_log = TrackExerciseLog.objects.get(user=self.user)
+        self.assertEqual(track_log.pace, timedelta(minutes=5, seconds=30))
+        rollup = StrengthExerciseLogRollup.objects.get(user=self.user)
+        self.assertEqual(rollup.log_count, 2)
+        self.assertEqual(rollup.reps, 18)
+
+    def test_invalid_items_reported(self):
+        """Test invalid items are reported and valid ones still created"""
+        payload = {
+            'strength': [
+                {'exercise': 'Squats', 'reps': 10, 'sets': 3,
+                 'calories_burned': 50},
+                {'exercise': 'Unknown', 'reps': 10, 'sets': 3,
+                 'calories_burned': 50},
+                {'exercise': 'Squats', 'reps': 100, 'sets': 3,
+                 'calories_burned': 50},
+            ],
+        }
+
+        res = self.client.post(LOG_BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        created, unknown, too_many = res.data['strength']
+        self.assertEqual(created['status'], 'created')
+        self.assertEqual(unknown['status'], 'invalid')
+        self.assertIn('exercise', unknown['errors'])
+        self.assertEqual(too_many['status'], 'invalid')
+        self.assertIn('reps', too_many['errors'])
+        self.assertEqual(StrengthExerciseLog.objects.count(), 1)
+
+    def test_batch_query_count(self):
+        """Test the number of queries does not grow with the batch"""
+        item = {'exercise': 'Squats', 'reps': 10, 'sets': 3,
+                'calories_burned': 50,
+                'timestamp': '2024-01-01T08:00:00Z'}
+
+        # the first batch of the day creates the rollup row
+        self.client.post(LOG_BATCH_URL, {'strength': [item]}, format='json')
+        with CaptureQueriesContext(connection) as small_batch:
+            self.client.post(LOG_BATCH_URL, {'strength': [item] * 2},
+                             format='json')
+        with CaptureQueriesContext(connection) as large_batch:
+            res = self.client.post(LOG_BATCH_URL, {'strength': [item] * 100},
+                                   format='json')
+
+        self.assertEqual(len(large_batch), len(small_batch))
+        self.assertEqual(StrengthExerciseLog.objects.count(), 103)
+        self.assertTrue(all(r['status'] == 'created'
+                            for r in res.data['strength']))
+
+    def test_batch_size_limited(self):
+        """Test oversized batches are rejected"""
+        item = {'exercise': 'Squats', 'reps': 10, 'sets': 3,
+                'calories_burned': 50}
+
+        res = self.client.post(LOG_BATCH_URL, {'strength': [item] * 501},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StrengthExerciseLog.objects.exists())
@@ -0,0 +1,288 @@
+"""
+Test for the bounded and chunked exercise image upload APIs
+"""
+import fcntl
+import hashlib
+import io
+import os
+import tempfile
+from unittest.mock import patch
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ExerciseImageUpload, StrengthExercise
+from exercise import uploads
+from exercise.uploads import claim_upload, spool_path
+
+IMAGE_UPLOAD_URL = reverse('exercise:image-upload-list')
+
+
+def detail_url(upload_id):
+    """Return the chunked image upload detail URL"""
+    return reverse('exercise:image-upload-detail', args=[upload_id])
+
+
+def image_upload_url(exercise_id):
+    """Return URL for strength exercise image upload"""
+    return reverse('exercise:strength-exercise-upload-image',
+                   args=[exercise_id])
+
+
+def create_user(**params):
+    """Create and return a sample user"""
+    return get_user_model().objects.create_user(**params)
+
+
+def png_bytes(size=(64, 64), noise=False):
+    """Return a PNG image, incompressible with `noise`"""
+    if noise:
+        image = Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3))
+    else:
+        image = Image.new('RGB', size, 'red')
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+class ImageUploadTestCase(TestCase):
+    """Authenticated client, exercise and scratch media directories"""
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.enterContext(override_settings(
+            MEDIA_ROOT=self.media.name,
+            FILE_UPLOAD_TEMP_DIR=self.media.name,
+            IMAGE_VARIANT_WORKERS=0,
+        ))
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.exercise = StrengthExercise.objects.create(
+            name='Bench press', description='', dificulty_level=1)
+
+    def tearDown(self):
+        self.media.cleanup()
+
+
+class BoundedImageUploadTests(ImageUploadTestCase):
+    """Test the limits of the single request image upload"""
+    def upload(self, data):
+        image_file = io.BytesIO(data)
+        image_file.name = 'image.png'
+        return self.client.post(image_upload_url(self.exercise.id),
+                                {'image': image_file}, format='multipart')
+
+    def test_upload_named_after_content(self):
+        """Test an upload within the limits is stored under its digest"""
+        data = png_bytes()
+
+        res = self.upload(data)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.exercise.refresh_from_db()
+        self.assertIn(hashlib.sha256(data).hexdigest(),
+                      self.exercise.image.name)
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=4000)
+    def test_upload_stopped_past_byte_limit(self):
+        """Test an upload is cut off once past the byte limit"""
+        res = self.upload(png_bytes(noise=True))
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.exercise.refresh_from_db()
+        self.assertFalse(self.exercise.image)
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=4000)
+    def test_upload_rejected_by_content_length(self):
+        """Test a request larger than the limit is not read at all"""
+        res = self.upload(png_bytes(size=(256, 256), noise=True))
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=1000)
+    def test_upload_rejected_past_pixel_limit(self):
+        """Test an image with too many pixels is rejected"""
+        res = self.upload(png_bytes(size=(40, 30)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('40x30', res.data['image'][0])
+
+
+class ChunkedImageUploadTests(ImageUploadTestCase):
+    """Test the resumable chunked image upload"""
+    def start(self, data, **params):
+        payload = {'exercise': self.exercise.id, 'filename': 'image.png',
+                   'size': len(data), **params}
+        return self.client.post(IMAGE_UPLOAD_URL, payload)
+
+    def send(self, upload_id, offset, chunk):
+        return self.client.patch(
+            detail_url(upload_id), chunk,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_chunked_upload_sets_image(self):
+        """Test the last chunk sets the exercise image"""
+        data = png_bytes(noise=True)
+        upload_id = self.start(data).data['id']
+
+        res = self.send(upload_id, 0, data[:1000])
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(res['Upload-Offset'], '1000')
+
+        res = self.send(upload_id, 1000, data[1000:])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('image', res.data)
+        self.exercise.refresh_from_db()
+        with self.exercise.image.open('rb') as image_file:
+            self.assertEqual(image_file.read(), data)
+        self.assertIn(hashlib.sha256(data).hexdigest(),
+                      self.exercise.image.name)
+        self.assertFalse(ExerciseImageUpload.objects.exists())
+
+    def test_chunks_hashed_as_received(self):
+        """Test the last chunk completes the digest without a file read"""
+        data = png_bytes(noise=True)
+        upload_id = self.start(data).data['id']
+        self.send(upload_id, 0, data[:1000])
+
+        with patch('hashlib.sha256', wraps=hashlib.sha256) as sha256:
+            res = self.send(upload_id, 1000, data[1000:])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        sha256.assert_not_called()
+        self.exercise.refresh_from_db()
+        self.assertIn(hashlib.sha256(data).hexdigest(),
+                      self.exercise.image.name)
+        self.assertEqual(uploads._digests, {})
+
+    def test_resume_hashes_received_chunks(self):
+        """Test a process resuming an upload hashes the received bytes"""
+        data = png_bytes(noise=True)
+        upload_id = self.start(data).data['id']
+        self.send(upload_id, 0, data[:1000])
+        self.send(upload_id, 1000, data[1000:2000])
+        # as if the chunks went to another process
+        uploads._digests.clear()
+
+        res = self.send(upload_id, 2000, data[2000:])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.exercise.refresh_from_db()
+        self.assertIn(hashlib.sha256(data).hexdigest(),
+                      self.exercise.image.name)
+
+    def test_resume_from_offset(self):
+        """Test a chunk at the wrong offset is refused with the offset"""
+        data = png_bytes()
+        upload_id = self.start(data).data['id']
+        self.send(upload_id, 0, data[:100])
+
+        res = self.send(upload_id, 0, data[:100])
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+        res = self.client.get(detail_url(upload_id))
+        self.assertEqual(res.data['offset'], 100)
+        res = self.send(upload_id, 100, data[100:])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_chunk_past_declared_size(self):
+        """Test a chunk larger than the bytes left is rejected"""
+        data = png_bytes()
+        upload_id = self.start(data).data['id']
+
+        res = self.send(upload_id, 0, data + b'extra')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(self.client.get(detail_url(upload_id))
+                         .data['offset'], 0)
+
+    def test_malformed_content_length(self):
+        """Test a chunk with an unusable length appends nothing"""
+        data = png_bytes()
+        upload_id = self.start(data).data['id']
+
+        res = self.client.patch(
+            detail_url(upload_id), data[:100],
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET='0', CONTENT_LENGTH='many')
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(res['Upload-Offset'], '0')
+
+    def test_chunk_refused_while_another_is_received(self):
+        """Test a chunk is refused while the upload file is locked"""
+        data = png_bytes()
+        upload_id = self.start(data).data['id']
+        path = spool_path(ExerciseImageUpload.objects.get(id=upload_id))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'wb') as part:
+            fcntl.flock(part, fcntl.LOCK_EX)
+            res = self.send(upload_id, 0, data[:100])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.get(detail_url(upload_id))
+                         .data['offset'], 0)
+
+    def test_upload_completed_once(self):
+        """Test a complete upload is claimed by a single request"""
+        data = png_bytes()
+        upload_id = self.start(data).data['id']
+        upload = ExerciseImageUpload.objects.get(id=upload_id)
+
+        self.assertTrue(claim_upload(upload))
+        self.assertFalse(claim_upload(upload))
+
+    def test_invalid_image_discards_upload(self):
+        """Test an upload that is no image is rejected and discarded"""
+        data = b'not an image' * 10
+        upload_id = self.start(data).data['id']
+
+        res = self.send(upload_id, 0, data)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ExerciseImageUpload.objects.filter(
+            id=upload_id).exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=1000)
+    def test_start_validates_size_and_name(self):
+        """Test oversized and non image uploads are refused upfront"""
+        res = self.start(b'x' * 1001)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('size', res.data)
+
+        res = self.start(b'x', filename='notes.txt')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('filename', res.data)
+
+    def test_uploads_limited_to_user(self):
+        """Test the uploads of other users are not reachable"""
+        other = create_user(email='other@example.com', password='test123')
+        upload = ExerciseImageUpload.objects.create(
+            user=other, exercise=self.exercise, filename='image.png',
+            size=10)
+
+        res = self.send(upload.id, 0, b'0123456789')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_abort_upload(self):
+        """Test deleting an upload removes its received chunks"""
+        data = png_bytes()
+        upload_id = self.start(data).data['id']
+        self.send(upload_id, 0, data[:100])
+
+        res = self.client.delete(detail_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(os.listdir(os.path.join(
+            self.media.name, 'exercise-image-uploads')), [])
@@ -0,0 +1,298 @@
+"""
+Test for the exercise log import API
+"""
+import io
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    ExerciseLogImport,
+    StrengthExercise,
+    StrengthExerciseLog,
+    StrengthExerciseLogRollup,
+    TrackExercise,
+    TrackExerciseLog,
+)
+from exercise.importer import (
+    ABANDONED_AFTER,
+    claim_import,
+    run_import,
+)
+
+LOG_IMPORT_URL = reverse('exercise:log-import-list')
+
+STRENGTH_CSV = (
+    'exercise,timestamp,reps,sets,calories_burned\n'
+    'Squats,2024-01-01T08:00:00Z,10,3,50\n'
+    'Squats,2024-01-01T09:00:00Z,12,3,60\n'
+    'Unknown,2024-01-01T10:00:00Z,12,3,60\n'
+    'Squats,,8,2,30\n'
+)
+
+
+def resume_url(import_id):
+    """Return the URL resuming a log import"""
+    return reverse('exercise:log-import-resume', args=[import_id])
+
+
+def create_user(**params):
+    """Create and return a sample user"""
+    return get_user_model().objects.create_user(**params)
+
+
+class PrivateLogImportApiTests(TestCase):
+    """Test authenticated log import API access"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name))
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        StrengthExercise.objects.create(name='Squats')
+        TrackExercise.objects.create(name='run')
+
+    def tearDown(self):
+        self.media.cleanup()
+
+    def stored_files(self):
+        """Return the names of the files left in MEDIA_ROOT"""
+        return [name for _root, _dirs, names in os.walk(self.media.name)
+                for name in names]
+
+    def test_import_strength_csv(self):
+        """Test importing a CSV file of strength logs"""
+        upload = SimpleUploadedFile('history.csv', STRENGTH_CSV.encode())
+
+        res = self.client.post(LOG_IMPORT_URL,
+                               {'kind': 'strength', 'file': upload},
+                               format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['file_format'], 'csv')
+        self.assertEqual(res.data['status'], 'completed')
+        self.assertEqual(res.data['rows_imported'], 3)
+        self.assertEqual(res.data['rows_failed'], 1)
+        self.assertEqual(res.data['errors'][0]['line'], 4)
+        self.assertIn('exercise', res.data['errors'][0]['errors'])
+        self.assertEqual(res.data['byte_offset'], len(STRENGTH_CSV))
+        self.assertEqual(
+            StrengthExerciseLog.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            StrengthExerciseLogRollup.objects.get(
+                user=self.user, day='2024-01-01').reps, 22)
+        self.assertFalse(ExerciseLogImport.objects.get().file)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_import_track_ndjson(self):
+        """Test importing an NDJSON file of track logs"""
+        content = (
+            b'{"exercise": "run", "distance": "5.00", "pace": "00:05:00",'
+            b' "calories_burned": 300}\n'
+            b'not json\n'
+        )
+        upload = SimpleUploadedFile('history.ndjson', content)
+
+        res = self.client.post(LOG_IMPORT_URL,
+                               {'kind': 'track', 'file': upload},
+                               format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['rows_imported'], 1)
+        self.assertEqual(res.data['rows_failed'], 1)
+        self.assertEqual(res.data['errors'][0]['line'], 2)
+        self.assertEqual(TrackExerciseLog.objects.count(), 1)
+
+    def test_undecodable_csv_header(self):
+        """Test a CSV header that is not UTF-8 fails the import"""
+        upload = SimpleUploadedFile('history.csv',
+                                    b'exercise,\xff\xfe\n' + b'Squats,1\n')
+
+        res = self.client.post(LOG_IMPORT_URL,
+                               {'kind': 'strength', 'file': upload},
+                               format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['status'], 'failed')
+        self.assertEqual(res.data['errors'][0]['line'], 1)
+        self.assertIn('utf-8', res.data['errors'][0]['errors']
+                      ['non_field_errors'][0])
+        self.assertEqual(StrengthExerciseLog.objects.count(), 0)
+        self.assertEqual(self.stored_files(), [])
+
+        res = self.client.post(resume_url(res.data['id']))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_error_lines_count_blank_lines(self):
+        """Test error line numbers are file lines, across a resume"""
+        content = (
+            'exercise,timestamp,reps,sets,calories_burned\n'
+            '\n'
+            'Squats,2024-01-01T08:00:00Z,10,3,50\n'
+            'Unknown,2024-01-01T09:00:00Z,12,3,60\n'
+            '\n'
+            '\n'
+            'Squats,2024-01-01T10:00:00Z,8,2,30\n'
+            'Unknown,2024-01-01T11:00:00Z,12,3,60\n'
+        )
+        log_import = ExerciseLogImport.objects.create(
+            user=self.user, kind='strength', file_format='csv',
+            file=SimpleUploadedFile('history.csv', content.encode()),
+            total_bytes=len(content),
+        )
+        claim_import(log_import)
+        with log_import.file.open('rb') as source:
+            run_import(log_import, source, max_rows=2, batch_size=2)
+
+        res = self.client.post(resume_url(log_import.id))
+
+        self.assertEqual(res.data['rows_imported'], 2)
+        self.assertEqual([error['line'] for error in res.data['errors']],
+                         [4, 8])
+
+    @override_settings(LOG_IMPORT_MAX_BYTES=100)
+    def test_large_file_rejected(self):
+        """Test a file past the byte limit is refused"""
+        upload = SimpleUploadedFile('history.csv', STRENGTH_CSV.encode() * 2)
+
+        res = self.client.post(LOG_IMPORT_URL,
+                               {'kind': 'strength', 'file': upload},
+                               format='multipart')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(ExerciseLogImport.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_unknown_file_format_rejected(self):
+        """Test a file of unknown format needs an explicit file_format"""
+        upload = SimpleUploadedFile('history.txt', STRENGTH_CSV.encode())
+
+        res = self.client.post(LOG_IMPORT_URL,
+                               {'kind': 'strength', 'file': upload},
+                               format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('file_format', res.data)
+
+    def test_resume_import(self):
+        """Test a paused import continues after its byte offset"""
+        log_import = ExerciseLogImport.objects.create(
+            user=self.user, kind='strength', file_format='csv',
+            file=SimpleUploadedFile('history.csv', STRENGTH_CSV.encode()),
+            total_bytes=len(STRENGTH_CSV),
+        )
+        claim_import(log_import)
+        with log_import.file.open('rb') as source:
+            finished = run_import(log_import, source, max_rows=2,
+                                  batch_size=2)
+        self.assertFalse(finished)
+        self.assertEqual(log_import.status, 'pending')
+        self.assertEqual(log_import.rows_imported, 2)
+        self.assertEqual(len(self.stored_files()), 1)
+
+        res = self.client.post(resume_url(log_import.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['status'], 'completed')
+        self.assertEqual(res.data['rows_imported'], 3)
+        self.assertEqual(res.data['rows_failed'], 1)
+        self.assertEqual(StrengthExerciseLog.objects.count(), 3)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_resume_running_import_rejected(self):
+        """Test an import running elsewhere is not resumed twice"""
+        log_import = ExerciseLogImport.objects.create(
+            user=self.user, kind='strength', file_format='csv',
+            file=SimpleUploadedFile('history.csv', STRENGTH_CSV.encode()),
+            total_bytes=len(STRENGTH_CSV), status='running',
+        )
+
+        res = self.client.post(resume_url(log_import.id))
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(StrengthExerciseLog.objects.count(), 0)
+
+    def test_resume_abandoned_import(self):
+        """Test an import left running by a killed process can resume"""
+        log_import = ExerciseLogImport.objects.create(
+            user=self.user, kind='strength', file_format='csv',
+            file=SimpleUploadedFile('history.csv', STRENGTH_CSV.encode()),
+            total_bytes=len(STRENGTH_CSV), status='running',
+        )
+        ExerciseLogImport.objects.filter(pk=log_import.pk).update(
+            updated_at=timezone.now() - ABANDONED_AFTER)
+
+        res = self.client.post(resume_url(log_import.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['rows_imported'], 3)
+
+    def test_resume_completed_import_rejected(self):
+        """Test a completed import is not imported again"""
+        log_import = ExerciseLogImport.objects.create(
+            user=self.user, kind='strength', file_format='csv',
+            status='completed',
+        )
+
+        res = self.client.post(resume_url(log_import.id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_stale_copy_resumes_from_committed_offset(self):
+        """Test a run started from an outdated copy skips committed rows"""
+        log_import = ExerciseLogImport.objects.create(
+            user=self.user, kind='strength', file_format='csv',
+            file=SimpleUploadedFile('history.csv', STRENGTH_CSV.encode()),
+            total_bytes=len(STRENGTH_CSV),
+        )
+        stale = ExerciseLogImport.objects.get(pk=log_import.pk)
+        claim_import(log_import)
+        with log_import.file.open('rb') as source:
+            run_import(log_import, source, max_rows=2, batch_size=2)
+
+        claim_import(stale)
+        with stale.file.open('rb') as source:
+            run_import(stale, source)
+
+        self.assertEqual(stale.rows_imported, 3)
+        self.assertEqual(StrengthExerciseLog.objects.count(), 3)
+
+    def test_imports_limited_to_user(self):
+        """Test the imports of other users are not visible"""
+        other = create_user(email='other@example.com', password='test123')
+        ExerciseLogImport.objects.create(user=other, kind='strength',
+                                         file_format='csv')
+
+        res = self.client.get(LOG_IMPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+
+    def test_import_query_count_per_batch(self):
+        """Test rows are inserted in batches, not one query per row"""
+        rows = ''.join(f'Squats,2024-01-01T08:00:{second:02}Z,10,3,50\n'
+                       for second in range(50))
+        content = 'exercise,timestamp,reps,sets,calories_burned\n' + rows
+        log_import = ExerciseLogImport.objects.create(
+            user=self.user, kind='strength', file_format='csv',
+            total_bytes=len(content),
+        )
+
+        # exercise names, then one insert, sync feed insert, rollup
+        # upsert and offset update (with savepoints) per batch
+        claim_import(log_import)
+        with self.assertNumQueries(12):
+            run_import(log_import, io.BytesIO(content.encode()),
+                       batch_size=100)
+
+        self.assertEqual(StrengthExerciseLog.objects.count(), 50)
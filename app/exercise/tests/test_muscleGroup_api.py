@@ -4,6 +4,7 @@ Tests for the muscle_groups API endpoint
 # from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 
@@ -44,6 +45,8 @@ class PrivateMusleGroupsApiTests(TestCase):
         self.user = create_user()
         self.client = APIClient()
         self.client.force_authenticate(self.user)
+        # catalog snapshots outlive the rolled back test data
+        cache.clear()
 
     # def test_underthehood_when_object_is_created_with_less_field(self):
     #     """Test creating muscle_group with less fields"""
@@ -65,7 +68,7 @@ class PrivateMusleGroupsApiTests(TestCase):
         serializer = MuscleGroupSerializer(muscle_groups, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.json(), serializer.data)
 
     # def test_multiple_same_muslce_group(self):
     #     """Test creating multiple muscle groups with same name"""
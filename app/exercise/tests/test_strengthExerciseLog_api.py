@@ -1,6 +1,10 @@
 """
 Test for the Strength exercise Log API
 """
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
 
 from django.contrib.auth import get_user_model
 from django.test import TestCase
@@ -12,6 +16,7 @@ from rest_framework.test import APIClient
 from core.models import (
     StrengthExercise,
     StrengthExerciseLog,
+    StrengthExerciseLogRollup,
     # TrackExerciseLog,
 )
 
@@ -21,9 +26,16 @@ from exercise.serializers import (
 )
 
 STRENGTH_EXERCISE_LOG_URL = reverse('exercise:strength-exercise-log-list')
+STRENGTH_EXERCISE_LOG_EXPORT_URL = reverse(
+    'exercise:strength-exercise-log-export')
 # TRACK_EXERCISE_LOG_URL = reverse('exercise:track-exercise-log-list')
 
 
+def detail_url(log_id):
+    """Return strength exercise log detail URL"""
+    return reverse('exercise:strength-exercise-log-detail', args=[log_id])
+
+
 def create_strength_exercise(**params):
     """Create and return a sample strength exercise"""
     defaults = {
@@ -85,7 +97,7 @@ class PrivateStrengthExerciseLogApiTests(TestCase):
         # Check the serialized output
         logs = StrengthExerciseLog.objects.all()
         serializer = StrengthExerciseLogSerializer(logs, many=True)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
         # Clean up
         exercise.delete()
@@ -104,3 +116,176 @@ class PrivateStrengthExerciseLogApiTests(TestCase):
         response = self.client.post(STRENGTH_EXERCISE_LOG_URL, data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('exercise', response.data)
+
+    def test_log_writes_maintain_rollup(self):
+        """Test create, update and delete keep the daily rollup in sync"""
+        create_strength_exercise(name='Squats')
+        data = {
+            'exercise': 'Squats',
+            'reps': 10,
+            'sets': 3,
+            'calories_burned': 50
+        }
+        first = self.client.post(STRENGTH_EXERCISE_LOG_URL, data)
+        self.client.post(STRENGTH_EXERCISE_LOG_URL, data)
+
+        rollup = StrengthExerciseLogRollup.objects.get(user=self.user)
+        self.assertEqual(rollup.log_count, 2)
+        self.assertEqual(rollup.reps, 20)
+        self.assertEqual(rollup.sets, 6)
+        self.assertEqual(rollup.calories_burned, 100)
+
+        self.client.patch(detail_url(first.data['id']), {'reps': 4})
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.reps, 14)
+
+        self.client.delete(detail_url(first.data['id']))
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.log_count, 1)
+        self.assertEqual(rollup.reps, 10)
+        self.assertEqual(rollup.sets, 3)
+        self.assertEqual(rollup.calories_burned, 50)
+
+
+class StrengthExerciseLogPaginationTests(TestCase):
+    """Test paging through the strength exercise logs"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        exercise = create_strength_exercise(name='Squats')
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        # pairs of logs share a timestamp to exercise the id tie breaker
+        self.logs = [
+            StrengthExerciseLog.objects.create(
+                user=self.user, exercise=exercise, calories_burned=10,
+                timestamp=start + timedelta(hours=index // 2),
+            )
+            for index in range(7)
+        ]
+
+    def test_pages_follow_timestamp_and_id(self):
+        """Test the cursor walks all logs newest first without repeats"""
+        expected = sorted(self.logs, key=lambda log: (log.timestamp, log.id),
+                          reverse=True)
+
+        seen = []
+        url = STRENGTH_EXERCISE_LOG_URL + '?page_size=3'
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', res.data)
+            seen += [log['id'] for log in res.data['results']]
+            url = res.data['next']
+
+        self.assertEqual(seen, [log.id for log in expected])
+
+    def test_page_query_count_is_constant(self):
+        """Test deep pages cost the same single query as the first one"""
+        res = self.client.get(STRENGTH_EXERCISE_LOG_URL, {'page_size': 2})
+        res = self.client.get(res.data['next'])
+
+        with self.assertNumQueries(1):
+            self.client.get(res.data['next'])
+
+    def test_invalid_cursor(self):
+        """Test a tampered cursor is rejected"""
+        res = self.client.get(STRENGTH_EXERCISE_LOG_URL, {'cursor': 'bogus'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class StrengthExerciseLogFilterTests(TestCase):
+    """Test filtering the strength exercise logs"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        squats = create_strength_exercise(name='Squats')
+        bench = create_strength_exercise(name='Bench press')
+        self.logs = {}
+        for day, exercise in ((1, squats), (2, bench), (3, squats)):
+            self.logs[day] = StrengthExerciseLog.objects.create(
+                user=self.user, exercise=exercise, calories_burned=10,
+                timestamp=datetime(2024, 1, day, 12, tzinfo=timezone.utc),
+            )
+
+    def _ids(self, params):
+        res = self.client.get(STRENGTH_EXERCISE_LOG_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [log['id'] for log in res.data['results']]
+
+    def test_filter_date_range(self):
+        """Test since is inclusive and until is exclusive"""
+        ids = self._ids({'since': '2024-01-02', 'until': '2024-01-03'})
+
+        self.assertEqual(ids, [self.logs[2].id])
+
+    def test_filter_exercise(self):
+        """Test filtering the logs of one exercise"""
+        ids = self._ids({'exercise': 'Squats'})
+
+        self.assertEqual(ids, [self.logs[3].id, self.logs[1].id])
+
+    def test_filter_exercise_and_since(self):
+        """Test combining the exercise and date filters"""
+        ids = self._ids({'exercise': 'Squats',
+                         'since': '2024-01-02T00:00:00Z'})
+
+        self.assertEqual(ids, [self.logs[3].id])
+
+    def test_filter_invalid_date(self):
+        """Test an invalid date is rejected"""
+        res = self.client.get(STRENGTH_EXERCISE_LOG_URL, {'since': 'monday'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StrengthExerciseLogExportTests(TestCase):
+    """Test exporting the strength exercise logs"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        exercise = create_strength_exercise(name='Squats')
+        for day in (2, 1, 3):
+            StrengthExerciseLog.objects.create(
+                user=self.user, exercise=exercise, calories_burned=10 * day,
+                reps=day, sets=1,
+                timestamp=datetime(2024, 1, day, tzinfo=timezone.utc),
+            )
+
+    def test_export_ndjson(self):
+        """Test logs are streamed as NDJSON in timestamp order"""
+        res = self.client.get(STRENGTH_EXERCISE_LOG_EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['reps'] for row in rows], [1, 2, 3])
+        self.assertEqual(rows[0]['exercise'], 'Squats')
+        self.assertEqual(rows[0]['timestamp'], '2024-01-01T00:00:00+00:00')
+
+    def test_export_csv_with_filter(self):
+        """Test logs are streamed as CSV honouring the list filters"""
+        res = self.client.get(STRENGTH_EXERCISE_LOG_EXPORT_URL,
+                              {'output': 'csv', 'since': '2024-01-02'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row['reps'] for row in rows], ['2', '3'])
+        self.assertEqual(rows[0]['calories_burned'], '20')
+
+    def test_export_invalid_output(self):
+        """Test an unknown output format is rejected"""
+        res = self.client.get(STRENGTH_EXERCISE_LOG_EXPORT_URL,
+                              {'output': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -2,12 +2,19 @@
 Test for strength exercise APIs
 """
 # from decimal import Decimal
+import io
 import tempfile
 import os
+from unittest.mock import patch
 
 from PIL import Image
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -19,6 +26,8 @@ from core.models import (
     TrackExercise
 )
 
+from exercise.images import sweep_images
+from exercise.muscles import muscle_mask
 from exercise.serializers import (
     StrengthExerciseSerializer,
     StrengthExerciseDetailSerializer,
@@ -26,6 +35,7 @@ from exercise.serializers import (
 
 STRENGTH_EXERCISE_URL = reverse('exercise:strength-exercise-list')
 TRACK_EXERCISE_URL = reverse('exercise:track-exercise-list')
+SEARCH_URL = reverse('exercise:strength-exercise-search')
 
 
 def detail_url(exercise_id):
@@ -75,6 +85,8 @@ class PrivateStrengthExerciseApiTests(TestCase):
         self.client = APIClient()
         self.user = create_user(email='user@example.com', password='test123')
         self.client.force_authenticate(self.user)
+        # catalog snapshots outlive the rolled back test data
+        cache.clear()
 
     def test_retrieve_exercise(self):
         """ Test retrieving a list of exercises"""
@@ -90,7 +102,7 @@ class PrivateStrengthExerciseApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         # match the data from the database with the data from the url
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.json()['results'], serializer.data)
 
     def test_strength_exercise_is_avaialble_to_all_user(self):
         """Test that strength_exercise is available to all user"""
@@ -111,7 +123,7 @@ class PrivateStrengthExerciseApiTests(TestCase):
         # match data from url logined as other user has the
         # exercise created by user
         self.assertTrue(any(ex['id'] == strength_exercise.id
-                            for ex in res.data))
+                            for ex in res.json()['results']))
 
     def test_get_strength_exercise_detail(self):
         """Test get strength exercise detail"""
@@ -123,6 +135,84 @@ class PrivateStrengthExerciseApiTests(TestCase):
         serializer = StrengthExerciseDetailSerializer(strength_exercise)
         self.assertEqual(res.data, serializer.data)
 
+    def test_list_strength_exercises_query_count(self):
+        """Test listing does not query muscle groups per exercise"""
+        chest = MuscleGroup.objects.create(name='chest')
+        back = MuscleGroup.objects.create(name='back')
+        for index in range(5):
+            exercise = create_strength_exercise(name=f'exercise {index}')
+            exercise.primary_muscle_groups.add(chest)
+            exercise.secondary_muscle_groups.add(back)
+
+        # exercises, then the primary and secondary muscle groups
+        with self.assertNumQueries(3):
+            res = self.client.get(STRENGTH_EXERCISE_URL)
+
+        self.assertEqual(len(res.json()['results']), 5)
+        self.assertEqual(res.json()['results'][0]['primary_muscle_groups'],
+                         [{'id': chest.id, 'name': 'chest'}])
+
+    def test_list_served_from_snapshot(self):
+        """Test the rendered list is reused until the catalog changes"""
+        create_strength_exercise()
+        res = self.client.get(STRENGTH_EXERCISE_URL)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(STRENGTH_EXERCISE_URL)
+
+        self.assertEqual(cached.content, res.content)
+        self.assertEqual(cached['ETag'], res['ETag'])
+
+    def test_list_not_modified(self):
+        """Test a client holding the current ETag gets a 304"""
+        create_strength_exercise()
+        etag = self.client.get(STRENGTH_EXERCISE_URL)['ETag']
+
+        res = self.client.get(STRENGTH_EXERCISE_URL,
+                              HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['ETag'], etag)
+
+    def test_snapshot_invalidated_on_write(self):
+        """Test catalog writes change the list and its ETag"""
+        exercise = create_strength_exercise()
+        etag = self.client.get(STRENGTH_EXERCISE_URL)['ETag']
+
+        payload = {'name': 'Pull-up', 'description': 'Sample',
+                   'dificulty_level': 2}
+        self.client.post(STRENGTH_EXERCISE_URL, payload, format='json')
+        res = self.client.get(STRENGTH_EXERCISE_URL,
+                              HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual([ex['name'] for ex in res.json()['results']],
+                         ['Pull-up', 'arms push-up'])
+
+        # model writes go through the same signals as the admin
+        etag = res['ETag']
+        exercise.primary_muscle_groups.add(
+            MuscleGroup.objects.create(name='back'))
+        res = self.client.get(STRENGTH_EXERCISE_URL,
+                              HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_get_strength_exercise_detail_query_count(self):
+        """Test the detail loads the muscle groups in fixed queries"""
+        exercise = create_strength_exercise()
+        exercise.primary_muscle_groups.add(
+            MuscleGroup.objects.create(name='chest'),
+            MuscleGroup.objects.create(name='triceps'),
+        )
+
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(exercise.id))
+
+        self.assertEqual(len(res.data['primary_muscle_groups']), 2)
+
     def test_description_not_availble_in_StrengthExercise_Serializer(self):
         """Test description is only availble by detailSerializer"""
         payload = {
@@ -139,7 +229,7 @@ class PrivateStrengthExerciseApiTests(TestCase):
         self.assertEqual(res_normal_url.status_code, status.HTTP_200_OK)
         self.assertEqual(res_detail_url.status_code, status.HTTP_200_OK)
         # check if description is not in the normal url
-        self.assertNotIn('description', res_normal_url.data[0])
+        self.assertNotIn('description', res_normal_url.json()['results'][0])
         # check if description is in the detail url
         self.assertIn('description', res_detail_url.data)
         self.assertEqual(res_detail_url.data['description'],
@@ -301,6 +391,68 @@ class PrivateStrengthExerciseApiTests(TestCase):
         self.assertNotIn(muscle_group_core,
                          strength_exercise.primary_muscle_groups.all())
 
+    def test_create_with_muscle_groups_query_count(self):
+        """Test muscle groups are written per field, not per group"""
+        MuscleGroup.objects.create(name='chest')
+
+        def create(name, primary, secondary):
+            payload = {
+                'name': name, 'description': 'Sample',
+                'dificulty_level': 2,
+                'primary_muscle_groups': [{'name': n} for n in primary],
+                'secondary_muscle_groups': [{'name': n} for n in secondary],
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(STRENGTH_EXERCISE_URL, payload,
+                                       format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        few = create('Push-up', ['chest'], ['arms'])
+        many = create('Burpee', ['chest', 'legs', 'abs'],
+                      ['arms', 'shoulders', 'glutes'])
+
+        self.assertEqual(few, many)
+        exercise = StrengthExercise.objects.get(name='Burpee')
+        self.assertEqual(exercise.primary_muscle_groups.count(), 3)
+        self.assertEqual(exercise.secondary_muscle_groups.count(), 3)
+        self.assertEqual(MuscleGroup.objects.count(), 6)
+
+    def test_update_muscle_groups_applies_difference(self):
+        """Test an update keeps the links of unchanged muscle groups"""
+        chest = MuscleGroup.objects.create(name='chest')
+        arms = MuscleGroup.objects.create(name='arms')
+        strength_exercise = create_strength_exercise()
+        strength_exercise.primary_muscle_groups.add(chest, arms)
+        through = StrengthExercise.primary_muscle_groups.through
+        chest_link = through.objects.get(musclegroup=chest)
+
+        payload = {'primary_muscle_groups': [{'name': 'chest'},
+                                             {'name': 'back'}]}
+        url = detail_url(strength_exercise.id)
+        res = self.client.patch(url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(strength_exercise.primary_muscle_groups
+                .values_list('name', flat=True)),
+            {'chest', 'back'},
+        )
+        self.assertTrue(through.objects.filter(pk=chest_link.pk).exists())
+
+    def test_partial_update_keeps_muscle_groups(self):
+        """Test muscle groups left out of a partial update are kept"""
+        chest = MuscleGroup.objects.create(name='chest')
+        strength_exercise = create_strength_exercise()
+        strength_exercise.secondary_muscle_groups.add(chest)
+
+        url = detail_url(strength_exercise.id)
+        res = self.client.patch(url, {'name': 'Push-up'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(strength_exercise.secondary_muscle_groups.all()),
+                         [chest])
+
     def test_clear_strength_exercise_muscle_groups(self):
         """Test clearing all muscle_groups of a strength_exercise"""
         muscle_group_abs = MuscleGroup.objects.create(name='abs')
@@ -543,6 +695,230 @@ class PrivateStrengthExerciseApiTests(TestCase):
 ##############################################################################
 
 
+class StrengthExerciseSearchApiTests(TestCase):
+    """Test the strength exercise search API"""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def search(self, query, **params):
+        res = self.client.get(SEARCH_URL, {'q': query, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [exercise['name'] for exercise in res.data]
+
+    def test_search_ranks_name_matches_first(self):
+        """Test exercises named after the query come before others"""
+        create_strength_exercise(name='Bench press',
+                                 description='Lie on a flat bench')
+        create_strength_exercise(name='Push-up',
+                                 description='Like a bench press, '
+                                             'without the bench')
+        create_strength_exercise(name='Squats', description='Legs')
+
+        self.assertEqual(self.search('bench press'),
+                         ['Bench press', 'Push-up'])
+
+    def test_search_matches_word_prefix_and_stems(self):
+        """Test the last word matches as a prefix, others by stem"""
+        create_strength_exercise(name='Pull-up', description='Pulling')
+        create_strength_exercise(name='Squats', description='Legs')
+
+        self.assertEqual(self.search('pul'), ['Pull-up'])
+        self.assertEqual(self.search('squat'), ['Squats'])
+        self.assertEqual(self.search('pulls up'), ['Pull-up'])
+        self.assertEqual(self.search('deadlift'), [])
+
+    def test_search_follows_catalog_writes(self):
+        """Test renamed and deleted exercises are found accordingly"""
+        exercise = create_strength_exercise(name='Dips',
+                                            description='Triceps')
+        exercise.name = 'Bench dips'
+        exercise.save()
+        create_strength_exercise(name='Lunges', description='Legs').delete()
+
+        self.assertEqual(self.search('bench'), ['Bench dips'])
+        self.assertEqual(self.search('lunges'), [])
+
+    def test_search_limit(self):
+        """Test the number of results can be limited"""
+        for index in range(3):
+            create_strength_exercise(name=f'Curl {index}',
+                                     description='Biceps')
+
+        self.assertEqual(len(self.search('curl', limit=2)), 2)
+
+    def test_search_syntax_is_ignored(self):
+        """Test search operators in the query are not interpreted"""
+        create_strength_exercise(name='Push-up', description='Chest')
+
+        self.assertEqual(self.search('"push" -(up*'), ['Push-up'])
+
+    def test_search_requires_query(self):
+        """Test a query without words is rejected"""
+        res = self.client.get(SEARCH_URL, {'q': ' - '})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StrengthExercisePaginationTests(TestCase):
+    """Test paginating, ordering and filtering the strength exercises"""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        for index, level in enumerate([1, 3, 2, 1, 2, 3, 1]):
+            create_strength_exercise(name=f'Exercise {index}',
+                                     dificulty_level=level)
+
+    def collect(self, **params):
+        """Follow the next links and return every exercise listed"""
+        exercises = []
+        res = self.client.get(STRENGTH_EXERCISE_URL,
+                              {'page_size': 2, **params})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            data = res.json()
+            self.assertLessEqual(len(data['results']), 2)
+            exercises.extend(data['results'])
+            if not data['next']:
+                return exercises
+            res = self.client.get(data['next'])
+
+    def test_pages_cover_catalog(self):
+        """Test following the pages lists every exercise once"""
+        exercises = self.collect()
+
+        self.assertEqual(
+            [ex['id'] for ex in exercises],
+            list(StrengthExercise.objects.order_by('-id')
+                 .values_list('id', flat=True)),
+        )
+
+    def test_ordering(self):
+        """Test pages follow the requested ordering, ties by id"""
+        by_name = self.collect(ordering='name')
+        self.assertEqual([ex['name'] for ex in by_name],
+                         [f'Exercise {index}' for index in range(7)])
+
+        by_level = self.collect(ordering='-dificulty_level')
+        self.assertEqual(
+            [ex['id'] for ex in by_level],
+            list(StrengthExercise.objects
+                 .order_by('-dificulty_level', '-id')
+                 .values_list('id', flat=True)),
+        )
+
+    def test_difficulty_filter(self):
+        """Test exercises can be narrowed to difficulty levels"""
+        exercises = self.collect(difficulty='1,3')
+
+        self.assertEqual(len(exercises), 5)
+        self.assertTrue(all(ex['dificulty_level'] in (1, 3)
+                            for ex in exercises))
+
+    def test_invalid_parameters(self):
+        """Test unknown orderings and difficulty levels are rejected"""
+        for params in ({'ordering': 'description'}, {'ordering': '--id'},
+                       {'difficulty': 'hard'}):
+            res = self.client.get(STRENGTH_EXERCISE_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_first_page_snapshot(self):
+        """Test the first page is served from the snapshot"""
+        self.client.get(STRENGTH_EXERCISE_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(STRENGTH_EXERCISE_URL)
+
+        self.assertEqual(len(res.json()['results']), 7)
+        self.assertIsNone(res.json()['next'])
+
+
+class StrengthExerciseMuscleFilterTests(TestCase):
+    """Test filtering strength exercises by muscle groups"""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        groups = {name: MuscleGroup.objects.create(name=name)
+                  for name in ('chest', 'arms', 'shoulders', 'back')}
+
+        def create(name, primary, secondary=()):
+            exercise = create_strength_exercise(name=name)
+            exercise.primary_muscle_groups.add(
+                *(groups[group] for group in primary))
+            exercise.secondary_muscle_groups.add(
+                *(groups[group] for group in secondary))
+            return exercise
+
+        self.groups = groups
+        self.bench = create('Bench press', ['chest'], ['arms', 'shoulders'])
+        self.push_up = create('Push-up', ['chest', 'arms'])
+        self.row = create('Row', ['back'], ['arms'])
+
+    def names(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(STRENGTH_EXERCISE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # the exercises are filtered without joining the muscle groups
+        self.assertNotIn('JOIN', queries[0]['sql'])
+        return sorted(exercise['name'] for exercise in res.data['results'])
+
+    def test_masks_follow_muscle_groups(self):
+        """Test the masks are kept in step with the muscle groups"""
+        self.bench.refresh_from_db()
+        self.assertEqual(self.bench.primary_muscle_mask,
+                         muscle_mask(['chest']))
+        self.assertEqual(self.bench.secondary_muscle_mask,
+                         muscle_mask(['arms', 'shoulders']))
+
+        self.bench.secondary_muscle_groups.remove(self.groups['arms'])
+        self.groups['back'].strength_primary_muscle_groups.add(self.bench)
+        self.bench.refresh_from_db()
+        self.assertEqual(self.bench.primary_muscle_mask,
+                         muscle_mask(['chest', 'back']))
+        self.assertEqual(self.bench.secondary_muscle_mask,
+                         muscle_mask(['shoulders']))
+
+        self.groups['shoulders'].delete()
+        self.groups['back'].strength_primary_muscle_groups.clear()
+        self.bench.refresh_from_db()
+        self.assertEqual(self.bench.primary_muscle_mask,
+                         muscle_mask(['chest']))
+        self.assertEqual(self.bench.secondary_muscle_mask, 0)
+
+    def test_filter_all_any_none(self):
+        """Test all, any and none filters combine"""
+        self.assertEqual(self.names(muscles_all='chest,arms'),
+                         ['Bench press', 'Push-up'])
+        self.assertEqual(self.names(muscles_any='back,shoulders'),
+                         ['Bench press', 'Row'])
+        self.assertEqual(self.names(muscles_all='chest,arms',
+                                    muscles_none='shoulders'),
+                         ['Push-up'])
+
+    def test_filter_muscle_role(self):
+        """Test filters can be matched against primary groups only"""
+        self.assertEqual(
+            self.names(muscles_any='arms', muscle_role='primary'),
+            ['Push-up'])
+        self.assertEqual(
+            self.names(muscles_any='arms', muscle_role='secondary'),
+            ['Bench press', 'Row'])
+
+    def test_filter_unknown_muscle_group(self):
+        """Test unknown muscle groups and roles are rejected"""
+        res = self.client.get(STRENGTH_EXERCISE_URL, {'muscles_all': 'neck'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(STRENGTH_EXERCISE_URL,
+                              {'muscles_any': 'chest', 'muscle_role': 'x'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class ImageUploadTests(TestCase):
     """Test image upload for strength exercise"""
     def setUp(self):
@@ -576,3 +952,164 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(IMAGE_VARIANT_WORKERS=0)
+class ImageVariantTests(TestCase):
+    """Test the resized variants of the strength exercise images"""
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name))
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.exercise = create_strength_exercise()
+
+    def tearDown(self):
+        self.media.cleanup()
+
+    def upload(self, size=(2000, 1000), mode='RGB', color=0, exercise=None):
+        exercise = exercise or self.exercise
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            Image.new(mode, size, color).save(image_file, format='PNG')
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(image_upload_url(exercise.id),
+                                       {'image': image_file},
+                                       format='multipart')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        exercise.refresh_from_db()
+        return exercise.image_variants
+
+    def test_upload_renders_variants(self):
+        """Test every size is stored as JPEG and WebP, never enlarged"""
+        variants = self.upload(mode='RGBA')
+
+        self.assertEqual(set(variants),
+                         {'large', 'medium', 'small', 'thumbnail'})
+        expected = {'large': (1280, 640), 'thumbnail': (160, 80)}
+        for size, dimensions in expected.items():
+            for variant_format, name in variants[size].items():
+                with Image.open(self.exercise.image.storage.path(name)) \
+                        as image:
+                    self.assertEqual(image.size, dimensions)
+                    self.assertEqual(image.format, variant_format.upper())
+
+        small = self.upload(size=(100, 50))
+        with Image.open(self.exercise.image.storage.path(
+                small['large']['webp'])) as image:
+            self.assertEqual(image.size, (100, 50))
+
+    def test_detail_exposes_variant_urls(self):
+        """Test the detail endpoint returns absolute variant URLs"""
+        variants = self.upload()
+
+        res = self.client.get(detail_url(self.exercise.id))
+
+        url = res.data['image_variants']['thumbnail']['webp']
+        self.assertTrue(url.startswith('http://testserver/'))
+        self.assertTrue(url.endswith(variants['thumbnail']['webp']))
+
+    @override_settings(IMAGE_SWEEP_GRACE=0)
+    def test_new_upload_replaces_variants(self):
+        """Test a replaced image and its variants are deleted"""
+        storage = self.exercise.image.storage
+        self.upload()
+        previous = self.exercise.image.name
+        previous_variant = self.exercise.image_variants['medium']['jpeg']
+
+        current = self.upload(color=255)['medium']['jpeg']
+
+        self.assertNotEqual(previous_variant, current)
+        self.assertFalse(storage.exists(previous))
+        self.assertFalse(storage.exists(previous_variant))
+        self.assertTrue(storage.exists(current))
+
+    def test_same_image_is_stored_once(self):
+        """Test identical uploads share the image and its variants"""
+        other = create_strength_exercise(name='Squats')
+        variants = self.upload()
+
+        with patch('exercise.images.render_variants') as render:
+            self.assertEqual(self.upload(exercise=other), variants)
+
+        render.assert_not_called()
+        self.assertEqual(other.image.name, self.exercise.image.name)
+        self.assertRegex(other.image.name,
+                         r'^uploads/strength_exercise/'
+                         r'([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.png$')
+
+    @override_settings(IMAGE_SWEEP_GRACE=0)
+    def test_image_deleted_with_last_exercise(self):
+        """Test an image is deleted with the last exercise using it"""
+        other = create_strength_exercise(name='Squats')
+        self.upload()
+        self.upload(exercise=other)
+        storage = self.exercise.image.storage
+        name = self.exercise.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exercise.delete()
+        self.assertTrue(storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(storage.exists(
+            other.image_variants['thumbnail']['webp']))
+
+    def test_recent_image_left_to_sweep(self):
+        """Test an image stored within the grace period is swept later"""
+        self.upload()
+        storage = self.exercise.image.storage
+        name = self.exercise.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exercise.delete()
+        self.assertTrue(storage.exists(name))
+
+        self.assertEqual(sweep_images(), 0)
+        call_command('sweep_images', '--grace', '0', stdout=io.StringIO())
+        self.assertFalse(storage.exists(name))
+
+    def test_sweep_spares_image_reused_by_upload(self):
+        """Test an unused image saved again by an upload is not swept"""
+        self.upload()
+        storage = self.exercise.image.storage
+        name = self.exercise.image.name
+        with storage.open(name, 'rb') as image_file:
+            content = ContentFile(image_file.read(), name='image.png')
+        self.exercise.delete()
+        os.utime(storage.path(name), (0, 0))
+
+        # an upload of the same content, not committed yet
+        self.assertEqual(storage.save('uploads/strength_exercise/image.png',
+                                      content), name)
+
+        self.assertEqual(sweep_images(grace=60), 0)
+        self.assertTrue(storage.exists(name))
+
+    def test_command_renders_missing_variants(self):
+        """Test the command catches up on images without variants"""
+        self.upload()
+        StrengthExercise.objects.update(image_variants={})
+
+        call_command('generate_image_variants', stdout=io.StringIO())
+
+        self.exercise.refresh_from_db()
+        self.assertEqual(len(self.exercise.image_variants), 4)
+
+    def test_existing_variants_kept(self):
+        """Test rendering again leaves the stored variant files in place"""
+        variants = self.upload()
+        path = self.exercise.image.storage.path(variants['small']['webp'])
+        with open(path, 'wb') as variant_file:
+            variant_file.write(b'shared')
+        StrengthExercise.objects.update(image_variants={})
+
+        call_command('generate_image_variants', stdout=io.StringIO())
+
+        self.exercise.refresh_from_db()
+        self.assertEqual(self.exercise.image_variants, variants)
+        with open(path, 'rb') as variant_file:
+            self.assertEqual(variant_file.read(), b'shared')
@@ -0,0 +1,230 @@
+"""
+Test for the sync change feed API
+"""
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    MuscleGroup,
+    StrengthExercise,
+    StrengthExerciseLog,
+    SyncChange,
+    TrackExercise,
+)
+from exercise.sync import encode_cursor
+
+SYNC_URL = reverse('exercise:sync')
+LOG_BATCH_URL = reverse('exercise:log-batch')
+
+
+def create_user(**params):
+    """Create and return a sample user"""
+    return get_user_model().objects.create_user(**params)
+
+
+def create_strength_log(user, exercise, **params):
+    """Create and return a sample strength log"""
+    defaults = {'reps': 10, 'sets': 3, 'calories_burned': 50}
+    defaults.update(params)
+    return StrengthExerciseLog.objects.create(user=user, exercise=exercise,
+                                              **defaults)
+
+
+class PublicSyncApiTests(TestCase):
+    """Test unauthenticated sync API access"""
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        res = self.client.get(SYNC_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncApiTests(TestCase):
+    """Test authenticated sync API access"""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.exercise = StrengthExercise.objects.create(name='Squats')
+
+    def test_first_sync_returns_everything(self):
+        """Test a sync without cursor returns the catalog and own logs"""
+        TrackExercise.objects.create(name='run')
+        MuscleGroup.objects.create(name='chest')
+        log = create_strength_log(self.user, self.exercise)
+        other_user = create_user(email='other@example.com',
+                                 password='test123')
+        create_strength_log(other_user, self.exercise)
+
+        res = self.client.get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.data['has_more'])
+        changes = res.data['changes']
+        self.assertEqual([item['id'] for item
+                          in changes['strength_log']['updated']], [log.id])
+        self.assertEqual(changes['strength_log']['updated'][0]['exercise'],
+                         'Squats')
+        self.assertEqual(
+            [item['name'] for item
+             in changes['strength_exercise']['updated']], ['Squats'])
+        self.assertEqual(
+            [item['name'] for item in changes['track_exercise']['updated']],
+            ['run'])
+        self.assertEqual(
+            [item['name'] for item in changes['muscle_group']['updated']],
+            ['chest'])
+
+    def test_sync_since_cursor(self):
+        """Test only changes after the cursor are returned"""
+        create_strength_log(self.user, self.exercise)
+        cursor = self.client.get(SYNC_URL).data['cursor']
+
+        log = create_strength_log(self.user, self.exercise, reps=5)
+        res = self.client.get(SYNC_URL, {'cursor': cursor})
+
+        changes = res.data['changes']
+        self.assertEqual([item['id'] for item
+                          in changes['strength_log']['updated']], [log.id])
+        self.assertEqual(changes['strength_exercise']['updated'], [])
+
+        res = self.client.get(SYNC_URL, {'cursor': res.data['cursor']})
+
+        self.assertEqual(res.data['changes']['strength_log'],
+                         {'updated': [], 'deleted': []})
+
+    def test_sync_returns_tombstones(self):
+        """Test deleted logs and exercises are returned by id"""
+        log = create_strength_log(self.user, self.exercise)
+        cursor = self.client.get(SYNC_URL).data['cursor']
+        log_id, exercise_id = log.id, self.exercise.id
+
+        self.exercise.delete()
+        res = self.client.get(SYNC_URL, {'cursor': cursor})
+
+        changes = res.data['changes']
+        self.assertEqual(changes['strength_log']['deleted'], [log_id])
+        self.assertEqual(changes['strength_exercise']['deleted'],
+                         [exercise_id])
+
+    def test_changes_of_an_object_collapse(self):
+        """Test an object updated then deleted is only a tombstone"""
+        cursor = self.client.get(SYNC_URL).data['cursor']
+        log = create_strength_log(self.user, self.exercise)
+        log.reps = 12
+        log.save()
+        log_id = log.id
+        log.delete()
+
+        res = self.client.get(SYNC_URL, {'cursor': cursor})
+
+        self.assertEqual(res.data['changes']['strength_log'],
+                         {'updated': [], 'deleted': [log_id]})
+
+    def test_sync_limit(self):
+        """Test the feed is returned in pages of `limit` changes"""
+        logs = [create_strength_log(self.user, self.exercise)
+                for _index in range(3)]
+
+        res = self.client.get(SYNC_URL, {'limit': 2})
+
+        self.assertTrue(res.data['has_more'])
+        updated = res.data['changes']['strength_log']['updated']
+        self.assertEqual([item['id'] for item in updated], [logs[0].id])
+
+        res = self.client.get(SYNC_URL, {'limit': 2,
+                                         'cursor': res.data['cursor']})
+
+        self.assertFalse(res.data['has_more'])
+        updated = res.data['changes']['strength_log']['updated']
+        self.assertEqual([item['id'] for item in updated],
+                         [logs[1].id, logs[2].id])
+
+    def test_muscle_group_changes_are_synced(self):
+        """Test changing an exercise's muscle groups records the exercise"""
+        muscle_group = MuscleGroup.objects.create(name='chest')
+        cursor = self.client.get(SYNC_URL).data['cursor']
+
+        self.exercise.primary_muscle_groups.add(muscle_group)
+        res = self.client.get(SYNC_URL, {'cursor': cursor})
+
+        updated = res.data['changes']['strength_exercise']['updated']
+        self.assertEqual(len(updated), 1)
+        self.assertEqual(updated[0]['primary_muscle_groups'],
+                         [{'id': muscle_group.id, 'name': 'chest'}])
+
+    def test_batch_logs_are_synced(self):
+        """Test logs created in a batch are recorded in the feed"""
+        cursor = self.client.get(SYNC_URL).data['cursor']
+        payload = {'strength': [
+            {'exercise': 'Squats', 'reps': 10, 'sets': 3,
+             'calories_burned': 50, 'timestamp': '2024-01-01T08:00:00Z'},
+        ]}
+        self.client.post(LOG_BATCH_URL, payload, format='json')
+
+        res = self.client.get(SYNC_URL, {'cursor': cursor})
+
+        updated = res.data['changes']['strength_log']['updated']
+        self.assertEqual(len(updated), 1)
+
+    def test_invalid_cursor(self):
+        """Test an invalid cursor is rejected"""
+        res = self.client.get(SYNC_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_expired_cursor(self):
+        """Test cursors past their lifetime or without a time are refused"""
+        expired = encode_cursor(1, time.time() - 60 * 60 * 24 * 31)
+        without_time = 'eyJzZXEiOjF9'  # {"seq":1}
+
+        for cursor in (expired, without_time):
+            res = self.client.get(SYNC_URL, {'cursor': cursor})
+            self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+    def test_compacted_feed_syncs_the_same(self):
+        """Test compaction keeps what the cursors in use still need"""
+        log = create_strength_log(self.user, self.exercise)
+        cursor = self.client.get(SYNC_URL).data['cursor']
+        log.reps = 12
+        log.save()
+        removed = create_strength_log(self.user, self.exercise)
+        removed_id = removed.id
+        removed.delete()
+        old = create_strength_log(self.user, self.exercise)
+        old_id = old.id
+        old.delete()
+        SyncChange.objects.filter(object_id=old_id).update(
+            created_at=timezone.now() - timedelta(days=32))
+
+        call_command('compact_sync_changes', stdout=StringIO())
+
+        self.assertEqual(SyncChange.objects.filter(
+            kind='strength_log').count(), 2)
+        res = self.client.get(SYNC_URL, {'cursor': cursor})
+        changes = res.data['changes']['strength_log']
+        self.assertEqual([item['id'] for item in changes['updated']],
+                         [log.id])
+        self.assertEqual(changes['updated'][0]['reps'], 12)
+        self.assertEqual(changes['deleted'], [removed_id])
+
+    def test_deleted_user_feed_dropped(self):
+        """Test the feed of a deleted user is deleted with it"""
+        create_strength_log(self.user, self.exercise)
+
+        self.user.delete()
+
+        self.assertFalse(SyncChange.objects.filter(
+            kind='strength_log').exists())
@@ -0,0 +1,115 @@
+"""
+Test for the Track exercise Log API
+"""
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    TrackExercise,
+    TrackExerciseLog,
+)
+
+TRACK_EXERCISE_LOG_URL = reverse('exercise:track-exercise-log-list')
+
+
+def detail_url(log_id):
+    """Return track exercise log detail URL"""
+    return reverse('exercise:track-exercise-log-detail', args=[log_id])
+
+
+def create_user(**params):
+    """Create and return a sample user"""
+    return get_user_model().objects.create_user(**params)
+
+
+class PublicTrackExerciseLogApiTests(TestCase):
+    """Test unauthenticated track exercise log API access"""
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        res = self.client.get(TRACK_EXERCISE_LOG_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateTrackExerciseLogApiTests(TestCase):
+    """Test authenticated track exercise log API access"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.run = TrackExercise.objects.create(name='run')
+        self.walk = TrackExercise.objects.create(name='walk')
+
+    def test_create_track_exercise_log(self):
+        """Test creating a track exercise log"""
+        payload = {
+            'exercise': 'run',
+            'distance': '5.25',
+            'pace': '00:05:30',
+            'calories_burned': 320,
+        }
+
+        res = self.client.post(TRACK_EXERCISE_LOG_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        log = TrackExerciseLog.objects.get(id=res.data['id'])
+        self.assertEqual(log.user, self.user)
+        self.assertEqual(log.exercise, self.run)
+        self.assertEqual(log.distance, Decimal('5.25'))
+        self.assertEqual(log.pace, timedelta(minutes=5, seconds=30))
+
+    def test_list_limited_to_user(self):
+        """Test only the authenticated user's logs are listed"""
+        other = create_user(email='other@example.com', password='test123')
+        TrackExerciseLog.objects.create(
+            user=other, exercise=self.run, calories_burned=10,
+            distance=Decimal('1.00'), pace=timedelta(minutes=6),
+        )
+        log = TrackExerciseLog.objects.create(
+            user=self.user, exercise=self.run, calories_burned=10,
+            distance=Decimal('1.00'), pace=timedelta(minutes=6),
+        )
+
+        res = self.client.get(TRACK_EXERCISE_LOG_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data['results']],
+                         [log.id])
+
+    def test_filter_logs(self):
+        """Test filtering track logs by exercise and date range"""
+        logs = {}
+        for day, exercise in ((1, self.run), (2, self.walk), (3, self.run)):
+            logs[day] = TrackExerciseLog.objects.create(
+                user=self.user, exercise=exercise, calories_burned=10,
+                distance=Decimal('1.00'), pace=timedelta(minutes=6),
+                timestamp=datetime(2024, 1, day, tzinfo=timezone.utc),
+            )
+
+        res = self.client.get(TRACK_EXERCISE_LOG_URL,
+                              {'exercise': 'run', 'until': '2024-01-03'})
+
+        self.assertEqual([item['id'] for item in res.data['results']],
+                         [logs[1].id])
+
+    def test_delete_track_exercise_log(self):
+        """Test deleting a track exercise log"""
+        log = TrackExerciseLog.objects.create(
+            user=self.user, exercise=self.run, calories_burned=10,
+            distance=Decimal('1.00'), pace=timedelta(minutes=6),
+        )
+
+        res = self.client.delete(detail_url(log.id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(TrackExerciseLog.objects.exists())
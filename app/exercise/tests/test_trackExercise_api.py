@@ -4,6 +4,7 @@ Test for track exercise APIs
 # from decimal import Decimal
 # import os
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 
@@ -65,6 +66,8 @@ class PrivateTrackExerciseApiTests(TestCase):
         self.client = APIClient()
         self.user = create_user(email='user@example.com', password='test123')
         self.client.force_authenticate(self.user)
+        # catalog snapshots outlive the rolled back test data
+        cache.clear()
 
     def test_retrieve_exercise(self):
         """ Test retrieving a list of exercises"""
@@ -80,7 +83,7 @@ class PrivateTrackExerciseApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         # match the data from the database with the data from the url
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.json()['results'], serializer.data)
 
     def test_track_exercise_is_avaialble_to_all_user(self):
         """Test that track_exercise is available to all user"""
@@ -100,7 +103,53 @@ class PrivateTrackExerciseApiTests(TestCase):
         # match data from url logined as other user has the
         # exercise created by user
         self.assertTrue(any(ex['id'] == track_exercise.id
-                            for ex in res.data))
+                            for ex in res.json()['results']))
+
+    def test_list_track_exercises_query_count(self):
+        """Test listing does not query muscle groups per exercise"""
+        legs = MuscleGroup.objects.create(name='legs')
+        core = MuscleGroup.objects.create(name='core')
+        for index in range(5):
+            exercise = create_track_exercise(name=f'exercise {index}')
+            exercise.primary_muscle_groups.add(legs)
+            exercise.secondary_muscle_groups.add(core)
+
+        # exercises, then the primary and secondary muscle groups
+        with self.assertNumQueries(3):
+            res = self.client.get(TRACK_EXERCISE_URL)
+
+        self.assertEqual(len(res.json()['results']), 5)
+        self.assertEqual(res.json()['results'][0]['secondary_muscle_groups'],
+                         [{'id': core.id, 'name': 'core'}])
+
+    def test_get_track_exercise_detail_query_count(self):
+        """Test the detail loads the muscle groups in fixed queries"""
+        exercise = create_track_exercise()
+        exercise.primary_muscle_groups.add(
+            MuscleGroup.objects.create(name='legs'))
+        exercise.secondary_muscle_groups.add(
+            MuscleGroup.objects.create(name='core'))
+
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(exercise.id))
+
+        self.assertEqual(len(res.data['secondary_muscle_groups']), 1)
+
+    def test_filter_track_exercises_by_muscle_groups(self):
+        """Test track exercises can be filtered by muscle groups"""
+        legs = MuscleGroup.objects.create(name='legs')
+        calves = MuscleGroup.objects.create(name='calves')
+        run = create_track_exercise(name='run')
+        run.primary_muscle_groups.add(legs)
+        run.secondary_muscle_groups.add(calves)
+        create_track_exercise(name='walk').primary_muscle_groups.add(legs)
+
+        res = self.client.get(TRACK_EXERCISE_URL, {'muscles_all': 'legs'})
+        self.assertEqual(len(res.data['results']), 2)
+
+        res = self.client.get(TRACK_EXERCISE_URL, {'muscles_none': 'calves'})
+        self.assertEqual([ex['name'] for ex in res.data['results']],
+                         ['walk'])
 
     def test_create_track_exercise(self):
         """Test creating a new track exercise"""
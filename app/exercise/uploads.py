@@ -0,0 +1,318 @@
+"""
+Size bounded uploads of the strength exercise images
+
+Images sent in one multipart request are spooled to disk and hashed as
+they arrive, the request is stopped as soon as it goes past
+IMAGE_UPLOAD_MAX_BYTES (LOG_IMPORT_MAX_BYTES for the log import files).
+Slow clients can instead send an image in chunks to an
+ExerciseImageUpload, resuming from its offset after a dropped
+connection. The chunks are hashed as they arrive too, a process that
+did not receive the previous chunks hashes the file received so far
+once before appending to it. The pixel limit is checked from the image
+header by StrengthExerciseImageSerializer before anything decodes the
+image.
+"""
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    StopUpload,
+    TemporaryFileUploadHandler,
+)
+from django.http import UnreadablePostError
+from django.http.multipartparser import (
+    MultiPartParser as DjangoMultiPartParser,
+    MultiPartParserError,
+)
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import exceptions, status
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+from core.models import ExerciseImageUpload
+
+# allowance for the multipart boundaries and headers around the image
+MULTIPART_OVERHEAD = 64 * 1024
+CHUNK_SIZE = 64 * 1024
+# partial SHA-256 of the chunked uploads received by this process
+MAX_PARTIAL_DIGESTS = 1000
+
+# upload id: (offset, sha256 of the bytes before the offset)
+_digests = OrderedDict()
+_digests_lock = threading.Lock()
+
+
+class UploadTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'The upload is too large.'
+    default_code = 'upload_too_large'
+
+
+class UploadConflict(exceptions.APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The upload offset does not match.'
+    default_code = 'upload_offset_mismatch'
+
+
+def too_large():
+    return UploadTooLarge(
+        f'Images are limited to {settings.IMAGE_UPLOAD_MAX_BYTES} bytes.')
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """Spool uploaded files to disk, hashing them, up to the byte limit"""
+
+    def __init__(self, *args, max_bytes=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_bytes = max_bytes or settings.IMAGE_UPLOAD_MAX_BYTES
+        self.received = 0
+        self.exceeded = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.exceeded = True
+            self.upload_interrupted()
+            raise StopUpload(connection_reset=True)
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        # read by core.storage.content_digest instead of hashing again
+        uploaded_file.sha256 = self.sha256.hexdigest()
+        return uploaded_file
+
+
+def content_length(meta):
+    """Return the announced length of a request body, 0 if unusable."""
+    try:
+        return max(int(meta.get('CONTENT_LENGTH') or 0), 0)
+    except ValueError:
+        return 0
+
+
+class BoundedMultiPartParser(MultiPartParser):
+    """Multipart parser rejecting requests past the image byte limit"""
+
+    def max_bytes(self):
+        return settings.IMAGE_UPLOAD_MAX_BYTES
+
+    def too_large(self):
+        return too_large()
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context['request']
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        meta = request.META.copy()
+        meta['CONTENT_TYPE'] = media_type
+
+        max_bytes = self.max_bytes()
+        if content_length(meta) > max_bytes + MULTIPART_OVERHEAD:
+            raise self.too_large()
+
+        handler = BoundedUploadHandler(request._request, max_bytes=max_bytes)
+        try:
+            parser = DjangoMultiPartParser(meta, stream, [handler], encoding)
+            data, files = parser.parse()
+        except MultiPartParserError as exc:
+            raise exceptions.ParseError(
+                f'Multipart form parse error - {exc}')
+        if handler.exceeded:
+            raise self.too_large()
+        return DataAndFiles(data, files)
+
+
+class BoundedImportParser(BoundedMultiPartParser):
+    """Multipart parser rejecting log import files past their limit"""
+
+    def max_bytes(self):
+        return settings.LOG_IMPORT_MAX_BYTES
+
+    def too_large(self):
+        return UploadTooLarge(
+            f'Import files are limited to {settings.LOG_IMPORT_MAX_BYTES} '
+            f'bytes.')
+
+
+def spool_directory():
+    """Return the directory of the chunked uploads, created if missing."""
+    directory = os.path.join(
+        settings.FILE_UPLOAD_TEMP_DIR or tempfile.gettempdir(),
+        'exercise-image-uploads')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def spool_path(upload):
+    """Return the path the chunks of an upload are written to."""
+    return os.path.join(spool_directory(), f'{upload.pk}.part')
+
+
+def _partial_digest(upload, part, offset):
+    """
+    Return the SHA-256 of the first `offset` bytes of the chunk file
+    `part`, kept from the previous chunk or hashed again from the file.
+    """
+    with _digests_lock:
+        state = _digests.pop(upload.pk, None)
+    if state is not None and state[0] == offset:
+        return state[1]
+    sha256 = hashlib.sha256()
+    part.seek(0)
+    left = offset
+    while left:
+        data = part.read(min(CHUNK_SIZE, left))
+        if not data:
+            break
+        sha256.update(data)
+        left -= len(data)
+    return sha256
+
+
+def _keep_digest(upload, sha256):
+    """Keep the SHA-256 of an upload at its offset, for its next chunk."""
+    with _digests_lock:
+        _digests[upload.pk] = (upload.offset, sha256)
+        while len(_digests) > MAX_PARTIAL_DIGESTS:
+            _digests.popitem(last=False)
+
+
+def remove_spool(upload):
+    """Delete the received chunks of an upload."""
+    with _digests_lock:
+        _digests.pop(upload.pk, None)
+    try:
+        os.remove(spool_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def discard_upload(upload):
+    """Delete an upload and its received chunks."""
+    remove_spool(upload)
+    upload.delete()
+
+
+def claim_upload(upload):
+    """
+    Take a complete upload out of the table so that a single request
+    sets the exercise image from it. False if another request did.
+    """
+    with transaction.atomic():
+        return ExerciseImageUpload.objects.select_for_update() \
+            .filter(pk=upload.pk).delete()[0] > 0
+
+
+def delete_expired_uploads():
+    """Delete the uploads and chunk files left for longer than allowed."""
+    expiry = timedelta(seconds=settings.IMAGE_UPLOAD_EXPIRY)
+    cutoff = timezone.now() - expiry
+    for upload in ExerciseImageUpload.objects.filter(created_at__lt=cutoff):
+        discard_upload(upload)
+    # chunk files whose upload went with its exercise or user
+    for entry in os.scandir(spool_directory()):
+        if entry.stat().st_mtime < cutoff.timestamp():
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def _locked_upload(upload):
+    """Return the current row of an upload, locked until the commit."""
+    locked = ExerciseImageUpload.objects.select_for_update() \
+        .filter(pk=upload.pk).first()
+    if locked is None:
+        raise exceptions.NotFound('The upload was discarded.')
+    return locked
+
+
+def append_chunk(upload, offset, stream, length):
+    """
+    Write `length` bytes of `stream` at `offset` of an upload and return
+    the upload at its new offset. A chunk cut short by the client is kept
+    up to where it stopped, to be resumed from there.
+    The bytes are received outside of any transaction, a slow client
+    holds a lock on the chunk file instead of the upload row.
+    """
+    path = spool_path(upload)
+    with os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o600),
+                   'r+b') as part:
+        try:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadConflict('Another chunk of the upload is being '
+                                 'received.')
+
+        with transaction.atomic():
+            upload = _locked_upload(upload)
+            if offset != upload.offset:
+                raise UploadConflict(
+                    f'The upload is at offset {upload.offset}, '
+                    f'not {offset}.')
+            if length > upload.size - upload.offset:
+                raise UploadTooLarge(
+                    f'{upload.size - upload.offset} bytes are left to '
+                    f'upload.')
+
+        # drop the tail of a chunk whose offset was never recorded
+        part.truncate(offset)
+        sha256 = _partial_digest(upload, part, offset)
+        part.seek(offset)
+        received = 0
+        try:
+            while received < length:
+                data = stream.read(min(CHUNK_SIZE, length - received))
+                if not data:
+                    break
+                part.write(data)
+                sha256.update(data)
+                received += len(data)
+        except UnreadablePostError:
+            pass
+        part.flush()
+
+        with transaction.atomic():
+            upload = _locked_upload(upload)
+            upload.offset = offset + received
+            upload.save(update_fields=['offset', 'updated_at'])
+        _keep_digest(upload, sha256)
+    return upload
+
+
+class SpooledImageFile(UploadedFile):
+    """
+    The assembled chunks of an upload, moved into storage when saved.
+    Carries the SHA-256 of the chunks like the single request uploads.
+    """
+
+    def __init__(self, upload):
+        path = spool_path(upload)
+        super().__init__(open(path, 'rb'), upload.filename,
+                         size=upload.size)
+        self.path = path
+        self.sha256 = _partial_digest(upload, self.file,
+                                      upload.size).hexdigest()
+        self.file.seek(0)
+
+    def temporary_file_path(self):
+        return self.path
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            pass
@@ -19,9 +19,27 @@ router.register('track-exercise',
 router.register('strength-exercise-log',
                 views.StrengthExerciseLogViewSet,
                 basename='strength-exercise-log')
+router.register('track-exercise-log',
+                views.TrackExerciseLogViewSet,
+                basename='track-exercise-log')
+router.register('image-upload',
+                views.ExerciseImageUploadViewSet,
+                basename='image-upload')
+router.register('log-import',
+                views.ExerciseLogImportViewSet,
+                basename='log-import')
 
 app_name = 'exercise'
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('log-batch/',
+         views.ExerciseLogBatchView.as_view(),
+         name='log-batch'),
+    path('autocomplete/',
+         views.ExerciseAutocompleteView.as_view(),
+         name='autocomplete'),
+    path('sync/',
+         views.ExerciseSyncView.as_view(),
+         name='sync'),
 ]
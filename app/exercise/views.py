@@ -1,7 +1,18 @@
 """
 Views for the exercise APIs
 """
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import parse_etags
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 from rest_framework import (
+    exceptions,
+    generics,
     viewsets,
     mixins,
     status,
@@ -9,28 +20,128 @@ from rest_framework import (
 
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 
 from core.models import (
+    ExerciseImageUpload,
+    ExerciseLogImport,
     MuscleGroup,
     StrengthExercise,
     # StrngthExerciseImageSerializer,
     TrackExercise,
     StrengthExerciseLog,
-
+    TrackExerciseLog,
 )
 
 from exercise import serializers
+from exercise.autocomplete import (
+    AUTOCOMPLETE_KINDS,
+    AUTOCOMPLETE_LIMIT,
+    MAX_AUTOCOMPLETE_LIMIT,
+    autocomplete,
+)
+from exercise.catalog import get_catalog_snapshot
+from exercise.muscles import filter_muscles
+from exercise.pagination import CatalogPagination, KeysetPagination
+from exercise.uploads import (
+    BoundedImportParser,
+    BoundedMultiPartParser,
+    SpooledImageFile,
+    UploadConflict,
+    append_chunk,
+    claim_upload,
+    content_length,
+    delete_expired_uploads,
+    discard_upload,
+    remove_spool,
+)
+from exercise.search import (
+    MAX_SEARCH_LIMIT,
+    SEARCH_LIMIT,
+    search_strength_exercises,
+    search_terms,
+)
+from exercise.bulk import ingest_log_batch
+from exercise.export import EXPORT_FORMATS, EXPORT_KINDS, iter_export
+from exercise.importer import (
+    ImportUnavailable,
+    claim_import,
+    run_import,
+)
+from exercise.sync import MAX_SYNC_PAGE_SIZE, SYNC_PAGE_SIZE, get_changes
+from user.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+)
+from user.analytics.services import filter_window
+from user.analytics.utils import parse_window
+
+
+class CatalogSnapshotMixin:
+    """
+    Serve JSON lists from the catalog snapshot: rendered once per catalog
+    version, answered with 304 when the client holds the current ETag.
+    Filtered lists are not snapshotted.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json' or \
+                request.query_params.keys() - {'format'}:
+            return super().list(request, *args, **kwargs)
 
+        # the snapshot holds the first page, whose next link is absolute
+        etag, content = get_catalog_snapshot(
+            f'{self.basename}:{request.build_absolute_uri()}',
+            lambda: self.render_list(request))
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in parse_etags(if_none_match) or if_none_match == '*':
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        # revalidate on every use, the catalog may change at any time
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
-class BaseExerciseViewSet(viewsets.ModelViewSet):
-    authentication_classes = [TokenAuthentication]
+    def render_list(self, request):
+        """Return the JSON bytes of the list response"""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            data = self.get_paginated_response(serializer.data).data
+        else:
+            data = self.get_serializer(queryset, many=True).data
+        return JSONRenderer().render(data)
+
+
+class BaseExerciseViewSet(CatalogSnapshotMixin, viewsets.ModelViewSet):
+    """
+    Base viewset for the exercise catalog. Lists are paginated and can be
+    ordered by `ordering_fields` and narrowed by muscle groups with
+    `muscles_all`, `muscles_any`, `muscles_none` and `muscle_role`.
+    """
+    authentication_classes = [CachedTokenAuthentication,
+                              SignedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = CatalogPagination
+    ordering_fields = ('id', 'name')
 
     def get_queryset(self):
-        """Retrieve the Strength Exercise for the authenticated user"""
-        return self.queryset.all().order_by('-id')
+        """Retrieve the exercises"""
+        # two queries load the muscle groups of every exercise in the page
+        queryset = self.queryset.all().prefetch_related(
+            'primary_muscle_groups',
+            'secondary_muscle_groups',
+        ).order_by('-id')
+        if self.action == 'list':
+            queryset = self.filter_list(queryset, self.request.query_params)
+        return queryset
+
+    def filter_list(self, queryset, params):
+        """Apply the list filters of the query parameters"""
+        return filter_muscles(queryset, params)
         # add distinct at the end and see what happens
 
     def perform_create(self, serializer):
@@ -39,22 +150,44 @@ class BaseExerciseViewSet(viewsets.ModelViewSet):
 
 
 class StrengthExerciseViewSet(BaseExerciseViewSet):
-    """Manage exercises in the database"""
+    """
+    Manage exercises in the database, lists can also be narrowed to
+    `difficulty` levels (comma separated).
+    """
     serializer_class = serializers.StrengthExerciseDetailSerializer
     queryset = StrengthExercise.objects.all()
+    ordering_fields = ('id', 'name', 'dificulty_level')
+
+    def filter_list(self, queryset, params):
+        """Apply the list filters of the query parameters"""
+        queryset = super().filter_list(queryset, params)
+        if params.get('difficulty'):
+            try:
+                levels = {int(level)
+                          for level in params['difficulty'].split(',')}
+            except ValueError:
+                raise exceptions.ValidationError(
+                    {'difficulty': ['Expected comma separated levels.']})
+            queryset = queryset.filter(dificulty_level__in=levels)
+        return queryset
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
-        if self.action == 'list':
+        if self.action in ('list', 'search'):
             return serializers.StrengthExerciseSerializer
         elif self.action == 'upload_image':
             return serializers.StrengthExerciseImageSerializer
 
         return self.serializer_class
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    @action(methods=['POST'], detail=True, url_path='upload-image',
+            parser_classes=[BoundedMultiPartParser])
     def upload_image(self, request, pk=None):
-        """Upload an image to a strength exercise"""
+        """
+        Upload an image to a strength exercise, at most
+        IMAGE_UPLOAD_MAX_BYTES. Large images on slow links can be sent in
+        chunks with image-upload instead.
+        """
         exercise = self.get_object()
         serializer = self.get_serializer(
             exercise,
@@ -73,6 +206,27 @@ class StrengthExerciseViewSet(BaseExerciseViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @action(methods=['GET'], detail=False)
+    def search(self, request):
+        """
+        Search strength exercises by name and description with `q`,
+        best match first. `limit` caps the number of results.
+        """
+        query = request.query_params.get('q', '')
+        if not search_terms(query):
+            raise exceptions.ValidationError(
+                {'q': ['Enter words to search for.']})
+        try:
+            limit = int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            limit = SEARCH_LIMIT
+        limit = min(max(limit, 1), MAX_SEARCH_LIMIT)
+
+        exercises = search_strength_exercises(
+            query, limit, queryset=self.get_queryset())
+        serializer = self.get_serializer(exercises, many=True)
+        return Response(serializer.data)
+
 
 class TrackExerciseViewSet(BaseExerciseViewSet):
     serializer_class = serializers.TrackExerciseDetailSerializer
@@ -86,14 +240,16 @@ class TrackExerciseViewSet(BaseExerciseViewSet):
         return self.serializer_class
 
 
-class MuscleGroupViewSet(mixins.DestroyModelMixin,
+class MuscleGroupViewSet(CatalogSnapshotMixin,
+                         mixins.DestroyModelMixin,
                          mixins.UpdateModelMixin,
                          mixins.ListModelMixin,
                          viewsets.GenericViewSet):
     """Manage muscle groups in the database"""
     serializer_class = serializers.MuscleGroupSerializer
     queryset = MuscleGroup.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication,
+                              SignedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -101,17 +257,289 @@ class MuscleGroupViewSet(mixins.DestroyModelMixin,
         return self.queryset.all()
 
 
-class StrengthExerciseLogViewSet(viewsets.ModelViewSet):
+class BaseExerciseLogViewSet(viewsets.ModelViewSet):
+    """
+    Base viewset for the exercise logs of the authenticated user.
+    Lists can be narrowed with the `since` (inclusive) and `until`
+    (exclusive) timestamps and the `exercise` name.
+    """
+    authentication_classes = [CachedTokenAuthentication,
+                              SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        """Retrieve the exercise logs for the authenticated user"""
+        queryset = self.queryset.filter(
+            user=self.request.user).select_related('exercise')
+        if self.action not in ('list', 'export'):
+            return queryset
+
+        params = self.request.query_params
+        since, until = parse_window(params, 'since', 'until')
+        queryset = filter_window(queryset, since, until)
+        if params.get('exercise'):
+            queryset = queryset.filter(exercise__name=params['exercise'])
+        return queryset
+
+    def perform_create(self, serializer):
+        """Create a new exercise log"""
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        """Delete an exercise log, signals update its rollups"""
+        with transaction.atomic():
+            instance.delete()
+
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """
+        Stream every matching log as NDJSON or, with `output=csv`, CSV.
+        Accepts the same filters as the list.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_FORMATS:
+            raise exceptions.ValidationError({
+                'output': [f'Must be one of {", ".join(EXPORT_FORMATS)}.']
+            })
+
+        _model, columns = EXPORT_KINDS[self.export_kind]
+        response = StreamingHttpResponse(
+            iter_export(self.get_queryset(), columns, output),
+            content_type=EXPORT_FORMATS[output],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{self.export_kind}-logs.{output}"')
+        return response
+
+
+class StrengthExerciseLogViewSet(BaseExerciseLogViewSet):
     """Manage exercise logs in the database"""
     serializer_class = serializers.StrengthExerciseLogSerializer
     queryset = StrengthExerciseLog.objects.all()
-    authentication_classes = [TokenAuthentication]
+    export_kind = 'strength'
+
+
+class TrackExerciseLogViewSet(BaseExerciseLogViewSet):
+    """Manage track exercise logs in the database"""
+    serializer_class = serializers.TrackExerciseLogSerializer
+    queryset = TrackExerciseLog.objects.all()
+    export_kind = 'track'
+
+
+class ExerciseLogBatchView(generics.GenericAPIView):
+    """
+    Create a batch of strength and track logs, e.g. replayed from an
+    offline queue. Valid logs are created even if others are invalid;
+    the response holds one result per log in request order.
+    """
+    serializer_class = serializers.ExerciseLogBatchSerializer
+    authentication_classes = [CachedTokenAuthentication,
+                              SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = ingest_log_batch(request.user, serializer.validated_data)
+        return Response(results, status=status.HTTP_200_OK)
+
+
+class ExerciseAutocompleteView(generics.GenericAPIView):
+    """
+    Complete exercise names: those with a word starting with `q`, the
+    ones the user logged recently first. `kind` (strength or track)
+    narrows the names, `limit` caps their number.
+    """
+    serializer_class = serializers.ExerciseNameSerializer
+    authentication_classes = [CachedTokenAuthentication,
+                              SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        kind = params.get('kind') or None
+        if kind is not None and kind not in AUTOCOMPLETE_KINDS:
+            raise exceptions.ValidationError({'kind': [
+                f"Expected one of {', '.join(AUTOCOMPLETE_KINDS)}."]})
+        try:
+            limit = int(params['limit'])
+        except (KeyError, ValueError):
+            limit = AUTOCOMPLETE_LIMIT
+        limit = min(max(limit, 1), MAX_AUTOCOMPLETE_LIMIT)
+
+        names = autocomplete(request.user, params.get('q', ''), kind, limit)
+        serializer = self.get_serializer(
+            [{'kind': name_kind, 'name': name} for name_kind, name in names],
+            many=True)
+        return Response(serializer.data)
+
+
+class ExerciseSyncView(generics.GenericAPIView):
+    """
+    Return what changed in the user's logs and in the exercise catalog
+    since `cursor`: the current state of created and updated objects and
+    the ids of deleted ones. Without a cursor every object is returned.
+    Keep requesting with the returned cursor while `has_more` is true.
+    """
+    serializer_class = serializers.ExerciseSyncSerializer
+    authentication_classes = [CachedTokenAuthentication,
+                              SignedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    def get(self, request):
+        try:
+            limit = int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            limit = SYNC_PAGE_SIZE
+        limit = min(max(limit, 1), MAX_SYNC_PAGE_SIZE)
+
+        changes = get_changes(request.user,
+                              request.query_params.get('cursor'), limit,
+                              context=self.get_serializer_context())
+        return Response(changes, status=status.HTTP_200_OK)
+
+
+class ExerciseLogImportViewSet(mixins.CreateModelMixin,
+                               mixins.RetrieveModelMixin,
+                               mixins.ListModelMixin,
+                               viewsets.GenericViewSet):
+    """
+    Import exercise logs from an uploaded CSV or NDJSON file of at most
+    LOG_IMPORT_MAX_BYTES. Each request imports at most
+    `max_rows_per_request` rows; a partly imported file is continued with
+    the `resume` action or the import_logs command.
+    """
+    serializer_class = serializers.ExerciseLogImportSerializer
+    queryset = ExerciseLogImport.objects.all()
+    authentication_classes = [CachedTokenAuthentication,
+                              SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [BoundedImportParser]
+    max_rows_per_request = 2000
+
     def get_queryset(self):
-        """Retrieve the exercise logs for the authenticated user"""
-        return self.queryset.filter(user=self.request.user)
+        """Retrieve the log imports of the authenticated user"""
+        return self.queryset.filter(user=self.request.user).order_by('-id')
 
     def perform_create(self, serializer):
-        """Create a new exercise log"""
+        """Store the uploaded file and start importing it"""
+        log_import = serializer.save(
+            user=self.request.user,
+            total_bytes=serializer.validated_data['file'].size,
+        )
+        self._run(log_import)
+
+    def _run(self, log_import):
+        claim_import(log_import)
+        with log_import.file.open('rb') as source:
+            run_import(log_import, source,
+                       max_rows=self.max_rows_per_request)
+
+    @action(methods=['POST'], detail=True)
+    def resume(self, request, pk=None):
+        """Continue importing a file from where it stopped"""
+        log_import = self.get_object()
+        if not log_import.file:
+            # deleted once the import was over
+            return Response(
+                {'status': [f'The import is already {log_import.status}.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            self._run(log_import)
+        except ImportUnavailable as error:
+            if error.status == 'completed':
+                return Response(
+                    {'status': ['The import is already completed.']},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return Response(
+                {'status': ['The import is already running.']},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(self.get_serializer(log_import).data,
+                        status=status.HTTP_200_OK)
+
+
+class ExerciseImageUploadViewSet(mixins.CreateModelMixin,
+                                 mixins.RetrieveModelMixin,
+                                 mixins.DestroyModelMixin,
+                                 viewsets.GenericViewSet):
+    """
+    Upload a strength exercise image in chunks. Create the upload with
+    the exercise, file name and size, then PATCH the bytes from the
+    upload offset, given in the Upload-Offset header. After a dropped
+    connection, retrieve the upload for the offset to resume from. The
+    last chunk sets the exercise image.
+    """
+    serializer_class = serializers.ExerciseImageUploadSerializer
+    queryset = ExerciseImageUpload.objects.all()
+    authentication_classes = [CachedTokenAuthentication,
+                              SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Retrieve the unexpired uploads of the authenticated user"""
+        expiry = timedelta(seconds=settings.IMAGE_UPLOAD_EXPIRY)
+        return self.queryset.filter(
+            user=self.request.user,
+            created_at__gte=timezone.now() - expiry,
+        ).order_by('-id')
+
+    def perform_create(self, serializer):
+        """Start an upload, making room from the abandoned ones"""
+        delete_expired_uploads()
         serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        """Abort an upload"""
+        discard_upload(instance)
+
+    @extend_schema(
+        request={'application/offset+octet-stream': OpenApiTypes.BINARY},
+        parameters=[OpenApiParameter(
+            'Upload-Offset', int, OpenApiParameter.HEADER, required=True,
+            description='Offset of the first byte of the chunk.')],
+        responses={200: serializers.StrengthExerciseImageSerializer,
+                   204: None},
+    )
+    def partial_update(self, request, pk=None):
+        """
+        Append a chunk to the upload. Answers 204 with the new
+        Upload-Offset, or with the exercise image once complete.
+        """
+        upload = self.get_object()
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return Response(
+                {'Upload-Offset': ['This header is required.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        length = content_length(request.META)
+        if length:
+            upload = append_chunk(upload, offset, request.stream, length)
+
+        if upload.offset < upload.size:
+            return Response(status=status.HTTP_204_NO_CONTENT,
+                            headers={'Upload-Offset': str(upload.offset)})
+        return self._complete(upload)
+
+    def _complete(self, upload):
+        """Set the exercise image from the received chunks"""
+        if not claim_upload(upload):
+            raise UploadConflict('The upload is already completed.')
+        image = SpooledImageFile(upload)
+        try:
+            serializer = serializers.StrengthExerciseImageSerializer(
+                upload.exercise, data={'image': image},
+                context=self.get_serializer_context(),
+            )
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        finally:
+            image.close()
+            remove_spool(upload)
+        return Response(serializer.data, status=status.HTTP_200_OK,
+                        headers={'Upload-Offset': str(upload.size)})
@@ -0,0 +1,105 @@
+"""
+Per-user cache of analytics results
+
+Every cached result is stored together with the user's analytics version
+it was computed at. Log writes bump the version, which turns the entries
+of that user stale without having to know their keys. A stale entry is
+recomputed by one request at a time; concurrent requests are answered
+from the stale entry (stale-while-revalidate) or wait for the recompute
+instead of all hitting the database.
+
+The versions live in the default cache, which must be shared by every
+process (REDIS_URL) for a bump to reach all of them.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _version_key(user_id):
+    return f'analytics:version:{user_id}'
+
+
+def _entry_key(user_id, name, params):
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    return f'analytics:{user_id}:{name}:{digest}'
+
+
+def get_analytics_version(user_id):
+    """Return the current analytics version of a user."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # start from the clock so a version lost to eviction can never
+        # be handed out again
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_analytics_version(user_id):
+    """Mark every cached analytics result of a user as stale."""
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns() // 1000, timeout=None)
+
+
+def invalidate_user_analytics(*user_ids):
+    """Bump the analytics version of the users once the writes commit."""
+    def bump():
+        for user_id in set(user_ids):
+            bump_analytics_version(user_id)
+
+    transaction.on_commit(bump)
+
+
+def cached_analytics(user, name, params, compute):
+    """
+    Return `compute()` for the user, served from the cache while the
+    user's analytics version has not changed.
+    `name` and `params` identify the result among the user's entries.
+    """
+    key = _entry_key(user.pk, name, params)
+    lock_key = f'{key}:lock'
+    version = get_analytics_version(user.pk)
+
+    entry = cache.get(key)
+    if entry is not None and entry['version'] == version:
+        return entry['data']
+
+    lock_timeout = settings.ANALYTICS_CACHE_LOCK_TIMEOUT
+    deadline = time.monotonic() + lock_timeout
+    while not cache.add(lock_key, version, timeout=lock_timeout):
+        # another request is recomputing this entry
+        if entry is not None and \
+                time.time() - entry['computed_at'] <= \
+                settings.ANALYTICS_CACHE_MAX_STALE:
+            return entry['data']
+        if time.monotonic() >= deadline:
+            return compute()
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry['version'] == version:
+            return entry['data']
+
+    try:
+        entry = cache.get(key)
+        if entry is not None and entry['version'] == version:
+            # recomputed while we were waiting for the lock
+            return entry['data']
+        data = compute()
+        cache.set(key, {
+            'version': version,
+            'computed_at': time.time(),
+            'data': data,
+        }, timeout=settings.ANALYTICS_CACHE_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+    return data
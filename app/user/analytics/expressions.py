@@ -0,0 +1,21 @@
+"""
+Database expressions shared by the analytics queries
+"""
+from django.db.models import FloatField, Func
+
+
+class DurationSeconds(Func):
+    """
+    Convert a DurationField expression to seconds.
+    SQLite and MySQL store durations as integer microseconds, PostgreSQL
+    as an interval.
+    """
+    template = '(%(expressions)s / 1000000.0)'
+    output_field = FloatField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='EXTRACT(EPOCH FROM %(expressions)s)::double precision',
+            **extra_context
+        )
@@ -0,0 +1,111 @@
+"""
+Maintenance of the per user and per day strength log rollups
+"""
+from collections import defaultdict
+from datetime import time
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.models import StrengthExerciseLog, StrengthExerciseLogRollup
+
+ROLLUP_FIELDS = ('log_count', 'reps', 'sets', 'calories_burned')
+
+
+def rollup_day(timestamp):
+    """Return the rollup day a log timestamp belongs to."""
+    return timezone.localdate(timestamp, timezone.get_default_timezone())
+
+
+def is_rollup_aligned(value):
+    """Check whether a window bound falls on a rollup day boundary."""
+    if value is None:
+        return True
+    local = timezone.localtime(value, timezone.get_default_timezone())
+    return local.time() == time.min
+
+
+def apply_strength_log_changes(added=(), removed=()):
+    """
+    Add the `added` logs to and subtract the `removed` logs from their
+    rollup rows, with one upsert per touched (user, day).
+    Must run inside the transaction that writes the logs.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+    for sign, logs in ((1, added), (-1, removed)):
+        for log in logs:
+            delta = deltas[(log.user_id, rollup_day(log.timestamp))]
+            delta['log_count'] += sign
+            delta['reps'] += sign * log.reps
+            delta['sets'] += sign * log.sets
+            delta['calories_burned'] += sign * log.calories_burned
+
+    for (user_id, day), delta in deltas.items():
+        if any(delta.values()):
+            _upsert_rollup(user_id, day, delta)
+
+
+def _upsert_rollup(user_id, day, delta):
+    """Increment one rollup row, creating it on first use."""
+    rollup = StrengthExerciseLogRollup.objects.filter(user_id=user_id,
+                                                      day=day)
+    increments = {field: F(field) + value for field, value in delta.items()}
+    if rollup.update(**increments) or delta['log_count'] < 0:
+        # nothing to create for logs removed along with their rollups,
+        # e.g. when their user is deleted
+        return
+    try:
+        with transaction.atomic():
+            StrengthExerciseLogRollup.objects.create(user_id=user_id,
+                                                     day=day, **delta)
+    except IntegrityError:
+        # a concurrent writer created the row first
+        rollup.update(**increments)
+
+
+def compute_strength_rollups(user_ids):
+    """
+    Return the rollups of the given users computed from the raw logs,
+    keyed by (user_id, day).
+    """
+    rows = StrengthExerciseLog.objects.filter(user_id__in=user_ids).annotate(
+        day=TruncDate('timestamp', tzinfo=timezone.get_default_timezone())
+    ).values('user_id', 'day').annotate(
+        total_log_count=Count('id'),
+        total_reps=Sum('reps'),
+        total_sets=Sum('sets'),
+        total_calories_burned=Sum('calories_burned'),
+    ).order_by()
+
+    return {
+        (row['user_id'], row['day']): {
+            field: row[f'total_{field}'] for field in ROLLUP_FIELDS
+        }
+        for row in rows
+    }
+
+
+def stored_strength_rollups(user_ids):
+    """Return the stored non-empty rollups keyed by (user_id, day)."""
+    rows = StrengthExerciseLogRollup.objects.filter(
+        user_id__in=user_ids
+    ).exclude(log_count=0).values('user_id', 'day', *ROLLUP_FIELDS)
+
+    return {
+        (row.pop('user_id'), row.pop('day')): row for row in rows
+    }
+
+
+def rebuild_strength_rollups(user_ids):
+    """Replace the stored rollups of the given users from the raw logs."""
+    with transaction.atomic():
+        StrengthExerciseLogRollup.objects.filter(
+            user_id__in=user_ids).delete()
+        rollups = compute_strength_rollups(user_ids)
+        StrengthExerciseLogRollup.objects.bulk_create(
+            StrengthExerciseLogRollup(user_id=user_id, day=day, **totals)
+            for (user_id, day), totals in rollups.items()
+        )
+    return len(rollups)
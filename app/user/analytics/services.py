@@ -1,20 +1,238 @@
-from core.models import StrengthExerciseLog
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
 
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.db.models import Count, F, FloatField, Min, Sum, Value
+from django.db.models.functions import (
+    Cast,
+    Coalesce,
+    TruncDay,
+    TruncMonth,
+    TruncWeek,
+)
 
-def get_user_log_analytics(user):
+from core.models import (
+    MuscleGroup,
+    StrengthExercise,
+    StrengthExerciseLog,
+    StrengthExerciseLogRollup,
+    TrackExerciseLog,
+)
+from exercise.catalog import get_catalog_version
+
+from .expressions import DurationSeconds
+from .rollups import is_rollup_aligned, rollup_day
+
+SERIES_BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+SERIES_FIELDS = ('reps', 'sets', 'calories_burned', 'distance', 'duration')
+
+# share of an exercise's volume credited to each of its muscle groups
+MUSCLE_GROUP_WEIGHTS = (
+    ('secondary_muscle_groups', 0.5),
+    ('primary_muscle_groups', 1.0),
+)
+
+# seconds needed to cover a track log at its pace (per distance unit)
+MOVING_TIME = DurationSeconds('pace') * Cast('distance', FloatField())
+
+
+def filter_window(queryset, start=None, end=None, field='timestamp'):
+    """Restrict a log queryset to the half-open window [start, end)."""
+    if start is not None:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{field}__lt': end})
+    return queryset
+
+
+def strength_totals_source(user, start=None, end=None, tzinfo=None):
     """
-    Calculate and return analytics for the given user's exercise logs.
+    Return the queryset the strength totals of a window are summed from.
+    Windows that fall on rollup day boundaries read the daily rollups,
+    anything finer grained reads the raw logs.
     """
+    default_tz = timezone.get_default_timezone()
+    if (tzinfo is None or str(tzinfo) == str(default_tz)) and \
+            is_rollup_aligned(start) and is_rollup_aligned(end):
+        rollups = StrengthExerciseLogRollup.objects.filter(user=user)
+        return filter_window(rollups,
+                             start and rollup_day(start),
+                             end and rollup_day(end),
+                             field='day'), 'day'
+
     logs = StrengthExerciseLog.objects.filter(user=user)
+    return filter_window(logs, start, end), 'timestamp'
 
-    total_reps = sum(log.reps for log in logs)
-    total_sets = sum(log.sets for log in logs)
-    total_calories_burned = sum(log.calories_burned for log in logs)
 
-    analytics = {
-        'total_reps': total_reps,
-        'total_sets': total_sets,
-        'total_calories_burned': total_calories_burned,
-    }
+def get_user_log_analytics(user, start=None, end=None):
+    """
+    Calculate and return analytics for the given user's exercise logs.
+    The totals are computed by the database in a single aggregate query.
+    The calories burned are those of the strength and track logs, as in
+    get_user_log_series.
+    """
+    logs, _ = strength_totals_source(user, start, end)
 
+    analytics = logs.aggregate(
+        total_reps=Coalesce(Sum('reps'), Value(0)),
+        total_sets=Coalesce(Sum('sets'), Value(0)),
+        total_calories_burned=Coalesce(Sum('calories_burned'), Value(0)),
+    )
+    track = get_user_track_analytics(user, start, end)
+    analytics['total_calories_burned'] += track.pop('calories_burned')
+    analytics.update(track)
     return analytics
+
+
+def _average_pace(duration, distance):
+    """Return seconds per distance unit, None without any distance."""
+    return duration / float(distance) if distance else None
+
+
+def get_user_track_analytics(user, start=None, end=None):
+    """
+    Return distance, moving time and pace totals of the user's track logs,
+    overall and per track exercise, and their calories burned, from one
+    grouped query.
+    Durations and paces are in seconds.
+    """
+    rows = filter_window(
+        TrackExerciseLog.objects.filter(user=user), start, end
+    ).values('exercise__name').annotate(
+        log_count=Count('id'),
+        total_calories_burned=Sum('calories_burned'),
+        total_distance=Sum('distance'),
+        total_duration=Sum(MOVING_TIME),
+        best_pace=Min(DurationSeconds('pace')),
+    ).order_by('exercise__name')
+
+    track_exercises = [
+        {
+            'exercise': row['exercise__name'],
+            'log_count': row['log_count'],
+            'distance': row['total_distance'],
+            'duration': row['total_duration'],
+            'best_pace': row['best_pace'],
+            'average_pace': _average_pace(row['total_duration'],
+                                          row['total_distance']),
+        }
+        for row in rows
+    ]
+
+    calories_burned = sum(row['total_calories_burned'] or 0 for row in rows)
+    total_distance = sum(row['distance'] for row in track_exercises)
+    total_duration = sum(row['duration'] for row in track_exercises)
+    best_paces = [row['best_pace'] for row in track_exercises]
+    return {
+        'calories_burned': calories_burned,
+        'total_distance': Decimal(total_distance),
+        'total_duration': float(total_duration),
+        'best_pace': min(best_paces) if best_paces else None,
+        'average_pace': _average_pace(total_duration, total_distance),
+        'track_exercises': track_exercises,
+    }
+
+
+def get_user_log_series(user, bucket='day', tzinfo=None,
+                        start=None, end=None):
+    """
+    Return per-bucket totals of the user's strength and track logs as
+    parallel arrays, one entry per bucket that has at least one log.
+    Buckets are truncated in `tzinfo` and each table is read with a single
+    grouped query.
+    """
+    trunc = SERIES_BUCKETS[bucket]
+    tzinfo = tzinfo or timezone.get_default_timezone()
+
+    strength, field = strength_totals_source(user, start, end, tzinfo)
+    if field == 'day':
+        # rollup days are already in the requested timezone
+        strength = strength.annotate(bucket=trunc(field))
+    else:
+        strength = strength.annotate(bucket=trunc(field, tzinfo=tzinfo))
+    strength = strength.values('bucket').annotate(
+        total_reps=Sum('reps'),
+        total_sets=Sum('sets'),
+        total_calories_burned=Sum('calories_burned'),
+    ).order_by()
+
+    track = filter_window(
+        TrackExerciseLog.objects.filter(user=user), start, end
+    ).annotate(
+        bucket=trunc('timestamp', tzinfo=tzinfo)
+    ).values('bucket').annotate(
+        total_calories_burned=Sum('calories_burned'),
+        total_distance=Sum('distance'),
+        total_duration=Sum(MOVING_TIME),
+    ).order_by()
+
+    buckets = {}
+    for row in list(strength) + list(track):
+        bucket_start = row.pop('bucket')
+        if isinstance(bucket_start, datetime):
+            bucket_start = bucket_start.date()
+        totals = buckets.setdefault(bucket_start,
+                                    dict.fromkeys(SERIES_FIELDS, 0))
+        for field, value in row.items():
+            totals[field.removeprefix('total_')] += value or 0
+
+    series = {'bucket': bucket, 'timezone': str(tzinfo), 'start': []}
+    series.update((field, []) for field in SERIES_FIELDS)
+    for bucket_start in sorted(buckets):
+        totals = buckets[bucket_start]
+        series['start'].append(bucket_start)
+        for field in SERIES_FIELDS:
+            series[field].append(totals[field])
+
+    return series
+
+
+def get_muscle_group_weights():
+    """
+    Return {strength exercise id: {muscle group name: weight}}.
+    The map is built from the muscle group through tables once per
+    catalog version and shared through the cache.
+    """
+    key = f'catalog:{get_catalog_version()}:muscle-group-weights'
+    weights = cache.get(key)
+    if weights is None:
+        weights = defaultdict(dict)
+        # primary groups come last so they win over a secondary listing
+        for field, weight in MUSCLE_GROUP_WEIGHTS:
+            through = getattr(StrengthExercise, field).through
+            links = through.objects.values_list('strengthexercise_id',
+                                                'musclegroup__name')
+            for exercise_id, name in links:
+                weights[exercise_id][name] = weight
+        weights = dict(weights)
+        cache.set(key, weights, timeout=settings.ANALYTICS_CACHE_TIMEOUT)
+    return weights
+
+
+def get_user_muscle_group_volume(user, start=None, end=None):
+    """
+    Return the training volume (reps x sets) of the user's strength logs
+    credited to every muscle group, primary groups in full and secondary
+    groups at half weight.
+    """
+    weights = get_muscle_group_weights()
+    rows = filter_window(
+        StrengthExerciseLog.objects.filter(user=user), start, end
+    ).values('exercise_id').annotate(
+        total_volume=Sum(F('reps') * F('sets')),
+    ).order_by()
+
+    volume = {name: 0.0 for name, _ in MuscleGroup.MUSCLE_CHOICES}
+    for row in rows:
+        for name, weight in weights.get(row['exercise_id'], {}).items():
+            if name in volume:
+                volume[name] += weight * row['total_volume']
+
+    return [{'name': name, 'volume': total} for name, total in volume.items()]
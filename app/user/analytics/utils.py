@@ -1,3 +1,13 @@
+from datetime import datetime, time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import serializers
+
+
 def calculate_average(values):
     """
     Calculate and return the average of a list of values.
@@ -5,3 +15,52 @@ def calculate_average(values):
     if not values:
         return 0
     return sum(values) / len(values)
+
+
+def parse_timestamp(value, param='timestamp'):
+    """
+    Parse an ISO date or datetime query parameter into an aware datetime.
+    A bare date is read as midnight of that day in the current timezone.
+    """
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is not None:
+                parsed = datetime.combine(day, time.min)
+    except ValueError:
+        parsed = None
+
+    if parsed is None:
+        msg = _('Enter a valid ISO 8601 date or datetime.')
+        raise serializers.ValidationError({param: [msg]})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_window(query_params, start_param='from', end_param='to'):
+    """
+    Return the (start, end) window given in the query parameters.
+    `start` is inclusive, `end` is exclusive, and either may be None.
+    """
+    start = query_params.get(start_param)
+    end = query_params.get(end_param)
+    start = parse_timestamp(start, start_param) if start else None
+    end = parse_timestamp(end, end_param) if end else None
+
+    if start and end and start >= end:
+        msg = _('Must be later than `%s`.') % start_param
+        raise serializers.ValidationError({end_param: [msg]})
+    return start, end
+
+
+def parse_timezone(value, param='tz'):
+    """Return the tzinfo named by a query parameter, or the default one."""
+    if not value:
+        return timezone.get_default_timezone()
+    try:
+        return ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        msg = _('Unknown time zone "%s".') % value
+        raise serializers.ValidationError({param: [msg]})
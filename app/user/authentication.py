@@ -0,0 +1,205 @@
+"""
+Token authentication without database round trips
+
+DRF's TokenAuthentication joins the token and its user on every request.
+CachedTokenAuthentication keeps the users of recently seen tokens in a
+bounded LRU of each process for AUTH_TOKEN_CACHE_TIMEOUT seconds. Every
+entry keeps the auth version of its user read from the default cache
+before loading it; every change to a user or its tokens (user/signals.py)
+bumps that version, and an entry whose version no longer matches is
+dropped on its next lookup, in every process sharing that cache. The
+local memory cache is not shared, so without REDIS_URL the timeout is 0
+and every token is looked up in the database.
+
+SignedTokenAuthentication accepts the signed access tokens of
+user/tokens.py as `Authorization: Bearer <token>`.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+from drf_spectacular.extensions import OpenApiAuthenticationExtension
+from drf_spectacular.plumbing import build_bearer_security_scheme_object
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.exceptions import AuthenticationFailed
+
+from user.tokens import get_token_version, read_access_token
+
+TokenEntry = namedtuple('TokenEntry',
+                        ['user', 'token', 'version', 'expires_at'])
+
+
+class TokenCache:
+    """Thread safe LRU of token entries, expiring after `timeout` seconds"""
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the unexpired entry of a token key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, user, token, version):
+        """Store an entry, evicting the least recently used ones."""
+        entry = TokenEntry(user, token, version,
+                           time.monotonic() + self.timeout)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+def reset_token_cache():
+    """Drop the token cache of this process, built anew on next use."""
+    global _token_cache
+    with _token_cache_lock:
+        _token_cache = None
+
+
+def get_token_cache():
+    """Return the token cache of this process."""
+    global _token_cache
+    with _token_cache_lock:
+        if _token_cache is None:
+            _token_cache = TokenCache(settings.AUTH_TOKEN_CACHE_SIZE,
+                                      settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        return _token_cache
+
+
+def _version_key(user_id):
+    return f'auth:user-version:{user_id}'
+
+
+def _version_timeout():
+    # only needs to outlive the entries it guards, a lost version is
+    # started anew and drops them
+    return settings.AUTH_TOKEN_CACHE_TIMEOUT + 60
+
+
+def get_auth_version(user_id):
+    """Return the current auth version of a user."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # start from the clock so a lost version is not handed out again
+        cache.add(key, time.time_ns() // 1000, timeout=_version_timeout())
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(user_id):
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns() // 1000, timeout=_version_timeout())
+
+
+def user_auth_changed(user_id):
+    """
+    Drop the cached tokens of a user in every process, now and once the
+    transaction commits, after which other requests could have cached
+    the old rows.
+    """
+    _bump_version(user_id)
+    transaction.on_commit(partial(_bump_version, user_id))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication answering known tokens without queries"""
+
+    def authenticate_credentials(self, key):
+        if not settings.AUTH_TOKEN_CACHE_TIMEOUT:
+            return super().authenticate_credentials(key)
+        token_cache = get_token_cache()
+        entry = token_cache.get(key)
+        version = None
+        if entry is not None:
+            version = get_auth_version(entry.user.pk)
+            if entry.version == version:
+                # a copy, views may change the user they are given
+                return copy.copy(entry.user), entry.token
+            token_cache.discard(key)
+
+        # the version is read before loading, so a change committed
+        # meanwhile bumps it past the entry; a token not seen before has
+        # no version yet and is loaded once more on its next lookup
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token, version)
+        return copy.copy(user), token
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticate signed access tokens without database access. The user
+    comes with only its id loaded, other fields load on first use.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header.')
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed('Invalid token.')
+
+        user_id, token_version = read_access_token(token)
+        if token_version != get_token_version(user_id):
+            raise AuthenticationFailed('Token revoked.')
+        User = get_user_model()
+        user = User.from_db(router.db_for_read(User), ['id'], [user_id])
+        return user, token
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+class SignedTokenScheme(OpenApiAuthenticationExtension):
+    """Describe the signed access tokens in the API schema"""
+    target_class = SignedTokenAuthentication
+    name = 'signedTokenAuth'
+
+    def get_security_definition(self, auto_schema):
+        return build_bearer_security_scheme_object(
+            header_name='Authorization', token_prefix='Bearer')
@@ -28,12 +28,16 @@ class UserSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         """"Update and return user"""
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
-
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        update_fields = list(validated_data)
         if password:
-            user.set_password(password)
-            user.save()
-        return user
+            instance.set_password(password)
+            update_fields.append('password')
+        # only the given fields: the user may be a cached copy loaded
+        # before a revocation, its token version must not be written back
+        instance.save(update_fields=update_fields)
+        return instance
 
 
 class AuthTokenSerializer(serializers.Serializer):
@@ -60,7 +64,68 @@ class AuthTokenSerializer(serializers.Serializer):
         return attrs
 
 
+class SignedTokenSerializer(serializers.Serializer):
+    """Serializer for a signed access token and its refresh token"""
+    access = serializers.CharField()
+    access_expires_at = serializers.DateTimeField()
+    refresh = serializers.CharField()
+    refresh_expires_at = serializers.DateTimeField()
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer for exchanging a refresh token"""
+    refresh = serializers.CharField()
+
+
+class TrackExerciseAnalyticsSerializer(serializers.Serializer):
+    """Totals of the track logs of one track exercise"""
+    exercise = serializers.CharField()
+    log_count = serializers.IntegerField()
+    distance = serializers.DecimalField(max_digits=12, decimal_places=2,
+                                        coerce_to_string=False)
+    duration = serializers.FloatField(
+        help_text=_('Moving time in seconds (pace x distance).'))
+    best_pace = serializers.FloatField(allow_null=True)
+    average_pace = serializers.FloatField(allow_null=True)
+
+
 class UserLogAnalyticsSerializer(serializers.Serializer):
     total_reps = serializers.IntegerField()
     total_sets = serializers.IntegerField()
-    total_calories_burned = serializers.IntegerField()
+    total_calories_burned = serializers.IntegerField(
+        help_text=_('Calories burned in strength and track logs.'))
+    total_distance = serializers.DecimalField(max_digits=12,
+                                              decimal_places=2,
+                                              coerce_to_string=False)
+    total_duration = serializers.FloatField(
+        help_text=_('Moving time in seconds (pace x distance).'))
+    best_pace = serializers.FloatField(
+        allow_null=True, help_text=_('Fastest pace in seconds.'))
+    average_pace = serializers.FloatField(
+        allow_null=True,
+        help_text=_('Moving time in seconds per unit of distance.'))
+    track_exercises = TrackExerciseAnalyticsSerializer(many=True)
+
+
+class UserLogAnalyticsSeriesSerializer(serializers.Serializer):
+    """Per-bucket log totals as parallel arrays indexed like `start`"""
+    bucket = serializers.ChoiceField(choices=('day', 'week', 'month'))
+    timezone = serializers.CharField()
+    start = serializers.ListField(child=serializers.DateField())
+    reps = serializers.ListField(child=serializers.IntegerField())
+    sets = serializers.ListField(child=serializers.IntegerField())
+    calories_burned = serializers.ListField(
+        child=serializers.IntegerField())
+    distance = serializers.ListField(
+        child=serializers.DecimalField(max_digits=12, decimal_places=2,
+                                       coerce_to_string=False))
+    duration = serializers.ListField(
+        child=serializers.FloatField(),
+        help_text=_('Moving time in seconds (pace x distance).'))
+
+
+class MuscleGroupVolumeSerializer(serializers.Serializer):
+    """Training volume credited to one muscle group"""
+    name = serializers.CharField()
+    volume = serializers.FloatField(
+        help_text=_('Reps x sets, secondary muscle groups at half weight.'))
@@ -0,0 +1,59 @@
+"""
+Signal handlers dropping the cached token authentication of users and
+revoking their signed tokens
+"""
+from django.contrib.auth import get_user_model
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import reset_token_cache, user_auth_changed
+from user.tokens import REVOKED, revoke_tokens, token_version_changed
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Stop accepting a deleted token"""
+    user_auth_changed(instance.user_id)
+
+
+@receiver(pre_save, sender=get_user_model())
+def user_saving(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Note whether the password or the active flag of a user changes"""
+    instance._credentials_changed = False
+    if raw or instance._state.adding or \
+            update_fields == frozenset({'last_login'}):
+        return
+    stored = sender.objects.filter(pk=instance.pk) \
+        .values_list('password', 'is_active').first()
+    instance._credentials_changed = \
+        stored != (instance.password, instance.is_active)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, created, update_fields=None, raw=False,
+               **kwargs):
+    """
+    Reload a changed user, and revoke the signed tokens of one deactivated
+    or with a new password
+    """
+    if created or raw or update_fields == frozenset({'last_login'}):
+        return
+    user_auth_changed(instance.pk)
+    if instance._credentials_changed:
+        revoke_tokens(instance)
+
+
+@receiver(post_delete, sender=get_user_model())
+def user_deleted(sender, instance, **kwargs):
+    """Stop accepting the tokens of a deleted user"""
+    user_auth_changed(instance.pk)
+    token_version_changed(instance.pk, REVOKED)
+
+
+@receiver(setting_changed)
+def auth_token_cache_setting_changed(setting, **kwargs):
+    """Rebuild the token cache with the new size or timeout"""
+    if setting in ('AUTH_TOKEN_CACHE_SIZE', 'AUTH_TOKEN_CACHE_TIMEOUT'):
+        reset_token_cache()
@@ -0,0 +1,148 @@
+"""
+Test for the cached token authentication
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import TokenCache, get_token_cache
+
+ME_URL = reverse('user:me')
+
+
+def create_user(**params):
+    """Helper function to create new user"""
+    return get_user_model().objects.create_user(**params)
+
+
+class TokenCacheTests(SimpleTestCase):
+    """Test the LRU of token entries"""
+
+    def test_least_recently_used_evicted(self):
+        """Test the cache keeps at most `maxsize` entries"""
+        token_cache = TokenCache(maxsize=2, timeout=60)
+        token_cache.set('a', 'user a', 'token a', 0)
+        token_cache.set('b', 'user b', 'token b', 0)
+        token_cache.get('a')
+        token_cache.set('c', 'user c', 'token c', 0)
+
+        self.assertEqual(len(token_cache), 2)
+        self.assertIsNone(token_cache.get('b'))
+        self.assertEqual(token_cache.get('a').user, 'user a')
+
+    @patch('user.authentication.time.monotonic')
+    def test_entries_expire(self, monotonic):
+        """Test an entry is dropped once its timeout has passed"""
+        monotonic.return_value = 100
+        token_cache = TokenCache(maxsize=2, timeout=60)
+        token_cache.set('a', 'user a', 'token a', 0)
+
+        monotonic.return_value = 159
+        self.assertIsNotNone(token_cache.get('a'))
+        monotonic.return_value = 160
+        self.assertIsNone(token_cache.get('a'))
+
+
+@override_settings(AUTH_TOKEN_CACHE_TIMEOUT=300)
+class CachedTokenAuthenticationTests(TestCase):
+    """Test authenticating with cached tokens"""
+
+    def setUp(self):
+        cache.clear()
+        get_token_cache().clear()
+        self.user = create_user(email='test@example.com',
+                                password='testpass123', name='Test Name')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_warm_token_without_queries(self):
+        """Test a known token is authenticated without database access"""
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_200_OK)
+        # the first lookup learns the user, the second its auth version
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['email'], self.user.email)
+
+    @override_settings(AUTH_TOKEN_CACHE_TIMEOUT=0)
+    def test_not_cached_without_timeout(self):
+        """Test tokens are looked up on every request without a timeout"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(get_token_cache()), 0)
+
+    def test_deleted_token_rejected(self):
+        """Test a deleted token stops working right away"""
+        self.client.get(ME_URL)
+        self.client.get(ME_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test the tokens of a deactivated user stop working"""
+        self.client.get(ME_URL)
+        self.client.get(ME_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_changes_reloaded(self):
+        """Test a password or profile change reloads the user"""
+        self.client.get(ME_URL)
+        self.client.get(ME_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('newpass123')
+            self.user.name = 'New Name'
+            self.user.save()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.data['name'], 'New Name')
+
+    @patch('user.authentication.time.time')
+    def test_changes_independent_of_clock(self, time_now):
+        """Test a change made on a host with a clock behind is seen"""
+        time_now.return_value = 2_000_000_000
+        self.client.get(ME_URL)
+        self.client.get(ME_URL)
+
+        time_now.return_value = 1_000_000_000
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_token_rejected(self):
+        """Test unknown tokens are still rejected"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,200 @@
+"""
+Test for the signed access tokens and their refresh tokens
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.serializers import UserSerializer
+from user.tokens import make_access_token, revoke_tokens
+
+SIGNED_TOKEN_URL = reverse('user:signed-token')
+REFRESH_URL = reverse('user:token-refresh')
+REVOKE_URL = reverse('user:token-revoke')
+ME_URL = reverse('user:me')
+ANALYTICS_URL = reverse('user:analytics')
+
+
+def create_user(**params):
+    """Helper function to create new user"""
+    return get_user_model().objects.create_user(**params)
+
+
+@override_settings(AUTH_TOKEN_CACHE_TIMEOUT=300)
+class SignedTokenTests(TestCase):
+    """Test authenticating with signed access tokens"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(email='test@example.com',
+                                password='testpass123', name='Test Name')
+        self.client = APIClient()
+
+    def issue(self):
+        res = self.client.post(SIGNED_TOKEN_URL, {
+            'email': 'test@example.com', 'password': 'testpass123'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def get(self, url, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get(url)
+
+    def test_issue_and_authenticate(self):
+        """Test a signed token authenticates the user"""
+        tokens = self.issue()
+
+        res = self.get(ME_URL, tokens['access'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+        self.assertIn('refresh', tokens)
+
+    def test_warm_token_without_queries(self):
+        """Test a known token version is checked without the database"""
+        access = self.issue()['access']
+        self.get(ANALYTICS_URL, access)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ANALYTICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_bad_credentials_rejected(self):
+        """Test no tokens are issued for a wrong password"""
+        res = self.client.post(SIGNED_TOKEN_URL, {
+            'email': 'test@example.com', 'password': 'wrong'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tampered_and_expired_tokens_rejected(self):
+        """Test changed and expired tokens are rejected"""
+        user_id, version, expires_at, signature = \
+            self.issue()['access'].split('.')
+        tampered = f'{user_id}.{version}.{int(expires_at) + 60}.{signature}'
+        expired = make_access_token(self.user.pk, self.user.token_version,
+                                    time.time() - 1)
+
+        for access in (tampered, expired, 'invalid'):
+            res = self.get(ME_URL, access)
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(res['WWW-Authenticate'], 'Token')
+
+    def test_refresh_rotates(self):
+        """Test a refresh token is exchanged once for new tokens"""
+        tokens = self.issue()
+
+        res = self.client.post(REFRESH_URL, {'refresh': tokens['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data['refresh'], tokens['refresh'])
+        self.assertEqual(self.get(ME_URL, res.data['access']).status_code,
+                         status.HTTP_200_OK)
+
+        self.client.credentials()
+        res = self.client.post(REFRESH_URL, {'refresh': tokens['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke(self):
+        """Test revoking invalidates access and refresh tokens"""
+        tokens = self.issue()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                REVOKE_URL, HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(self.get(ME_URL, tokens['access']).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        res = self.client.post(REFRESH_URL, {'refresh': tokens['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUTH_TOKEN_CACHE_TIMEOUT=0)
+    def test_revoke_without_shared_cache(self):
+        """Test revoking works with the versions read from the database"""
+        tokens = self.issue()
+        self.get(ME_URL, tokens['access'])
+
+        self.client.post(REVOKE_URL)
+
+        self.assertEqual(self.get(ME_URL, tokens['access']).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_keeps_revocation(self):
+        """Test a user loaded before a revocation does not undo it"""
+        tokens = self.issue()
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.client.get(ME_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                REVOKE_URL, HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(ME_URL, {'name': 'New Name'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+        self.assertEqual(self.get(ME_URL, tokens['access']).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_stale_user_update_keeps_revocation(self):
+        """Test updating a user loaded before a revocation keeps it"""
+        stale = get_user_model().objects.get(pk=self.user.pk)
+        revoke_tokens(self.user)
+
+        serializer = UserSerializer(stale, data={'name': 'New Name'},
+                                    partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+        self.assertEqual(self.user.name, 'New Name')
+
+    def test_password_change_revokes(self):
+        """Test a new password revokes the signed tokens"""
+        tokens = self.issue()
+        self.get(ME_URL, tokens['access'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(ME_URL, {'password': 'newpass123'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.get(ME_URL, tokens['access']).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        res = self.client.post(REFRESH_URL, {'refresh': tokens['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_change_keeps_tokens(self):
+        """Test other changes to the user keep the tokens valid"""
+        tokens = self.issue()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.name = 'New Name'
+            self.user.save()
+
+        res = self.get(ME_URL, tokens['access'])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['name'], 'New Name')
+
+    def test_deactivated_user_rejected(self):
+        """Test the signed tokens of a deactivated user stop working"""
+        tokens = self.issue()
+        self.get(ME_URL, tokens['access'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.get(ME_URL, tokens['access']).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
@@ -1,18 +1,45 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from core.models import StrengthExercise, StrengthExerciseLog
-from ..analytics.services import get_user_log_analytics
+from core.models import (
+    MuscleGroup,
+    StrengthExercise,
+    StrengthExerciseLog,
+    StrengthExerciseLogRollup,
+    TrackExercise,
+    TrackExerciseLog,
+)
+from ..analytics.cache import (
+    _entry_key,
+    bump_analytics_version,
+    cached_analytics,
+)
+from ..analytics.services import (
+    get_user_log_analytics,
+    get_user_log_series,
+    get_user_muscle_group_volume,
+)
 
 ANALYTICS_URL = reverse('user:analytics')
+ANALYTICS_SERIES_URL = reverse('user:analytics-series')
+ANALYTICS_MUSCLE_GROUPS_URL = reverse('user:analytics-muscle-groups')
 
 
 def create_user(**params):
     return get_user_model().objects.create_user(**params)
 
 
+def create_strength_log(**params):
+    """Create a strength log, its signals add it to the rollups"""
+    return StrengthExerciseLog.objects.create(**params)
+
+
 def create_strength_exercise(**params):
     """Create and return a sample strength exercise"""
     defaults = {
@@ -34,6 +61,7 @@ class UserAnalyticsApiTests(TestCase):
             name='Test User'
         )
         self.client.force_authenticate(user=self.user)
+        cache.clear()
 
     def test_retrieve_user_analytics(self):
         """Test retrieving user analytics"""
@@ -66,3 +94,406 @@ class UserAnalyticsApiTests(TestCase):
 
         # Verify the response data
         self.assertEqual(res.data, expected_analytics)
+        self.assertEqual(res.data['total_reps'], 25)
+        self.assertEqual(res.data['total_sets'], 7)
+        self.assertEqual(res.data['total_calories_burned'], 120)
+
+    def test_analytics_after_exercise_deleted(self):
+        """Test deleting an exercise takes its logs out of the totals"""
+        kept = StrengthExercise.objects.create(name='jump')
+        deleted = StrengthExercise.objects.create(name='pull-up')
+        create_strength_log(user=self.user, exercise=kept,
+                            reps=10, sets=3, calories_burned=50)
+        for _ in range(2):
+            create_strength_log(user=self.user, exercise=deleted,
+                                reps=15, sets=4, calories_burned=70)
+
+        deleted.delete()
+
+        analytics = get_user_log_analytics(self.user)
+        self.assertEqual(analytics['total_reps'], 10)
+        self.assertEqual(analytics['total_sets'], 3)
+        self.assertEqual(analytics['total_calories_burned'], 50)
+
+    def test_delete_user_with_logs(self):
+        """Test deleting a user leaves no rollups behind"""
+        exercise = StrengthExercise.objects.create(name='jump')
+        create_strength_log(user=self.user, exercise=exercise,
+                            reps=10, sets=3, calories_burned=50)
+
+        self.user.delete()
+
+        self.assertFalse(StrengthExerciseLogRollup.objects.exists())
+
+    def test_analytics_follow_orm_edits(self):
+        """Test logs changed outside the API are reflected in the totals"""
+        exercise = StrengthExercise.objects.create(name='jump')
+        log = create_strength_log(user=self.user, exercise=exercise,
+                                  reps=10, sets=3, calories_burned=50)
+        other = create_strength_log(user=self.user, exercise=exercise,
+                                    reps=5, sets=1, calories_burned=10)
+
+        log.reps = 4
+        log.timestamp -= timedelta(days=3)
+        log.save()
+        other.delete()
+
+        analytics = get_user_log_analytics(self.user)
+        self.assertEqual(analytics['total_reps'], 4)
+        self.assertEqual(analytics['total_sets'], 3)
+        self.assertEqual(analytics['total_calories_burned'], 50)
+
+    def test_user_analytics_empty(self):
+        """Test analytics of a user without logs are zero"""
+        res = self.client.get(ANALYTICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {
+            'total_reps': 0,
+            'total_sets': 0,
+            'total_calories_burned': 0,
+            'total_distance': 0,
+            'total_duration': 0.0,
+            'best_pace': None,
+            'average_pace': None,
+            'track_exercises': [],
+        })
+
+    def test_user_analytics_single_query(self):
+        """Test analytics are aggregated in one query per log table"""
+        exercise = StrengthExercise.objects.create(name='jump')
+        for _ in range(5):
+            create_strength_log(
+                user=self.user, exercise=exercise,
+                reps=10, sets=2, calories_burned=20,
+            )
+
+        with self.assertNumQueries(2):
+            analytics = get_user_log_analytics(self.user)
+
+        self.assertEqual(analytics['total_reps'], 50)
+        self.assertEqual(analytics['total_sets'], 10)
+        self.assertEqual(analytics['total_calories_burned'], 100)
+
+    def test_user_analytics_window(self):
+        """Test analytics limited to the from/to window"""
+        exercise = StrengthExercise.objects.create(name='jump')
+        for day, reps in ((1, 10), (2, 20), (3, 30)):
+            create_strength_log(
+                user=self.user, exercise=exercise, reps=reps, sets=1,
+                calories_burned=reps,
+                timestamp=datetime(2024, 1, day, 12, tzinfo=timezone.utc),
+            )
+
+        res = self.client.get(ANALYTICS_URL,
+                              {'from': '2024-01-02', 'to': '2024-01-03'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['total_reps'], 20)
+        self.assertEqual(res.data['total_sets'], 1)
+
+    def test_user_track_analytics(self):
+        """Test distance, moving time and pace of track logs"""
+        run = TrackExercise.objects.create(name='run')
+        walk = TrackExercise.objects.create(name='walk')
+        for exercise, distance, pace in ((run, '5.00', 300),
+                                         (run, '10.00', 330),
+                                         (walk, '2.00', 600)):
+            TrackExerciseLog.objects.create(
+                user=self.user, exercise=exercise, calories_burned=100,
+                distance=Decimal(distance), pace=timedelta(seconds=pace),
+            )
+
+        res = self.client.get(ANALYTICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['total_distance'], Decimal('17.00'))
+        self.assertEqual(res.data['total_duration'], 6000.0)
+        self.assertEqual(res.data['best_pace'], 300.0)
+        self.assertAlmostEqual(res.data['average_pace'], 6000 / 17)
+        run_totals, walk_totals = res.data['track_exercises']
+        self.assertEqual(run_totals['exercise'], 'run')
+        self.assertEqual(run_totals['log_count'], 2)
+        self.assertEqual(run_totals['distance'], Decimal('15.00'))
+        self.assertEqual(run_totals['duration'], 4800.0)
+        self.assertEqual(run_totals['average_pace'], 320.0)
+        self.assertEqual(walk_totals['exercise'], 'walk')
+        self.assertEqual(walk_totals['best_pace'], 600.0)
+
+    def test_user_analytics_unaligned_window(self):
+        """Test windows inside a day are summed from the raw logs"""
+        exercise = StrengthExercise.objects.create(name='jump')
+        for hour, reps in ((8, 10), (12, 20), (18, 30)):
+            create_strength_log(
+                user=self.user, exercise=exercise, reps=reps, sets=1,
+                calories_burned=reps,
+                timestamp=datetime(2024, 1, 1, hour, tzinfo=timezone.utc),
+            )
+
+        res = self.client.get(ANALYTICS_URL, {
+            'from': '2024-01-01T10:00:00Z',
+            'to': '2024-01-01T20:00:00Z',
+        })
+
+        self.assertEqual(res.data['total_reps'], 50)
+
+    def test_user_analytics_invalid_window(self):
+        """Test an unparsable or inverted window is rejected"""
+        res = self.client.get(ANALYTICS_URL, {'from': 'yesterday'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('from', res.data)
+
+        res = self.client.get(ANALYTICS_URL,
+                              {'from': '2024-01-03', 'to': '2024-01-02'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('to', res.data)
+
+    def test_user_analytics_excludes_other_users(self):
+        """Test analytics only include the authenticated user's logs"""
+        other = create_user(email='other@example.com', password='pass123')
+        exercise = StrengthExercise.objects.create(name='jump')
+        create_strength_log(
+            user=other, exercise=exercise,
+            reps=10, sets=3, calories_burned=50,
+        )
+
+        res = self.client.get(ANALYTICS_URL)
+
+        self.assertEqual(res.data['total_reps'], 0)
+
+
+class UserAnalyticsSeriesApiTests(TestCase):
+    """Test the bucketed user analytics API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='test@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(user=self.user)
+        cache.clear()
+        self.strength = StrengthExercise.objects.create(name='squat')
+        self.track = TrackExercise.objects.create(name='run')
+
+    def _strength_log(self, timestamp, reps=10, sets=1):
+        return create_strength_log(
+            user=self.user, exercise=self.strength, timestamp=timestamp,
+            reps=reps, sets=sets, calories_burned=reps,
+        )
+
+    def _track_log(self, timestamp, distance, pace_minutes):
+        return TrackExerciseLog.objects.create(
+            user=self.user, exercise=self.track, timestamp=timestamp,
+            distance=Decimal(distance), calories_burned=100,
+            pace=timedelta(minutes=pace_minutes),
+        )
+
+    def test_daily_series(self):
+        """Test strength and track logs are merged per day"""
+        self._strength_log(datetime(2024, 1, 1, 8, tzinfo=timezone.utc))
+        self._strength_log(datetime(2024, 1, 1, 9, tzinfo=timezone.utc),
+                           reps=5, sets=2)
+        self._track_log(datetime(2024, 1, 1, 10, tzinfo=timezone.utc),
+                        '2.00', 6)
+        self._track_log(datetime(2024, 1, 3, 10, tzinfo=timezone.utc),
+                        '5.50', 5)
+
+        res = self.client.get(ANALYTICS_SERIES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['bucket'], 'day')
+        self.assertEqual(res.data['start'], ['2024-01-01', '2024-01-03'])
+        self.assertEqual(res.data['reps'], [15, 0])
+        self.assertEqual(res.data['sets'], [3, 0])
+        self.assertEqual(res.data['calories_burned'], [115, 100])
+        self.assertEqual(res.data['distance'], [Decimal('2.00'),
+                                                Decimal('5.50')])
+        self.assertEqual(res.data['duration'], [720.0, 1650.0])
+        # every array holds JSON numbers
+        for field in ('reps', 'calories_burned', 'distance', 'duration'):
+            for value in res.json()[field]:
+                self.assertIsInstance(value, (int, float))
+
+    def test_series_adds_up_to_totals(self):
+        """Test the series and the totals count the same calories"""
+        self._strength_log(datetime(2024, 1, 1, 8, tzinfo=timezone.utc))
+        self._track_log(datetime(2024, 1, 1, 10, tzinfo=timezone.utc),
+                        '2.00', 6)
+        self._track_log(datetime(2024, 1, 3, 10, tzinfo=timezone.utc),
+                        '5.50', 5)
+
+        series = self.client.get(ANALYTICS_SERIES_URL).data
+        totals = self.client.get(ANALYTICS_URL).data
+
+        self.assertEqual(totals['total_calories_burned'], 210)
+        self.assertEqual(sum(series['calories_burned']),
+                         totals['total_calories_burned'])
+        self.assertEqual(sum(series['reps']), totals['total_reps'])
+        self.assertEqual(sum(series['distance']), totals['total_distance'])
+
+    def test_series_respects_timezone(self):
+        """Test buckets are cut at midnight of the requested timezone"""
+        self._strength_log(datetime(2024, 1, 1, 23, tzinfo=timezone.utc))
+
+        res = self.client.get(ANALYTICS_SERIES_URL, {'tz': 'Asia/Tokyo'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['timezone'], 'Asia/Tokyo')
+        self.assertEqual(res.data['start'], ['2024-01-02'])
+
+    def test_weekly_series(self):
+        """Test logs of one week share a bucket starting on Monday"""
+        self._strength_log(datetime(2024, 1, 2, tzinfo=timezone.utc))
+        self._strength_log(datetime(2024, 1, 7, tzinfo=timezone.utc))
+        self._strength_log(datetime(2024, 1, 8, tzinfo=timezone.utc))
+
+        res = self.client.get(ANALYTICS_SERIES_URL, {'bucket': 'week'})
+
+        self.assertEqual(res.data['start'], ['2024-01-01', '2024-01-08'])
+        self.assertEqual(res.data['reps'], [20, 10])
+
+    def test_series_grouped_queries(self):
+        """Test the series costs one query per log table"""
+        for day in range(1, 10):
+            self._strength_log(datetime(2024, 1, day, tzinfo=timezone.utc))
+            self._track_log(datetime(2024, 1, day, tzinfo=timezone.utc),
+                            '1.00', 6)
+
+        with self.assertNumQueries(2):
+            get_user_log_series(self.user)
+
+    def test_series_invalid_params(self):
+        """Test unknown buckets and timezones are rejected"""
+        res = self.client.get(ANALYTICS_SERIES_URL, {'bucket': 'year'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(ANALYTICS_SERIES_URL, {'tz': 'Mars/Olympus'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UserAnalyticsCacheTests(TestCase):
+    """Test the per-user analytics cache"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='test@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(user=self.user)
+        self.exercise = StrengthExercise.objects.create(name='jump')
+        cache.clear()
+
+    def test_analytics_served_from_cache(self):
+        """Test repeated reads do not query the database"""
+        self.client.get(ANALYTICS_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ANALYTICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_log_write_invalidates_cache(self):
+        """Test logging through the API refreshes the cached totals"""
+        res = self.client.get(ANALYTICS_URL)
+        self.assertEqual(res.data['total_reps'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('exercise:strength-exercise-log-list'), {
+                'exercise': 'jump',
+                'reps': 12,
+                'sets': 2,
+                'calories_burned': 40,
+            })
+
+        res = self.client.get(ANALYTICS_URL)
+        self.assertEqual(res.data['total_reps'], 12)
+
+    def test_stale_entry_served_during_recompute(self):
+        """Test a stale result is served while another request recomputes"""
+        cached_analytics(self.user, 'test', (), lambda: 'old')
+        bump_analytics_version(self.user.pk)
+        # hold the recompute lock like a concurrent request would
+        cache.add(f'{_entry_key(self.user.pk, "test", ())}:lock', 1)
+
+        result = cached_analytics(self.user, 'test', (), lambda: 'new')
+
+        self.assertEqual(result, 'old')
+
+    def test_stale_entry_recomputed_once(self):
+        """Test a stale result is recomputed by the first reader"""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        cached_analytics(self.user, 'test', (), compute)
+        bump_analytics_version(self.user.pk)
+
+        self.assertEqual(cached_analytics(self.user, 'test', (), compute), 2)
+        self.assertEqual(cached_analytics(self.user, 'test', (), compute), 2)
+        self.assertEqual(len(calls), 2)
+
+
+class UserMuscleGroupVolumeApiTests(TestCase):
+    """Test the per muscle group volume API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='test@example.com',
+            password='testpass123',
+        )
+        self.client.force_authenticate(user=self.user)
+        cache.clear()
+
+        self.bench = StrengthExercise.objects.create(name='bench press')
+        chest = MuscleGroup.objects.create(name='chest')
+        self.arms = MuscleGroup.objects.create(name='arms')
+        self.bench.primary_muscle_groups.add(chest)
+        self.bench.secondary_muscle_groups.add(self.arms)
+
+    def test_volume_per_muscle_group(self):
+        """Test primary groups get full and secondary half the volume"""
+        create_strength_log(user=self.user, exercise=self.bench,
+                            reps=10, sets=3, calories_burned=20)
+        create_strength_log(user=self.user, exercise=self.bench,
+                            reps=5, sets=2, calories_burned=10)
+
+        res = self.client.get(ANALYTICS_MUSCLE_GROUPS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        volume = {row['name']: row['volume'] for row in res.data}
+        self.assertEqual(
+            list(volume),
+            [name for name, _ in MuscleGroup.MUSCLE_CHOICES],
+        )
+        self.assertEqual(volume['chest'], 40.0)
+        self.assertEqual(volume['arms'], 20.0)
+        self.assertEqual(volume['legs'], 0.0)
+
+    def test_volume_single_grouped_query(self):
+        """Test the volume needs one query once the weight map is built"""
+        for _ in range(5):
+            create_strength_log(user=self.user, exercise=self.bench,
+                                reps=10, sets=3, calories_burned=20)
+        get_user_muscle_group_volume(self.user)
+
+        with self.assertNumQueries(1):
+            get_user_muscle_group_volume(self.user)
+
+    def test_catalog_change_refreshes_volume(self):
+        """Test muscle group changes of an exercise are picked up"""
+        create_strength_log(user=self.user, exercise=self.bench,
+                            reps=10, sets=1, calories_burned=20)
+        self.client.get(ANALYTICS_MUSCLE_GROUPS_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bench.secondary_muscle_groups.remove(self.arms)
+            self.bench.primary_muscle_groups.add(self.arms)
+
+        res = self.client.get(ANALYTICS_MUSCLE_GROUPS_URL)
+        volume = {row['name']: row['volume'] for row in res.data}
+        self.assertEqual(volume['arms'], 10.0)
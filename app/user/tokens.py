@@ -0,0 +1,157 @@
+"""
+Signed access tokens and their refresh tokens
+
+An access token is `<user id>.<token version>.<expiry>.<signature>`, an
+HMAC of the first three parts keyed by SECRET_KEY. It is checked without
+the database: the signature and expiry by computation, the version
+against the user's current token version kept in the cache. Bumping the
+version (revoke_tokens, or a new password or deactivation) revokes every
+access and refresh token of the user. revoke_tokens increments the
+version in the database; writers that may hold a stale user, such as
+UserSerializer.update, save only the fields they change.
+
+Refresh tokens are random, stored as their SHA-256 and exchanged once
+for a new access and refresh token pair.
+"""
+import base64
+import hashlib
+import secrets
+import time
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.models import RefreshToken
+
+SIGNING_SALT = 'user.tokens.access'
+# token version of inactive and deleted users
+REVOKED = -1
+
+
+def _signature(payload):
+    digest = salted_hmac(SIGNING_SALT, payload, algorithm='sha256').digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+def _hash(refresh_token):
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+def make_access_token(user_id, token_version, expires_at):
+    """Return the access token of a user expiring at a unix time."""
+    payload = f'{user_id}.{token_version}.{int(expires_at)}'
+    return f'{payload}.{_signature(payload)}'
+
+
+def read_access_token(token):
+    """
+    Return the (user id, token version) of a valid, unexpired access
+    token, raise AuthenticationFailed otherwise.
+    """
+    try:
+        payload, signature = token.rsplit('.', 1)
+        user_id, token_version, expires_at = map(int, payload.split('.'))
+    except ValueError:
+        raise AuthenticationFailed('Invalid token.')
+    if not constant_time_compare(signature, _signature(payload)):
+        raise AuthenticationFailed('Invalid token.')
+    if expires_at <= time.time():
+        raise AuthenticationFailed('Token expired.')
+    return user_id, token_version
+
+
+def _version_key(user_id):
+    return f'auth:token-version:{user_id}'
+
+
+def _load_version(user_id):
+    row = get_user_model().objects.filter(pk=user_id) \
+        .values_list('token_version', 'is_active').first()
+    return row[0] if row and row[1] else REVOKED
+
+
+def get_token_version(user_id):
+    """
+    Return the token version of a user, REVOKED if inactive. Read from
+    the database without a shared cache (AUTH_TOKEN_CACHE_TIMEOUT 0).
+    """
+    if not settings.AUTH_TOKEN_CACHE_TIMEOUT:
+        return _load_version(user_id)
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _load_version(user_id)
+        # add, not set: a version cached by a revocation meanwhile wins
+        cache.add(key, version, timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        version = cache.get(key, version)
+    return version
+
+
+def _cache_version(user_id, version):
+    cache.set(_version_key(user_id), version,
+              timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+
+def token_version_changed(user_id, version):
+    """Publish a new token version of a user once it is committed."""
+    transaction.on_commit(partial(_cache_version, user_id, version))
+
+
+def issue_tokens(user):
+    """Return a new access token and refresh token for a user."""
+    now = timezone.now()
+    access_expires_at = now + timedelta(
+        seconds=settings.SIGNED_ACCESS_TOKEN_LIFETIME)
+    refresh_expires_at = now + timedelta(
+        seconds=settings.REFRESH_TOKEN_LIFETIME)
+    refresh = secrets.token_urlsafe(32)
+
+    RefreshToken.objects.filter(user=user, expires_at__lte=now).delete()
+    RefreshToken.objects.create(
+        user=user, key_hash=_hash(refresh),
+        token_version=user.token_version, expires_at=refresh_expires_at,
+    )
+    return {
+        'access': make_access_token(user.pk, user.token_version,
+                                    access_expires_at.timestamp()),
+        'access_expires_at': access_expires_at,
+        'refresh': refresh,
+        'refresh_expires_at': refresh_expires_at,
+    }
+
+
+def refresh_tokens(refresh):
+    """
+    Exchange a refresh token for new tokens, the refresh token can only
+    be used once.
+    """
+    with transaction.atomic():
+        stored = RefreshToken.objects.select_for_update() \
+            .select_related('user').filter(key_hash=_hash(refresh)).first()
+        if stored is not None:
+            stored.delete()
+            user = stored.user
+            if stored.expires_at > timezone.now() and user.is_active and \
+                    stored.token_version == user.token_version:
+                return issue_tokens(user)
+    raise AuthenticationFailed('Invalid refresh token.')
+
+
+def revoke_tokens(user):
+    """Revoke every access and refresh token of a user."""
+    User = get_user_model()
+    with transaction.atomic():
+        users = User.objects.filter(pk=user.pk)
+        users.update(token_version=F('token_version') + 1)
+        version = users.values_list('token_version', flat=True).get()
+        RefreshToken.objects.filter(user=user).delete()
+        token_version_changed(user.pk, version)
+    user.token_version = version
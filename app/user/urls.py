@@ -10,7 +10,19 @@ app_name = 'user'
 urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name='create'),
     path('token/', views.CreateTokenView.as_view(), name='token'),
+    path('token/signed/', views.CreateSignedTokenView.as_view(),
+         name='signed-token'),
+    path('token/refresh/', views.RefreshSignedTokenView.as_view(),
+         name='token-refresh'),
+    path('token/revoke/', views.RevokeSignedTokensView.as_view(),
+         name='token-revoke'),
     path('me/', views.ManageUserView.as_view(), name='me'),
     path('analytics/', views.UserLogAnalyticsView.as_view(), name='analytics'),
+    path('analytics/series/',
+         views.UserLogAnalyticsSeriesView.as_view(),
+         name='analytics-series'),
+    path('analytics/muscle-groups/',
+         views.UserMuscleGroupVolumeView.as_view(),
+         name='analytics-muscle-groups'),
     #  name='user-log-analytics'),
 ]
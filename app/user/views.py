@@ -2,20 +2,45 @@
 Views for the user API
 """
 # from requests import Response
-from .analytics.services import get_user_log_analytics
-from rest_framework import generics, authentication, permissions
+from .analytics.cache import cached_analytics
+from .analytics.services import (
+    SERIES_BUCKETS,
+    get_user_log_analytics,
+    get_user_log_series,
+    get_user_muscle_group_volume,
+)
+from .analytics.utils import parse_timezone, parse_window
+from drf_spectacular.utils import extend_schema
+from rest_framework import (
+    generics,
+    permissions,
+    serializers,
+    status,
+)
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
 # from rest_framework.permissions import IsAuthenticated
 # from user.analytics.services import get_user_log_analytics
 # from rest_framework.views import APIView
 
+from exercise.catalog import get_catalog_version
+from user.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+    user_auth_changed,
+)
 from user.serializers import (
+    MuscleGroupVolumeSerializer,
+    RefreshTokenSerializer,
+    SignedTokenSerializer,
     UserLogAnalyticsSerializer,
+    UserLogAnalyticsSeriesSerializer,
     UserSerializer,
     AuthTokenSerializer,
 )
+from user.tokens import issue_tokens, refresh_tokens, revoke_tokens
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -29,23 +54,129 @@ class CreateTokenView(ObtainAuthToken):
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
+class CreateSignedTokenView(generics.GenericAPIView):
+    """Create a signed access token and a refresh token for user"""
+    serializer_class = AuthTokenSerializer
+
+    @extend_schema(responses=SignedTokenSerializer)
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tokens = issue_tokens(serializer.validated_data['user'])
+        return Response(SignedTokenSerializer(tokens).data)
+
+
+class RefreshSignedTokenView(generics.GenericAPIView):
+    """Exchange a refresh token for a new access and refresh token"""
+    serializer_class = RefreshTokenSerializer
+    authentication_classes = ()
+
+    @extend_schema(responses=SignedTokenSerializer)
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tokens = refresh_tokens(serializer.validated_data['refresh'])
+        return Response(SignedTokenSerializer(tokens).data)
+
+    def get_authenticate_header(self, request):
+        # answer invalid refresh tokens with 401, not 403
+        return SignedTokenAuthentication.keyword
+
+
+class RevokeSignedTokensView(generics.GenericAPIView):
+    """Revoke every signed access and refresh token of the user"""
+    authentication_classes = (CachedTokenAuthentication,
+                              SignedTokenAuthentication)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    @extend_schema(request=None, responses={204: None})
+    def post(self, request):
+        revoke_tokens(request.user)
+        # reload the users kept with their old version by the token cache
+        user_auth_changed(request.user.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,
+                              SignedTokenAuthentication)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
         """Retrieve and return authenticated user"""
-        return self.request.user
+        user = self.request.user
+        deferred = user.get_deferred_fields()
+        if deferred:
+            # signed tokens only carry the user id
+            user.refresh_from_db(fields=deferred)
+        return user
 
 #####################################
 # TEXT ANALYTICS API
 
 
 class UserLogAnalyticsView(generics.RetrieveAPIView):
+    """
+    Lifetime totals of the authenticated user's logs, optionally limited
+    to the `from` (inclusive) / `to` (exclusive) query window.
+    """
+    authentication_classes = (CachedTokenAuthentication,
+                              SignedTokenAuthentication)
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = UserLogAnalyticsSerializer
 
     def get_object(self):
-        return get_user_log_analytics(self.request.user)
+        user = self.request.user
+        start, end = parse_window(self.request.query_params)
+        return cached_analytics(
+            user, 'totals', (start, end),
+            lambda: get_user_log_analytics(user, start, end),
+        )
+
+
+class UserLogAnalyticsSeriesView(generics.RetrieveAPIView):
+    """
+    Log totals grouped into `bucket` (day, week or month) periods of the
+    `tz` time zone, optionally limited to the `from`/`to` query window.
+    """
+    authentication_classes = (CachedTokenAuthentication,
+                              SignedTokenAuthentication)
+    permission_classes = (permissions.IsAuthenticated,)
+    serializer_class = UserLogAnalyticsSeriesSerializer
+
+    def get_object(self):
+        params = self.request.query_params
+        bucket = params.get('bucket', 'day')
+        if bucket not in SERIES_BUCKETS:
+            raise serializers.ValidationError({
+                'bucket': [f'Must be one of {", ".join(SERIES_BUCKETS)}.']
+            })
+        tzinfo = parse_timezone(params.get('tz'))
+        start, end = parse_window(params)
+        user = self.request.user
+        return cached_analytics(
+            user, 'series', (bucket, str(tzinfo), start, end),
+            lambda: get_user_log_series(user, bucket, tzinfo, start, end),
+        )
+
+
+class UserMuscleGroupVolumeView(generics.ListAPIView):
+    """
+    Training volume per muscle group, optionally limited to the
+    `from`/`to` query window.
+    """
+    authentication_classes = (CachedTokenAuthentication,
+                              SignedTokenAuthentication)
+    permission_classes = (permissions.IsAuthenticated,)
+    serializer_class = MuscleGroupVolumeSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        user = self.request.user
+        start, end = parse_window(self.request.query_params)
+        return cached_analytics(
+            user, 'muscle-groups', (start, end, get_catalog_version()),
+            lambda: get_user_muscle_group_volume(user, start, end),
+        )